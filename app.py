@@ -4,20 +4,57 @@ Main application file for the Streamlit dashboard.
 """
 
 import streamlit as st
-import pandas as pd
-import numpy as np
 from pathlib import Path
+import importlib
 import sys
 
 # Add utils to path
 sys.path.append(str(Path(__file__).parent / "utils"))
 
 # Import configuration and modules
-from config import APP_CONFIG, load_global_data
-from modules.mod_mapa import render_mapa_page
-from modules.mod_huff import render_huff_page  
-from modules.mod_socio import render_socio_page
-from modules.mod_agente import render_agente_page
+from config import APP_CONFIG, load_global_data, get_grid_store, load_grid_partitions
+from spatial_index import get_hex_index
+from helpers import get_area_lookup
+from feature_matrix import get_feature_matrix
+from grid_store import get_grid_handle
+
+# Page name -> (module, render function). Page modules are imported on first
+# use so opening one page does not pay for the dependencies of the others
+# (e.g. scikit-learn is only loaded by the agent page).
+PAGES = {
+    "🗺️ Mapa": ("modules.mod_mapa", "render_mapa_page"),
+    "📊 Análisis Captación": ("modules.mod_huff", "render_huff_page"),
+    "👥 Socioeconómico": ("modules.mod_socio", "render_socio_page"),
+    "🤖 Agente Expansión": ("modules.mod_agente", "render_agente_page")
+}
+
+def load_page(page):
+    """Import a page module on demand and return its render function"""
+    module_name, function_name = PAGES[page]
+    return getattr(importlib.import_module(module_name), function_name)
+
+@st.cache_resource(show_spinner="Cargando cuadrícula hexagonal...")
+def get_shared_grid(region=None, municipio=None):
+    """
+    Load the hexagonal grid once per server process (and selection)
+    
+    Without a region the single-area grid of load_global_data is used;
+    with one, only the matching partitions of the grid store are read.
+
+    The returned GeoDataFrame and its spatial index, lookup tables and
+    memory-mapped feature matrix are shared by every session and must be
+    treated as read-only; sessions keep their own derived columns (e.g.
+    cluster labels) separately.
+    """
+    if region is None:
+        agebs_hex = load_global_data()
+    else:
+        agebs_hex = load_grid_partitions(get_grid_store().select(region, municipio))
+    get_hex_index(agebs_hex)
+    get_feature_matrix(agebs_hex)
+    if 'nombre_municipio' in agebs_hex.columns:
+        get_area_lookup(agebs_hex)
+    return agebs_hex
 
 def main():
     # Page configuration
@@ -44,9 +81,17 @@ def main():
         st.title("Rosa Oliva Geoespacial")
         st.markdown("*Análisis estratégico para expansión de joyería*")
     
-    # Initialize session state
-    if 'agebs_hex' not in st.session_state:
-        st.session_state.agebs_hex = load_global_data()
+    # Region selection when a partitioned grid store is available
+    store = get_grid_store()
+    if store is not None:
+        st.sidebar.title("Región")
+        region = st.sidebar.selectbox("Zona:", store.regions())
+        municipio = st.sidebar.selectbox("Municipio:", ["Todos"] + store.municipios(region))
+        st.session_state.grid_region = region
+        st.session_state.agebs_hex = get_shared_grid(region, None if municipio == "Todos" else municipio)
+    elif 'agebs_hex' not in st.session_state:
+        # Reference to the process-wide grid, not a per-session copy
+        st.session_state.agebs_hex = get_shared_grid()
     
     if 'map_data' not in st.session_state:
         st.session_state.map_data = {
@@ -58,18 +103,16 @@ def main():
     st.sidebar.title("Navegación")
     page = st.sidebar.selectbox(
         "Seleccionar módulo:",
-        ["🗺️ Mapa", "📊 Análisis Captación", "👥 Socioeconómico", "🤖 Agente Expansión"]
+        list(PAGES.keys())
     )
     
+    # Which grid this session is using
+    grid = get_grid_handle(st.session_state.agebs_hex)
+    grid_origin = "simulada" if grid.simulated else Path(grid.source).name
+    st.sidebar.caption(f"Cuadrícula: {grid_origin} · {grid.rows} hexágonos · {grid.short_hash}")
+    
     # Render selected page
-    if page == "🗺️ Mapa":
-        render_mapa_page()
-    elif page == "📊 Análisis Captación":
-        render_huff_page()
-    elif page == "👥 Socioeconómico":
-        render_socio_page()
-    elif page == "🤖 Agente Expansión":
-        render_agente_page()
+    load_page(page)()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
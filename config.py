@@ -4,17 +4,29 @@ Global configuration and data loading for Rosa Oliva Geoespacial app
 
 import os
 import pandas as pd
-import geopandas as gpd
-import numpy as np
 from pathlib import Path
-from shapely.geometry import Point, Polygon
+import sys
+import threading
 import warnings
+from collections import OrderedDict
+
+# Add utils to path
+sys.path.append(str(Path(__file__).parent / "utils"))
+
+from grid_partitions import get_partition_store
+from synthetic_grid import synthetic_grid
+from grid_store import add_derived_columns, compact_grid, make_grid_handle, register_grid_handle, is_parquet_fresh, read_grid_parquet, read_grid_shapefile
 
 # Application Configuration
 APP_CONFIG = {
     'default_lat': 17.0594,
     'default_lng': -96.7216,
     'oaxaca_grid_filepath': "data/Oaxaca_grid/oaxaca_ZMO_grid.shp",
+    'oaxaca_grid_parquet_filepath': "data/Oaxaca_grid/oaxaca_ZMO_grid.parquet",
+    'grid_compact_dtypes': True,
+    'grid_store_dir': "data/grid_store",
+    'grid_partition_cache_size': 8,
+    'synthetic_grid_cells': 2000,
     'huff_default_alfa': 1,
     'huff_default_beta': 3,
     'map_search_radius_default': 1000,
@@ -35,61 +47,114 @@ APP_CONFIG = {
     })
 }
 
-def create_hexagon(center_lat, center_lng, radius=0.002):
-    """Create a hexagonal polygon around a center point"""
-    angles = np.linspace(0, 2 * np.pi, 7)
-    coords = [(center_lng + radius * np.cos(angle), 
-               center_lat + radius * np.sin(angle)) for angle in angles]
-    return Polygon(coords)
+def load_global_data(columns=None, compact=None):
+    """
+    Load or generate hexagonal grid data
+    
+    Parameters:
+    - columns: Grid columns to load (default: all), geometry is always loaded
+    - compact: Use compact dtypes (float32 features, categorical names,
+      integer id_hex). Default: APP_CONFIG['grid_compact_dtypes']
+    
+    Returns:
+    - GeoDataFrame: Hexagonal grid with the geometry-derived columns of
+      grid_store.GRID_DERIVED_COLUMNS (centroid, bounds, EPSG:6372 XY, area).
+      Its GridHandle (content hash, source, simulated flag) is available
+      through grid_store.get_grid_handle
+    """
+    
+    agebs_hex, source = _load_grid_data(columns)
+    return _finish_grid(agebs_hex, source, compact)
+
+# Grids assembled from store partitions, by (partition ids, columns, compact)
+_partition_grids = OrderedDict()
+_partition_grids_lock = threading.Lock()
+
+def get_grid_store():
+    """
+    Get the partitioned grid store, if one has been built
+    
+    Returns:
+    - GridPartitionStore, or None if APP_CONFIG['grid_store_dir'] has no manifest
+    """
+    
+    store = get_partition_store(APP_CONFIG['grid_store_dir'])
+    return store if store.exists() else None
+
+def load_grid_partitions(partition_ids, columns=None, compact=None):
+    """
+    Load the grid of some partitions of the partitioned grid store
+    
+    The most recently used partition sets are kept, so panning back to a
+    view (or reopening a municipality) returns the same GeoDataFrame and
+    reuses its spatial index and other per-grid caches.
+    
+    Parameters:
+    - partition_ids: Partition ids (see GridPartitionStore.select / intersecting)
+    - columns: Grid columns to load (default: all), geometry is always loaded
+    - compact: Use compact dtypes (default: APP_CONFIG['grid_compact_dtypes'])
+    
+    Returns:
+    - GeoDataFrame: Hexagonal grid of the partitions, as load_global_data
+    """
+    
+    store = get_partition_store(APP_CONFIG['grid_store_dir'])
+    key = (tuple(sorted(partition_ids)), tuple(columns) if columns is not None else None, compact)
+    
+    with _partition_grids_lock:
+        if key in _partition_grids:
+            _partition_grids.move_to_end(key)
+            return _partition_grids[key]
+    
+    agebs_hex = _finish_grid(store.load(key[0], columns), store.manifest_path, compact)
+    
+    with _partition_grids_lock:
+        _partition_grids[key] = agebs_hex
+        while len(_partition_grids) > APP_CONFIG['grid_partition_cache_size']:
+            _partition_grids.popitem(last=False)
+    
+    return agebs_hex
+
+def _finish_grid(agebs_hex, source, compact=None):
+    """Add derived columns, compact dtypes and register the grid's handle"""
+    
+    if compact is None:
+        compact = APP_CONFIG['grid_compact_dtypes']
+    
+    agebs_hex = add_derived_columns(agebs_hex)
+    if compact:
+        agebs_hex = compact_grid(agebs_hex)
+    
+    register_grid_handle(agebs_hex, make_grid_handle(agebs_hex, source))
+    return agebs_hex
 
-def load_global_data():
-    """Load or generate hexagonal grid data"""
+def _load_grid_data(columns=None):
+    """
+    Load the grid from GeoParquet or shapefile, or generate a simulated one
+    
+    Returns:
+    - tuple: (GeoDataFrame, source file path or None if simulated)
+    """
     
     # Try to load real data
     grid_path = Path(APP_CONFIG['oaxaca_grid_filepath'])
+    parquet_path = Path(APP_CONFIG['oaxaca_grid_parquet_filepath'])
+    
+    # Fast path: converted GeoParquet grid newer than the shapefile
+    if is_parquet_fresh(parquet_path, grid_path):
+        try:
+            agebs_hex = read_grid_parquet(parquet_path, columns)
+            print(f"Successfully loaded hexagonal grid data from: {parquet_path}")
+            return agebs_hex, parquet_path
+        except Exception as e:
+            warnings.warn(f"Error loading GeoParquet grid: {e}. Falling back to shapefile.")
     
     if grid_path.exists():
         try:
-            agebs_hex = gpd.read_file(grid_path)
-            
-            # Check and add missing columns
-            if 'NOM_MUN' not in agebs_hex.columns:
-                warnings.warn("Column 'NOM_MUN' not found. Adding placeholder.")
-                agebs_hex['NOM_MUN'] = 'Desconocido'
-            
-            if 'NOM_LOC' not in agebs_hex.columns:
-                warnings.warn("Column 'NOM_LOC' not found. Adding placeholder.")
-                agebs_hex['NOM_LOC'] = 'Desconocida'
-            
-            # Standardize column names
-            agebs_hex = agebs_hex.rename(columns={
-                'id_hx_x': 'id_hex',
-                'pblcn_t': 'poblacion_total',
-                'jvn_dgt': 'joven_digital_raw',
-                'mm_mprn': 'mama_emprendedora_raw',
-                'myrst_x': 'mayorista_experimentado_raw',
-                'cts_ttl': 'clientes_totales_raw',
-                'NOM_MUN': 'nombre_municipio',
-                'NOM_LOC': 'nombre_localidad'
-            })
-            
-            # Apply log transformations
-            for col in ['joven_digital_raw', 'mama_emprendedora_raw', 
-                       'mayorista_experimentado_raw', 'clientes_totales_raw']:
-                if col in agebs_hex.columns:
-                    new_col = col.replace('_raw', '')
-                    agebs_hex[new_col] = np.log1p(agebs_hex[col].fillna(0))
-            
-            # Select final columns
-            final_cols = ['id_hex', 'poblacion_total', 'joven_digital', 
-                         'mama_emprendedora', 'mayorista_experimentado', 
-                         'clientes_totales', 'nombre_municipio', 'nombre_localidad', 'geometry']
-            
-            available_cols = [col for col in final_cols if col in agebs_hex.columns]
-            agebs_hex = agebs_hex[available_cols]
+            agebs_hex = read_grid_shapefile(grid_path, columns)
             
             print(f"Successfully loaded real hexagonal grid data from: {grid_path}")
-            return agebs_hex
+            return agebs_hex, grid_path
             
         except Exception as e:
             warnings.warn(f"Error loading real data: {e}. Using simulated data.")
@@ -97,32 +162,18 @@ def load_global_data():
     # Generate simulated data
     warnings.warn(f"Real data not found at '{grid_path}'. Using simulated hexagonal grid data.")
     
-    n_hex = 50
-    np.random.seed(42)  # For reproducible results
-    
-    # Generate random coordinates around Oaxaca
-    lats = np.random.uniform(17.04, 17.11, n_hex)
-    lngs = np.random.uniform(-96.75, -96.69, n_hex)
-    
-    # Create hexagonal geometries
-    geometries = [create_hexagon(lat, lng) for lat, lng in zip(lats, lngs)]
-    
-    # Create GeoDataFrame
-    agebs_hex = gpd.GeoDataFrame({
-        'id_hex': [f'sim_hex_{i+1}' for i in range(n_hex)],
-        'poblacion_total': np.random.randint(100, 1000, n_hex),
-        'joven_digital': np.log1p(np.random.randint(0, 500, n_hex)),
-        'mama_emprendedora': np.log1p(np.random.randint(0, 500, n_hex)),
-        'mayorista_experimentado': np.log1p(np.random.randint(0, 500, n_hex)),
-        'clientes_totales': np.log1p(np.random.randint(0, 2000, n_hex)),
-        'nombre_municipio': np.random.choice(['Oaxaca de Juárez', 'Santa Cruz Xoxocotlán'], n_hex),
-        'nombre_localidad': np.random.choice(['Centro', 'Reforma', 'Xoxocotlán'], n_hex),
-        'geometry': geometries
-    }, crs='EPSG:4326')
+    agebs_hex = synthetic_grid(APP_CONFIG['synthetic_grid_cells'],
+                               center=(APP_CONFIG['default_lat'], APP_CONFIG['default_lng']))
+    if columns is not None:
+        agebs_hex = agebs_hex[[col for col in columns if col in agebs_hex.columns and col != 'geometry'] + ['geometry']]
     
     print("Generated simulated hexagonal grid data.")
-    return agebs_hex
+    return agebs_hex, None
 
 # API Keys from environment variables
 GOOGLE_PLACES_API_KEY = os.getenv("GOOGLE_PLACES_API_KEY", "")
-INEGI_API_KEY = os.getenv("INEGI_API_KEY", "")
\ No newline at end of file
+INEGI_API_KEY = os.getenv("INEGI_API_KEY", "")
+
+# API base URLs (point them at utils/mock_server.py for offline runs and load tests)
+DENUE_API_URL = os.getenv("DENUE_API_URL", "https://www.inegi.org.mx/app/api/denue/v1/consulta")
+GOOGLE_PLACES_API_URL = os.getenv("GOOGLE_PLACES_API_URL", "https://maps.googleapis.com/maps/api/place")
\ No newline at end of file
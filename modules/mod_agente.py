@@ -5,13 +5,17 @@ AI Agent module for expansion recommendations
 import streamlit as st
 import pandas as pd
 import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
-from sklearn.metrics.pairwise import cosine_similarity
 import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+from pathlib import Path
+import sys
+
+# Add utils to path
+sys.path.append(str(Path(__file__).parent.parent / "utils"))
+
+from spatial_index import get_hex_index
+from grid_store import cache_key, project_points
+from feature_matrix import get_feature_matrix
 
 def render_agente_page():
     st.header("🤖 Agente Inteligente de Expansión")
@@ -48,15 +52,16 @@ def render_customer_profiles(agebs_hex):
     st.subheader("Análisis de Perfiles de Cliente")
     
     # Prepare data for clustering
+    features = get_feature_matrix(agebs_hex)
     feature_cols = ['joven_digital', 'mama_emprendedora', 'mayorista_experimentado', 'clientes_totales']
-    available_cols = [col for col in feature_cols if col in agebs_hex.columns]
+    available_cols = [col for col in feature_cols if col in features]
     
     if len(available_cols) < 2:
         st.error("Se necesitan al menos 2 variables para el análisis de perfiles")
         return
     
-    # Data preparation
-    data_for_clustering = agebs_hex[available_cols].fillna(0)
+    # Data preparation (read from the shared memory-mapped matrix)
+    data_for_clustering = features.select(available_cols, fill_value=0)
     
     # Clustering parameters
     col1, col2 = st.columns(2)
@@ -68,6 +73,11 @@ def render_customer_profiles(agebs_hex):
         use_pca = st.checkbox("Usar PCA para reducción dimensional", value=True)
     
     if st.button("🔄 Ejecutar Análisis de Perfiles"):
+        # scikit-learn is heavy to import; load it only when it is used
+        from sklearn.cluster import KMeans
+        from sklearn.preprocessing import StandardScaler
+        from sklearn.decomposition import PCA
+        
         with st.spinner("Analizando perfiles de cliente..."):
             # Standardize data
             scaler = StandardScaler()
@@ -101,13 +111,13 @@ def render_customer_profiles(agebs_hex):
             kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
             clusters = kmeans.fit_predict(data_for_model)
             
-            # Add clusters to dataframe
-            agebs_with_clusters = agebs_hex.copy()
-            agebs_with_clusters['cluster'] = clusters
+            # Keep only the per-session cluster labels; the grid itself is shared
+            clusters = pd.Series(clusters, index=agebs_hex.index, name='cluster')
             
             # Store results in session state
             st.session_state.customer_profiles = {
-                'data': agebs_with_clusters,
+                'grid_key': cache_key(agebs_hex, 'customer_profiles'),
+                'clusters': clusters,
                 'scaler': scaler,
                 'pca': pca,
                 'kmeans': kmeans,
@@ -131,11 +141,11 @@ def render_customer_profiles(agebs_hex):
             # Cluster characteristics
             st.write("### Características de los Clusters")
             
-            cluster_summary = agebs_with_clusters.groupby('cluster')[available_cols].mean().round(2)
-            cluster_counts = agebs_with_clusters['cluster'].value_counts().sort_index()
+            cluster_summary = agebs_hex[available_cols].groupby(clusters).mean().round(2)
+            cluster_counts = clusters.value_counts().sort_index()
             
             cluster_summary['Hexágonos'] = cluster_counts.values
-            cluster_summary['% del Total'] = (cluster_counts.values / len(agebs_with_clusters) * 100).round(1)
+            cluster_summary['% del Total'] = (cluster_counts.values / len(agebs_hex) * 100).round(1)
             
             st.dataframe(cluster_summary, use_container_width=True)
             
@@ -169,13 +179,12 @@ def render_similar_locations(agebs_hex):
     """Find locations similar to existing successful stores"""
     st.subheader("Búsqueda de Ubicaciones Similares")
     
-    # Check if we have customer profiles
-    if 'customer_profiles' not in st.session_state:
+    # Check if we have customer profiles for the current grid
+    if not has_current_profiles(agebs_hex):
         st.warning("⚠️ Primero ejecute el análisis de perfiles de cliente en la pestaña anterior")
         return
     
     profiles_data = st.session_state.customer_profiles
-    agebs_with_clusters = profiles_data['data']
     
     # Select reference location
     st.write("### Selección de Ubicación de Referencia")
@@ -220,9 +229,10 @@ def render_similar_locations(agebs_hex):
     if reference_location and st.button("🔍 Buscar Ubicaciones Similares"):
         with st.spinner("Buscando ubicaciones similares..."):
             similar_locations = find_similar_locations(
-                agebs_with_clusters, 
+                agebs_hex, 
                 reference_location,
-                profiles_data
+                profiles_data,
+                hex_index=get_hex_index(agebs_hex)
             )
             
             if len(similar_locations) > 0:
@@ -267,12 +277,11 @@ def render_recommendations(agebs_hex):
     st.subheader("Recomendaciones de Expansión")
     
     # Check prerequisites
-    if 'customer_profiles' not in st.session_state:
+    if not has_current_profiles(agebs_hex):
         st.warning("⚠️ Primero ejecute el análisis de perfiles de cliente")
         return
     
     profiles_data = st.session_state.customer_profiles
-    agebs_with_clusters = profiles_data['data']
     
     # Recommendation parameters
     st.write("### Parámetros de Recomendación")
@@ -306,7 +315,8 @@ def render_recommendations(agebs_hex):
     if st.button("🎯 Generar Recomendaciones"):
         with st.spinner("Generando recomendaciones..."):
             recommendations = generate_recommendations(
-                agebs_with_clusters,
+                agebs_hex,
+                profiles_data['clusters'],
                 min_population,
                 min_clients,
                 top_n
@@ -487,55 +497,73 @@ def render_predictive_analysis(agebs_hex):
 
 # Helper functions
 
-def find_similar_locations(agebs_with_clusters, reference_location, profiles_data):
+def has_current_profiles(agebs_hex):
+    """Check for customer profiles computed on this grid, discarding stale ones"""
+    profiles = st.session_state.get('customer_profiles')
+    if profiles is None:
+        return False
+    if profiles.get('grid_key') != cache_key(agebs_hex, 'customer_profiles'):
+        del st.session_state['customer_profiles']
+        return False
+    return True
+
+def find_similar_locations(agebs_hex, reference_location, profiles_data, hex_index=None):
     """Find locations similar to reference using cosine similarity"""
+    from sklearn.metrics.pairwise import cosine_similarity
     
-    # Find nearest hexagon to reference location
-    agebs_with_clusters['distance_to_ref'] = np.sqrt(
-        (agebs_with_clusters.geometry.centroid.y - reference_location['lat'])**2 +
-        (agebs_with_clusters.geometry.centroid.x - reference_location['lng'])**2
-    )
-    
-    nearest_hex = agebs_with_clusters.loc[agebs_with_clusters['distance_to_ref'].idxmin()]
+    # Find nearest hexagon to reference location using the shared spatial index
+    if hex_index is None:
+        hex_index = get_hex_index(agebs_hex)
+    nearest_pos = hex_index.nearest(reference_location['lat'], reference_location['lng'])[0]
+    distance_to_ref = hex_index.distances(reference_location['lat'], reference_location['lng'])
     
     # Prepare feature data
     feature_cols = profiles_data['feature_cols']
     scaler = profiles_data['scaler']
     
-    # Get reference features
-    ref_features = nearest_hex[feature_cols].values.reshape(1, -1)
+    # Features from the shared memory-mapped matrix
+    all_features = get_feature_matrix(agebs_hex).select(feature_cols, fill_value=0)
+    ref_features = all_features[nearest_pos].reshape(1, -1)
     ref_features_scaled = scaler.transform(ref_features)
-    
-    # Get all features
-    all_features = agebs_with_clusters[feature_cols].fillna(0)
     all_features_scaled = scaler.transform(all_features)
     
     # Calculate similarity
     similarities = cosine_similarity(ref_features_scaled, all_features_scaled)[0]
     
-    # Add similarity scores
-    agebs_with_clusters = agebs_with_clusters.copy()
-    agebs_with_clusters['similarity_score'] = similarities
-    
-    # Calculate distances in km (approximate)
-    agebs_with_clusters['distance_km'] = agebs_with_clusters['distance_to_ref'] * 111  # Rough conversion to km
+    # Distances in km from the projected centroid columns precomputed at load
+    if 'x_6372' in agebs_hex.columns:
+        ref_x, ref_y = project_points(reference_location['lat'], reference_location['lng'])
+        distance_km = np.hypot(
+            agebs_hex['x_6372'].to_numpy() - ref_x,
+            agebs_hex['y_6372'].to_numpy() - ref_y
+        ) / 1000
+    else:
+        distance_km = distance_to_ref * 111  # Rough conversion to km
+    
+    # Filter before copying so the shared grid is never modified
+    mask = (
+        (similarities > 0.7) &  # High similarity threshold
+        (distance_km > 1)  # Exclude very close locations
+    )
     
-    # Filter and sort
-    similar_locations = agebs_with_clusters[
-        (agebs_with_clusters['similarity_score'] > 0.7) &  # High similarity threshold
-        (agebs_with_clusters['distance_km'] > 1)  # Exclude very close locations
-    ].sort_values('similarity_score', ascending=False)
+    similar_locations = agebs_hex[mask].copy()
+    similar_locations['cluster'] = profiles_data['clusters'][mask].values
+    similar_locations['similarity_score'] = similarities[mask]
+    similar_locations['distance_to_ref'] = distance_to_ref[mask]
+    similar_locations['distance_km'] = distance_km[mask]
     
-    return similar_locations
+    return similar_locations.sort_values('similarity_score', ascending=False)
 
-def generate_recommendations(agebs_with_clusters, min_population, min_clients, top_n):
+def generate_recommendations(agebs_hex, clusters, min_population, min_clients, top_n):
     """Generate expansion recommendations based on multiple criteria"""
     
     # Filter by minimum criteria
-    filtered_data = agebs_with_clusters[
-        (agebs_with_clusters['poblacion_total'] >= min_population) &
-        (agebs_with_clusters['clientes_totales'] >= min_clients)
-    ].copy()
+    mask = (
+        (agebs_hex['poblacion_total'] >= min_population) &
+        (agebs_hex['clientes_totales'] >= min_clients)
+    )
+    filtered_data = agebs_hex[mask].copy()
+    filtered_data['cluster'] = clusters[mask]
     
     if len(filtered_data) == 0:
         return pd.DataFrame()
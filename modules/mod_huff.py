@@ -7,7 +7,6 @@ import pandas as pd
 import numpy as np
 import folium
 from streamlit_folium import st_folium
-import plotly.express as px
 from pathlib import Path
 import sys
 
@@ -17,6 +16,9 @@ sys.path.append(str(Path(__file__).parent.parent / "utils"))
 from config import APP_CONFIG, GOOGLE_PLACES_API_KEY
 from huff_model import huff_model
 from google_places import get_google_place_rating
+from competencia import collect_competencia
+from feature_matrix import get_feature_matrix
+from grid_store import grid_coordinates
 
 def render_huff_page():
     st.header("📊 Análisis de Captación - Modelo Huff")
@@ -24,6 +26,10 @@ def render_huff_page():
     if not GOOGLE_PLACES_API_KEY:
         st.warning("⚠️ GOOGLE_PLACES_API_KEY no configurada. Atractividad de competencia usará valores por defecto.")
     
+    # Wait for a competitor lookup started from the map, if any
+    with st.spinner("Buscando competencia cercana..."):
+        collect_competencia(st.session_state, wait=True)
+    
     # Check if we have map data
     map_data = st.session_state.get('map_data', {})
     
@@ -150,19 +156,19 @@ def calculate_huff_model(sucursal_nombre, sucursales_data, map_data, alfa, beta)
         # Get AGEB data
         agebs_hex = st.session_state.agebs_hex
         
-        # Calculate centroids for AGEBs
-        agebs_data = []
-        for idx, row in agebs_hex.iterrows():
-            if pd.notna(row['geometry']):
-                centroid = row['geometry'].centroid
-                agebs_data.append({
-                    'cvegeo': row.get('id_hex', f'ageb_{idx}'),
-                    'lat': centroid.y,
-                    'lng': centroid.x,
-                    'poblacion': row.get('clientes_totales', 100)
-                })
-        
-        agebs_df = pd.DataFrame(agebs_data)
+        # AGEB centroids come from the grid's shared contiguous coordinate array,
+        # demand from the shared memory-mapped feature matrix
+        features = get_feature_matrix(agebs_hex)
+        coords = grid_coordinates(agebs_hex)
+        valid = ~np.isnan(coords[:, 1])
+        agebs_df = pd.DataFrame({
+            'cvegeo': agebs_hex['id_hex'].to_numpy() if 'id_hex' in agebs_hex.columns
+                      else [f'ageb_{idx}' for idx in agebs_hex.index],
+            'lat': coords[:, 1],
+            'lng': coords[:, 0],
+            'poblacion': features.column('clientes_totales') if 'clientes_totales' in features
+                         else 100
+        })[valid].reset_index(drop=True)
         
         if len(agebs_df) == 0:
             st.error("No hay datos de AGEBs disponibles")
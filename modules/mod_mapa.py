@@ -8,16 +8,24 @@ from streamlit_folium import st_folium
 import pandas as pd
 import numpy as np
 import plotly.express as px
-import plotly.graph_objects as go
 from pathlib import Path
 import sys
+import shapely
 
 # Add utils to path
 sys.path.append(str(Path(__file__).parent.parent / "utils"))
 
-from config import APP_CONFIG, INEGI_API_KEY
+from config import APP_CONFIG, INEGI_API_KEY, get_grid_store, load_grid_partitions
 from inegi_denue import inegi_denue
-from helpers import get_centroid_for_area
+from denue_harvest import iter_harvest
+from denue_schema import DENUE_ESTRATOS, concat_denue, filter_denue, normalize_denue
+from denue_store import get_denue_store
+from synthetic_grid import synthetic_denue
+from helpers import get_centroid_for_area, get_area_lookup
+from competencia import click_key, submit_nearest_competitors, collect_competencia, wait_competencia
+from spatial_index import get_hex_index, viewport_bounds
+from h3_grid import h3_available, get_h3_pyramid, resolution_for_zoom
+from raster import get_choropleth_overlay
 
 def render_mapa_page():
     st.header("🗺️ Mapa Principal")
@@ -32,7 +40,13 @@ def render_mapa_page():
     
     if 'clicked_coordinates' not in st.session_state:
         st.session_state.clicked_coordinates = None
-    
+
+    if 'last_click' not in st.session_state:
+        st.session_state.last_click = {'key': None}
+
+    if 'map_zoom' not in st.session_state:
+        st.session_state.map_zoom = 13
+
     # Main layout
     col1, col2 = st.columns([2, 1])
     
@@ -49,13 +63,13 @@ def render_mapa_page():
             # Get unique municipalities and localities
             agebs_hex = st.session_state.agebs_hex
             if 'nombre_municipio' in agebs_hex.columns:
-                municipios = sorted(agebs_hex['nombre_municipio'].dropna().unique())
-                municipio = st.selectbox("Municipio:", [""] + municipios)
+                area_lookup = get_area_lookup(agebs_hex)
+                municipio = st.selectbox("Municipio:", [""] + area_lookup['municipios'])
                 
                 if municipio:
-                    localidades = sorted(agebs_hex[agebs_hex['nombre_municipio'] == municipio]['nombre_localidad'].dropna().unique())
+                    localidades = area_lookup['localidades_por_municipio'].get(municipio, [])
                 else:
-                    localidades = sorted(agebs_hex['nombre_localidad'].dropna().unique())
+                    localidades = area_lookup['localidades']
                 
                 localidad = st.selectbox("Localidad:", [""] + localidades)
             else:
@@ -68,7 +82,7 @@ def render_mapa_page():
                     if coords:
                         st.session_state.centro_lat = coords['lat']
                         st.session_state.centro_lng = coords['lng']
-                        st.session_state.clicked_coordinates = coords
+                        st.session_state.clicked_coordinates = {'lat': coords['lat'], 'lng': coords['lng']}
                         st.success(f"Mapa centrado en: {municipio}, {localidad}")
                         st.rerun()
                     else:
@@ -116,53 +130,117 @@ def render_mapa_page():
                             st.success(f"Se encontraron {len(negocios)} negocios")
                         else:
                             st.warning("No se encontraron negocios")
+            
+            area_censo = st.radio("Área del censo:", ["Municipio", "Vista del mapa"], horizontal=True)
+            if st.button("Censo de competencia"):
+                negocios = harvest_area(area_censo, municipio, palabra_clave)
+                if negocios is not None:
+                    st.session_state.negocios_data = negocios
+                    if len(negocios) > 0:
+                        st.success(f"Se encontraron {len(negocios)} negocios")
+                    else:
+                        st.warning("No se encontraron negocios")
+        
+        # Local filters over the typed business table
+        if len(st.session_state.negocios_data) > 0:
+            with st.expander("Filtrar negocios"):
+                clase = st.text_input("Actividad contiene:", value="")
+                scian = st.text_input("Código SCIAN (prefijo):", value="")
+                estrato_min, estrato_max = st.select_slider(
+                    "Personal ocupado:",
+                    options=DENUE_ESTRATOS,
+                    value=(DENUE_ESTRATOS[0], DENUE_ESTRATOS[-1])
+                )
+                st.session_state.negocios_filtros = {
+                    'clase': clase.strip() or None,
+                    'scian': scian.strip() or None,
+                    'estrato_min': estrato_min if estrato_min != DENUE_ESTRATOS[0] else None,
+                    'estrato_max': estrato_max if estrato_max != DENUE_ESTRATOS[-1] else None
+                }
+                visibles = filter_denue(st.session_state.negocios_data, **st.session_state.negocios_filtros)
+                st.caption(f"{len(visibles)} de {len(st.session_state.negocios_data)} negocios")
         
         # Map display options
         mostrar_hexbin = st.checkbox("Mostrar hexágonos", value=True)
         
+        if h3_available():
+            malla = st.radio(
+                "Malla:",
+                ["Hexágonos 500 m", "H3 multirresolución"],
+                horizontal=True
+            )
+            st.session_state.grid_backend = 'h3' if malla == "H3 multirresolución" else 'hex'
+        
+        modo_render = st.radio(
+            "Render de hexágonos:",
+            ["Vectorial", "Ráster"],
+            horizontal=True
+        )
+        st.session_state.map_render_mode = 'raster' if modo_render == "Ráster" else 'vector'
+        
         # Reset button
         if st.button("Borrar marcadores y centrar mapa"):
             st.session_state.negocios_data = pd.DataFrame()
+            st.session_state.negocios_filtros = {}
             st.session_state.clicked_coordinates = None
             st.session_state.centro_lat = APP_CONFIG['default_lat']
             st.session_state.centro_lng = APP_CONFIG['default_lng']
+            st.session_state.map_zoom = 13
             st.rerun()
         
         # Create and display map
         m = create_map(mostrar_hexbin)
-        map_data = st_folium(m, width=700, height=500, returned_objects=["last_clicked"])
+        map_data = st_folium(m, width=700, height=500, returned_objects=["last_clicked", "center", "zoom"])
         
-        # Handle map clicks
+        # Handle map clicks. st_folium keeps returning the last click on every
+        # rerun (with no timestamp), so only a click at new coordinates is
+        # processed as an event.
         if map_data['last_clicked']:
             clicked_lat = map_data['last_clicked']['lat']
             clicked_lng = map_data['last_clicked']['lng']
-            
-            st.session_state.clicked_coordinates = {
-                'lat': clicked_lat, 
-                'lng': clicked_lng
-            }
-            st.session_state.centro_lat = clicked_lat
-            st.session_state.centro_lng = clicked_lng
-            
-            # Update map_data for Huff model
-            st.session_state.map_data['clicked_sucursal'] = {
-                'lat': clicked_lat,
-                'lng': clicked_lng
-            }
-            
-            # Find nearby competition
-            if INEGI_API_KEY:
-                negocios = search_businesses(clicked_lat, clicked_lng, "todos", 500)
-                if len(negocios) > 0:
-                    # Get 5 nearest businesses
-                    negocios['distancia'] = np.sqrt(
-                        (negocios['latitud'] - clicked_lat)**2 + 
-                        (negocios['longitud'] - clicked_lng)**2
+            key = click_key(clicked_lat, clicked_lng)
+
+            if key is not None and key != st.session_state.last_click['key']:
+                st.session_state.last_click = {'key': key}
+
+                st.session_state.clicked_coordinates = {
+                    'lat': clicked_lat,
+                    'lng': clicked_lng
+                }
+                st.session_state.centro_lat = clicked_lat
+                st.session_state.centro_lng = clicked_lng
+
+                # Update map_data for Huff model
+                st.session_state.map_data['clicked_sucursal'] = {
+                    'lat': clicked_lat,
+                    'lng': clicked_lng
+                }
+                st.session_state.map_data['competencia'] = None
+
+                # Find nearby competition in the background
+                if INEGI_API_KEY or get_denue_store() is not None:
+                    st.session_state.competencia_future = submit_nearest_competitors(
+                        clicked_lat, clicked_lng, INEGI_API_KEY
                     )
-                    competencia = negocios.nsmallest(5, 'distancia')
-                    st.session_state.map_data['competencia'] = competencia
-            
+
             st.info("Punto seleccionado en el mapa. Use 'Buscar negocios' para encontrar negocios aquí.")
+
+        # Notice and result of the background competitor lookup, updated in place
+        competencia_area = st.empty()
+        collect_competencia(st.session_state, wait=False)
+        render_competencia(competencia_area)
+
+        # Follow pans and zooms so the next render culls hexagons to the new view
+        if map_data.get('center') and map_data.get('zoom'):
+            view = click_key(map_data['center']['lat'], map_data['center']['lng']) + (map_data['zoom'],)
+            current = click_key(st.session_state.centro_lat, st.session_state.centro_lng) + (st.session_state.map_zoom,)
+
+            if view != st.session_state.get('last_view') and view != current:
+                st.session_state.last_view = view
+                st.session_state.centro_lat = map_data['center']['lat']
+                st.session_state.centro_lng = map_data['center']['lng']
+                st.session_state.map_zoom = map_data['zoom']
+                st.rerun()
     
     with col2:
         # Variable selection and histogram
@@ -202,6 +280,32 @@ def render_mapa_page():
                 st.warning("No hay datos disponibles para el histograma")
         else:
             st.warning("Variable no disponible en los datos")
+    
+    # With the page rendered, poll a running competitor lookup and show its
+    # result in its own area; the map is not rerun. Updating the area on
+    # every poll lets a user interaction interrupt the loop.
+    while wait_competencia(st.session_state):
+        collect_competencia(st.session_state, wait=False)
+        render_competencia(competencia_area)
+
+def render_competencia(area):
+    """Show the competitor lookup notice or its nearest businesses in a st.empty area"""
+    
+    if st.session_state.get('competencia_future') is not None:
+        area.caption("Buscando competencia cercana al punto seleccionado...")
+        return
+    
+    competencia = st.session_state.map_data.get('competencia')
+    if competencia is None or len(competencia) == 0:
+        area.empty()
+        return
+    
+    with area.container():
+        st.caption("Competencia más cercana al punto seleccionado")
+        st.dataframe(
+            competencia[['nombre', 'distancia']].rename(columns={'distancia': 'distancia (km)'}).round(2),
+            hide_index=True
+        )
 
 def create_map(mostrar_hexbin=True):
     """Create the folium map with hexagons and markers"""
@@ -209,7 +313,7 @@ def create_map(mostrar_hexbin=True):
     # Create base map
     m = folium.Map(
         location=[st.session_state.centro_lat, st.session_state.centro_lng],
-        zoom_start=13,
+        zoom_start=st.session_state.map_zoom,
         tiles='CartoDB positron'
     )
     
@@ -217,6 +321,26 @@ def create_map(mostrar_hexbin=True):
     if mostrar_hexbin:
         agebs_hex = st.session_state.agebs_hex
         
+        # Only render the hexagons inside the (padded) map viewport
+        south, west, north, east = viewport_bounds(
+            st.session_state.centro_lat,
+            st.session_state.centro_lng,
+            st.session_state.map_zoom
+        )
+        
+        # With a partitioned grid store, read only the partitions in view
+        store = get_grid_store() if st.session_state.get('grid_region') else None
+        if store is not None and st.session_state.get('grid_backend') != 'h3':
+            in_view = store.intersecting((south, west, north, east), st.session_state.grid_region)
+            if in_view:
+                agebs_hex = load_grid_partitions(in_view)
+        
+        # With the H3 backend, the resolution follows the zoom level
+        if st.session_state.get('grid_backend') == 'h3':
+            pyramid = get_h3_pyramid(agebs_hex)
+            if pyramid:
+                agebs_hex = pyramid[resolution_for_zoom(st.session_state.map_zoom)]
+        
         # Get selected variable for coloring
         variable_options = {
             "Joven Digital": "joven_digital",
@@ -229,8 +353,27 @@ def create_map(mostrar_hexbin=True):
         selected_var = getattr(st.session_state, 'selected_variable', 'clientes_totales')
         
         if selected_var in agebs_hex.columns:
+            if st.session_state.get('map_render_mode') == 'raster':
+                # Single server-rendered image instead of one polygon per hexagon
+                overlay = get_choropleth_overlay(
+                    agebs_hex,
+                    selected_var,
+                    (south, west, north, east),
+                    st.session_state.map_zoom
+                )
+                folium.raster_layers.ImageOverlay(
+                    image=overlay['image'],
+                    bounds=overlay['bounds'],
+                    opacity=0.8
+                ).add_to(m)
+                visible = []
+            else:
+                visible = get_hex_index(agebs_hex).in_bounds(south, west, north, east)
+            
+            max_value = agebs_hex[selected_var].max()
+            
             # Add hexagons with color coding
-            for idx, row in agebs_hex.iterrows():
+            for idx, row in agebs_hex.iloc[visible].iterrows():
                 if pd.notna(row['geometry']):
                     # Convert geometry to coordinates
                     coords = []
@@ -240,8 +383,7 @@ def create_map(mostrar_hexbin=True):
                     if coords:
                         # Color based on variable value
                         value = row[selected_var] if pd.notna(row[selected_var]) else 0
-                        color_intensity = min(value / agebs_hex[selected_var].max() if agebs_hex[selected_var].max() > 0 else 0, 1)
-                        color = f"rgba(122, 158, 126, {0.3 + 0.4 * color_intensity})"
+                        color_intensity = min(value / max_value if max_value > 0 else 0, 1)
                         
                         folium.Polygon(
                             locations=coords,
@@ -258,7 +400,8 @@ def create_map(mostrar_hexbin=True):
     
     # Add business markers
     if len(st.session_state.negocios_data) > 0:
-        for idx, negocio in st.session_state.negocios_data.iterrows():
+        negocios = filter_denue(st.session_state.negocios_data, **st.session_state.get('negocios_filtros', {}))
+        for idx, negocio in negocios.iterrows():
             folium.Marker(
                 location=[negocio['latitud'], negocio['longitud']],
                 popup=negocio['nombre'],
@@ -279,19 +422,14 @@ def create_map(mostrar_hexbin=True):
     return m
 
 def search_businesses(lat, lng, keyword, radius):
-    """Search for businesses using INEGI API or return simulated data"""
+    """Search for businesses using the local DENUE store, the INEGI API or return simulated data"""
     
-    if not INEGI_API_KEY:
-        # Return simulated data
-        n_negocios = np.random.randint(5, 15)
-        return pd.DataFrame({
-            'nombre': [f'Negocio Simulado {i+1}' for i in range(n_negocios)],
-            'latitud': lat + np.random.uniform(-0.005, 0.005, n_negocios),
-            'longitud': lng + np.random.uniform(-0.005, 0.005, n_negocios)
-        })
+    if not INEGI_API_KEY and get_denue_store() is None:
+        # Return simulated data (deterministic: the same search gives the same businesses)
+        return normalize_denue(pd.DataFrame(synthetic_denue(lat, lng, radius, keyword)))
     
     try:
-        # Use real INEGI API
+        # Use the local DENUE store or the real INEGI API
         negocios = inegi_denue(
             latitud=lat,
             longitud=lng,
@@ -302,4 +440,49 @@ def search_businesses(lat, lng, keyword, radius):
         return negocios
     except Exception as e:
         st.error(f"Error buscando negocios: {e}")
-        return pd.DataFrame()
\ No newline at end of file
+        return pd.DataFrame()
+
+def harvest_area(area, municipio, keyword):
+    """
+    Harvest every DENUE business of the selected municipality or of the map view
+    
+    Tile queries run concurrently; a progress bar shows the tiles done and
+    the businesses found so far.
+    
+    Returns:
+    - pandas.DataFrame of unique businesses, or None if the harvest could not run
+    """
+    
+    if not INEGI_API_KEY and get_denue_store() is None:
+        st.warning("El censo de competencia requiere INEGI_API_KEY o un DENUE local importado")
+        return None
+    
+    agebs_hex = st.session_state.agebs_hex
+    if area == "Municipio":
+        if not municipio or 'nombre_municipio' not in agebs_hex.columns:
+            st.warning("Seleccione un municipio")
+            return None
+        hexes = agebs_hex.geometry.values[(agebs_hex['nombre_municipio'] == municipio).to_numpy()]
+        polygon = shapely.union_all(np.asarray(hexes))
+    else:
+        south, west, north, east = viewport_bounds(
+            st.session_state.centro_lat,
+            st.session_state.centro_lng,
+            st.session_state.map_zoom,
+            padding=0
+        )
+        polygon = shapely.box(west, south, east, north)
+    
+    progress = st.progress(0.0, text="Iniciando censo...")
+    frames = []
+    found = 0
+    try:
+        for done, total, negocios in iter_harvest(polygon, INEGI_API_KEY, keyword=keyword):
+            frames.append(negocios)
+            found += len(negocios)
+            progress.progress(done / total, text=f"{done}/{total} zonas consultadas · {found} negocios")
+    except ValueError as e:
+        st.error(f"Área demasiado grande para el censo: {e}")
+        return None
+    
+    return concat_denue(frames)
@@ -8,6 +8,16 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+import folium
+from streamlit_folium import st_folium
+from pathlib import Path
+import sys
+
+# Add utils to path
+sys.path.append(str(Path(__file__).parent.parent / "utils"))
+
+from raster import get_choropleth_overlay, zoom_for_bounds
+from feature_matrix import get_feature_matrix
 
 def render_socio_page():
     st.header("👥 Análisis Socioeconómico")
@@ -56,10 +66,17 @@ def render_socio_page():
     with tab4:
         render_statistics(agebs_hex, selected_vars, variable_options)
 
+def _valid_values(features, var_col):
+    """Non-missing values of a feature; a zero-copy view when it has no NaN"""
+    values = features.column(var_col)
+    return values[~np.isnan(values)] if features.has_nan[var_col] else values
+
 def render_histograms(agebs_hex, selected_vars, variable_options):
     """Render histogram analysis"""
     st.subheader("Distribución de Variables Socioeconómicas")
     
+    features = get_feature_matrix(agebs_hex)
+    
     # Calculate number of columns for layout
     n_vars = len(selected_vars)
     n_cols = min(2, n_vars)
@@ -78,8 +95,8 @@ def render_histograms(agebs_hex, selected_vars, variable_options):
     for i, var_name in enumerate(selected_vars):
         var_col = variable_options[var_name]
         
-        if var_col in agebs_hex.columns:
-            data = agebs_hex[var_col].dropna()
+        if var_col in features:
+            data = _valid_values(features, var_col)
             
             if len(data) > 0:
                 row = (i // n_cols) + 1
@@ -110,14 +127,14 @@ def render_histograms(agebs_hex, selected_vars, variable_options):
     stats_data = []
     for var_name in selected_vars:
         var_col = variable_options[var_name]
-        if var_col in agebs_hex.columns:
-            data = agebs_hex[var_col].dropna()
+        if var_col in features:
+            data = _valid_values(features, var_col)
             if len(data) > 0:
                 stats_data.append({
                     'Variable': var_name,
                     'Media': data.mean(),
-                    'Mediana': data.median(),
-                    'Desv. Estándar': data.std(),
+                    'Mediana': np.median(data),
+                    'Desv. Estándar': data.std(ddof=1),
                     'Mínimo': data.min(),
                     'Máximo': data.max(),
                     'Observaciones': len(data)
@@ -131,19 +148,20 @@ def render_correlations(agebs_hex, selected_vars, variable_options):
     """Render correlation analysis"""
     st.subheader("Análisis de Correlaciones")
     
-    # Prepare data for correlation
-    corr_data = {}
-    for var_name in selected_vars:
-        var_col = variable_options[var_name]
-        if var_col in agebs_hex.columns:
-            corr_data[var_name] = agebs_hex[var_col].fillna(0)
+    # Prepare data for correlation from the shared memory-mapped matrix
+    features = get_feature_matrix(agebs_hex)
+    corr_names = [var_name for var_name in selected_vars if variable_options[var_name] in features]
     
-    if len(corr_data) < 2:
+    if len(corr_names) < 2:
         st.warning("Se necesitan al menos 2 variables para el análisis de correlación")
         return
     
-    corr_df = pd.DataFrame(corr_data)
-    correlation_matrix = corr_df.corr()
+    corr_values = features.select([variable_options[var_name] for var_name in corr_names], fill_value=0)
+    correlation_matrix = pd.DataFrame(
+        np.corrcoef(corr_values, rowvar=False),
+        index=corr_names,
+        columns=corr_names
+    )
     
     # Create correlation heatmap
     fig = px.imshow(
@@ -177,8 +195,8 @@ def render_correlations(agebs_hex, selected_vars, variable_options):
         high_corr_pairs.sort(key=lambda x: abs(x[2]), reverse=True)
         
         for i, (var1, var2, corr_val) in enumerate(high_corr_pairs[:3]):
-            col1_data = corr_df[var1]
-            col2_data = corr_df[var2]
+            col1_data = corr_values[:, corr_names.index(var1)]
+            col2_data = corr_values[:, corr_names.index(var2)]
             
             fig = px.scatter(
                 x=col1_data,
@@ -211,11 +229,30 @@ def render_spatial_distribution(agebs_hex, selected_vars, variable_options):
     # Create choropleth-style visualization
     st.info("💡 Esta visualización muestra la distribución espacial de la variable seleccionada")
     
+    # Rasterized choropleth: one image overlay regardless of the number of hexagons
+    minx, miny, maxx, maxy = agebs_hex.total_bounds
+    bounds = (miny, minx, maxy, maxx)
+    zoom = zoom_for_bounds(bounds)
+    overlay = get_choropleth_overlay(agebs_hex, var_col, bounds, zoom)
+    
+    m = folium.Map(
+        location=[(miny + maxy) / 2, (minx + maxx) / 2],
+        zoom_start=zoom,
+        tiles='CartoDB positron'
+    )
+    folium.raster_layers.ImageOverlay(
+        image=overlay['image'],
+        bounds=overlay['bounds'],
+        opacity=0.8
+    ).add_to(m)
+    st_folium(m, width=700, height=450, returned_objects=[])
+    st.caption(f"{map_var}: {overlay['vmin']:.2f} (claro) a {overlay['vmax']:.2f} (oscuro)")
+    
     # Summary by municipality/locality if available
     if 'nombre_municipio' in agebs_hex.columns:
         st.subheader(f"Resumen por Municipio - {map_var}")
         
-        mun_summary = agebs_hex.groupby('nombre_municipio')[var_col].agg([
+        mun_summary = agebs_hex.groupby('nombre_municipio', observed=True)[var_col].agg([
             'count', 'mean', 'median', 'std', 'min', 'max'
         ]).round(2)
         
@@ -223,7 +260,7 @@ def render_spatial_distribution(agebs_hex, selected_vars, variable_options):
         st.dataframe(mun_summary, use_container_width=True)
         
         # Bar chart by municipality
-        mun_means = agebs_hex.groupby('nombre_municipio')[var_col].mean().sort_values(ascending=False)
+        mun_means = agebs_hex.groupby('nombre_municipio', observed=True)[var_col].mean().sort_values(ascending=False)
         
         fig = px.bar(
             x=mun_means.index,
@@ -238,7 +275,7 @@ def render_spatial_distribution(agebs_hex, selected_vars, variable_options):
     if 'nombre_localidad' in agebs_hex.columns:
         st.subheader(f"Top 10 Localidades - {map_var}")
         
-        loc_summary = agebs_hex.groupby('nombre_localidad')[var_col].agg([
+        loc_summary = agebs_hex.groupby('nombre_localidad', observed=True)[var_col].agg([
             'count', 'mean'
         ]).round(2)
         
@@ -5,9 +5,20 @@ Simple script to run the Rosa Oliva Geoespacial Streamlit app
 
 import os
 import sys
+import time
+import argparse
 import subprocess
 from pathlib import Path
 
+# Modules imported before the Mapa page can paint (app shell + Mapa page)
+STARTUP_IMPORTS = "import app, modules.mod_mapa"
+
+# Modules imported when every page and its heavy dependencies load eagerly
+EAGER_IMPORTS = (
+    "import app, modules.mod_mapa, modules.mod_huff, modules.mod_socio, modules.mod_agente, "
+    "sklearn.cluster, sklearn.decomposition, sklearn.metrics.pairwise, plotly.subplots"
+)
+
 def check_requirements():
     """Check if required packages are installed"""
     try:
@@ -68,8 +79,98 @@ def run_app():
     except Exception as e:
         print(f"❌ Error running app: {e}")
 
+def profile_imports(statement=STARTUP_IMPORTS, top=15):
+    """
+    Print the `python -X importtime` breakdown of an import statement
+    
+    Parameters:
+    - statement: Python import statement to profile
+    - top: Number of packages to list
+    
+    Returns:
+    - float: Total cumulative import time in milliseconds
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True, text=True, cwd=Path(__file__).parent
+    )
+    
+    # Lines look like: "import time:  self [us] | cumulative |  [indent]package"
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = [part for part in line.replace("import time:", "|", 1).split("|")]
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    
+    total_ms = sum(entry[3] for entry in entries if entry[1] == 0) / 1000
+    
+    # Attribute self time to root packages (e.g. all "sklearn.*" to "sklearn")
+    by_package = {}
+    for name, _, self_us, _ in entries:
+        root = name.split(".")[0]
+        by_package[root] = by_package.get(root, 0) + self_us
+    
+    print(f"Import profile for: {statement}")
+    print(f"{'package':<30}{'self time (ms)':>16}{'share':>8}")
+    for root, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"{root:<30}{self_us / 1000:>16.1f}{self_us / 1000 / total_ms:>8.0%}")
+    print(f"{'TOTAL':<30}{total_ms:>16.1f}")
+    
+    return total_ms
+
+def benchmark_startup(repeats=5, budget_ms=None):
+    """
+    Time cold imports of the Mapa page against eagerly importing every page
+    
+    Each measurement runs in a fresh Python process.
+    
+    Parameters:
+    - repeats: Number of runs per scenario
+    - budget_ms: Maximum allowed best time for the Mapa page (optional)
+    
+    Returns:
+    - bool: True if the Mapa page import is within budget (or no budget given)
+    """
+    timings = {}
+    for label, statement in (("Mapa page", STARTUP_IMPORTS), ("All pages", EAGER_IMPORTS)):
+        runs = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", statement], check=True,
+                           cwd=Path(__file__).parent, capture_output=True)
+            runs.append((time.perf_counter() - start) * 1000)
+        timings[label] = runs
+        print(f"{label:<10}: best {min(runs):.0f} ms, mean {sum(runs) / len(runs):.0f} ms")
+    
+    saved = min(timings["All pages"]) - min(timings["Mapa page"])
+    print(f"Lazy page imports save {saved:.0f} ms before the Mapa page can render")
+    
+    if budget_ms is not None and min(timings["Mapa page"]) > budget_ms:
+        print(f"❌ Mapa page startup exceeds budget of {budget_ms:.0f} ms")
+        return False
+    
+    return True
+
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Run the Rosa Oliva Geoespacial app")
+    parser.add_argument("--profile-imports", action="store_true",
+                        help="Print the import-time breakdown of the Mapa page and exit")
+    parser.add_argument("--benchmark-startup", action="store_true",
+                        help="Benchmark Mapa page cold imports and exit")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="Fail the startup benchmark above this many milliseconds")
+    args = parser.parse_args()
+    
+    if args.profile_imports or args.benchmark_startup:
+        if args.profile_imports:
+            profile_imports()
+        if args.benchmark_startup and not benchmark_startup(budget_ms=args.budget_ms):
+            sys.exit(1)
+        return
+    
     print("🏪 Rosa Oliva Geoespacial - Streamlit App")
     print("=" * 50)
     
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# Same import convention as the app: utils modules import each other by name
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "utils"))
+sys.path.insert(0, str(ROOT))
@@ -0,0 +1,28 @@
+import pandas as pd
+
+from business_index import BusinessIndex, tokenize
+from denue_schema import normalize_denue
+
+def _negocios():
+    return normalize_denue(pd.DataFrame({
+        'Id': ['1', '2', '3'],
+        'Nombre': ['Joyería Luna', 'Farmacia Sol', 'Joyas del Centro'],
+        'Razon_social': ['', '', ''],
+        'Clase_actividad': ['Comercio al por menor de joyería', 'Farmacias sin minisúper',
+                            'Comercio al por menor de bisutería'],
+        'Estrato': ['0 a 5 personas'] * 3,
+        'Latitud': ['17.06', '17.061', '17.062'],
+        'Longitud': ['-96.72', '-96.721', '-96.722']
+    }))
+
+def test_tokenize_folds_accents_and_drops_stopwords():
+    assert tokenize("Joyería de la Ciudad") == ['joyeria', 'ciudad']
+
+def test_search_is_exact_unless_fuzzy_is_requested():
+    index = BusinessIndex()
+    index.add(_negocios(), 'todos', 17.06, -96.72, 1000)
+
+    assert sorted(index.search("joyeria")['id']) == ['1']
+    assert len(index.search("joyeira")) == 0
+    assert sorted(index.search("joyeira", fuzzy=True)['id']) == ['1']
+    assert sorted(index.search("farm", fuzzy=True)['id']) == ['2']
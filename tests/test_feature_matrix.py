@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+
+from feature_matrix import (features_path_for, open_feature_matrix, publish_feature_matrix,
+                            remove_stale_matrices)
+from grid_partitions import GridPartitionStore, add_region
+from grid_store import make_grid_handle
+from synthetic_grid import synthetic_grid
+
+def test_matrices_published_in_cache_and_stale_versions_removed(tmp_path):
+    source = tmp_path / "data" / "hexagonos.shp"
+    source.parent.mkdir()
+    source.touch()
+    cache_dir = tmp_path / "cache"
+
+    old_grid = synthetic_grid(50, seed=1)
+    old_handle = make_grid_handle(old_grid, source=str(source))
+    old_path = features_path_for(old_handle, cache_dir)
+    publish_feature_matrix(old_grid, old_path, old_handle)
+    unrelated = features_path_for(make_grid_handle(old_grid), cache_dir)
+    publish_feature_matrix(old_grid, unrelated)
+
+    # The source file is replaced by a new version
+    os.utime(source, (old_handle.mtime + 10, old_handle.mtime + 10))
+    new_grid = synthetic_grid(50, seed=2)
+    new_handle = make_grid_handle(new_grid, source=str(source))
+    new_path = features_path_for(new_handle, cache_dir)
+    assert old_path.parent == cache_dir and new_path.parent == cache_dir
+    publish_feature_matrix(new_grid, new_path, new_handle)
+
+    assert remove_stale_matrices(new_handle, cache_dir) == 1
+    assert not old_path.exists() and not old_path.with_suffix('.json').exists()
+    assert unrelated.exists()
+    assert list(source.parent.iterdir()) == [source]
+
+    matrix = open_feature_matrix(new_path)
+    np.testing.assert_allclose(matrix.column('clientes_totales'),
+                               new_grid['clientes_totales'].to_numpy(dtype=np.float32))
+
+def test_partition_sets_of_one_manifest_keep_their_matrices(tmp_path):
+    grid = synthetic_grid(300, seed=3)
+    add_region(grid, tmp_path / "store", "Oaxaca")
+    store = GridPartitionStore(tmp_path / "store")
+    cache_dir = tmp_path / "cache"
+
+    first, second = store.partitions[0]['id'], store.partitions[1]['id']
+    paths = []
+    for ids in ([first], [first, second]):
+        part = store.load(ids)
+        handle = make_grid_handle(part, source=str(store.manifest_path))
+        paths.append(features_path_for(handle, cache_dir))
+        publish_feature_matrix(part, paths[-1], handle)
+        assert remove_stale_matrices(handle, cache_dir) == 0
+
+    assert paths[0] != paths[1]
+    assert all(path.exists() for path in paths)
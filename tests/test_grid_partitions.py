@@ -0,0 +1,30 @@
+import pytest
+
+from grid_partitions import GridPartitionStore, add_region
+from synthetic_grid import synthetic_grid
+
+def _grid(names):
+    grid = synthetic_grid(60, seed=5)
+    grid['nombre_municipio'] = [names[i % len(names)] for i in range(len(grid))]
+    return grid
+
+def test_colliding_municipality_names_get_their_own_files(tmp_path):
+    entries = add_region(_grid(["San Juan", "San-Juan", "Santa Lucía"]), tmp_path, "Oaxaca")
+
+    assert sorted(e['id'] for e in entries) == ['oaxaca/san_juan', 'oaxaca/san_juan_2', 'oaxaca/santa_lucia']
+    store = GridPartitionStore(tmp_path)
+    assert sum(len(store.read_partition(e['id'])) for e in entries) == 60
+
+def test_replacing_a_region_removes_superseded_files(tmp_path):
+    add_region(_grid(["Centro", "Xoxocotlán"]), tmp_path, "Oaxaca")
+    add_region(_grid(["Centro", "Tlalixtac"]), tmp_path, "Oaxaca")
+
+    files = sorted(path.name for path in (tmp_path / "oaxaca").iterdir())
+    assert files == ['centro.parquet', 'tlalixtac.parquet']
+
+def test_regions_sharing_a_folder_are_rejected(tmp_path):
+    add_region(_grid(["Centro"]), tmp_path, "Oaxaca ZMO")
+
+    with pytest.raises(ValueError):
+        add_region(_grid(["Centro"]), tmp_path, "Oaxaca-ZMO")
+    assert GridPartitionStore(tmp_path).regions() == ["Oaxaca ZMO"]
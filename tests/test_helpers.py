@@ -0,0 +1,22 @@
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import Polygon
+
+from helpers import build_area_lookup
+
+def _square(x):
+    return Polygon([(x, 0), (x + 1, 0), (x + 1, 1), (x, 1)])
+
+def test_area_lookup_rows_are_grid_positions():
+    grid = gpd.GeoDataFrame({
+        'nombre_municipio': [None, 'A', 'B', 'A', 'B'],
+        'nombre_localidad': ['L1', 'L1', 'L2', 'L2', 'L2'],
+        'geometry': [_square(0), _square(1), None, _square(3), _square(4)]
+    }, crs='EPSG:4326')
+
+    rows = build_area_lookup(grid)['rows']
+
+    np.testing.assert_array_equal(rows[('a', None)], [1, 3])
+    np.testing.assert_array_equal(rows[('b', None)], [4])
+    np.testing.assert_array_equal(rows[(None, 'l1')], [0, 1])
+    np.testing.assert_array_equal(rows[('a', 'l2')], [3])
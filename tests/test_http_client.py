@@ -0,0 +1,99 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+import http_client
+from mock_server import DENUE_PREFIX, start_mock_server
+
+# Error draws of the mock server at error_rate=0.3: 5 retries over 10 calls, at most 3 in a row
+SEED = 1
+
+def _buscar_url(server):
+    return f"{server.url}{DENUE_PREFIX}/Buscar/todos/17.06,-96.72/100/token"
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff delays requested by http_get, without sleeping"""
+    delays = []
+    monkeypatch.setattr(http_client, 'time', SimpleNamespace(sleep=delays.append, perf_counter=time.perf_counter))
+    return delays
+
+@pytest.fixture
+def server_factory():
+    servers = []
+
+    def start(**options):
+        server = start_mock_server(**options)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+@pytest.mark.parametrize('status', [429, 503])
+def test_retries_until_success(server_factory, sleeps, status):
+    server = server_factory(error_rate=0.3, error_status=status, seed=SEED)
+
+    statuses = [http_client.http_get(_buscar_url(server), endpoint='test.retry').status_code
+                for _ in range(10)]
+
+    assert statuses == [200] * 10
+    assert server.stats()['denue.buscar'] > 10
+    assert len(sleeps) == server.stats()['denue.buscar'] - 10
+
+@pytest.mark.parametrize('status', [429, 503])
+def test_gives_up_after_max_retries(server_factory, sleeps, status):
+    server = server_factory(error_rate=1.0, error_status=status)
+
+    response = http_client.http_get(_buscar_url(server), endpoint='test.give_up')
+
+    assert response.status_code == status
+    assert server.stats()['denue.buscar'] == http_client.MAX_RETRIES + 1
+    assert len(sleeps) == http_client.MAX_RETRIES
+
+def test_backoff_stays_within_max():
+    for attempt in range(1, 20):
+        for _ in range(50):
+            assert 0 <= http_client.backoff_delay(attempt) <= http_client.BACKOFF_MAX
+    assert http_client.backoff_delay(1, retry_after='120') == http_client.BACKOFF_MAX
+    assert http_client.backoff_delay(1, retry_after='0') == 0
+
+def test_host_timeout_applied_and_read_timeout_not_retried(server_factory, sleeps, monkeypatch):
+    server = server_factory(latency_ms=500)
+    monkeypatch.setitem(http_client.HOST_TIMEOUTS, '127.0.0.1', (1, 0.1))
+
+    assert http_client.host_timeout(server.url) == (1, 0.1)
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        http_client.http_get(_buscar_url(server), endpoint='test.timeout')
+
+    assert server.stats()['denue.buscar'] == 1
+    assert sleeps == []
+
+def test_read_timeout_retried_when_requested(server_factory, sleeps, monkeypatch):
+    server = server_factory(latency_ms=500)
+    monkeypatch.setitem(http_client.HOST_TIMEOUTS, '127.0.0.1', (1, 0.1))
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        http_client.http_get(_buscar_url(server), endpoint='test.timeout_retry', retry_timeouts=True)
+
+    assert server.stats()['denue.buscar'] == http_client.MAX_RETRIES + 1
+
+def test_latency_histograms_filled(server_factory, sleeps):
+    server = server_factory(latency_ms=30)
+    http_client.reset_latency_histograms()
+
+    for _ in range(3):
+        http_client.http_get(_buscar_url(server), endpoint='test.latency')
+
+    hist = http_client.latency_histograms()['test.latency']
+    assert hist['count'] == 3
+    assert sum(count for _, count in hist['buckets']) == 3
+    assert hist['errors'] == 0 and hist['retries'] == 0
+    assert hist['mean_ms'] >= 30
+
+    report = http_client.format_latency_histograms()
+    assert report.startswith("test.latency: 3 responses, 0 errors, 0 retries")
@@ -0,0 +1,19 @@
+import numpy as np
+import pandas as pd
+
+from perfiles import CENSUS_VALUE_COLUMNS, read_census_agebs
+
+def test_all_missing_agebs_sum_to_zero(tmp_path):
+    rows = []
+    for ageb, value in [('0010', '*'), ('0010', '*'), ('0025', '3'), ('0025', '*')]:
+        row = {'ENTIDAD': '20', 'MUN': '067', 'LOC': '0001', 'AGEB': ageb,
+               'NOM_ENT': 'Oaxaca', 'NOM_MUN': 'Oaxaca de Juárez', 'NOM_LOC': 'Oaxaca de Juárez'}
+        row.update({col: value for col in CENSUS_VALUE_COLUMNS})
+        rows.append(row)
+    path = tmp_path / "censo.csv"
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+    agebs = read_census_agebs(path, chunksize=3).set_index('CVEGEO')
+
+    np.testing.assert_array_equal(agebs.loc['2006700010010', CENSUS_VALUE_COLUMNS], 0)
+    np.testing.assert_array_equal(agebs.loc['2006700010025', CENSUS_VALUE_COLUMNS], 3)
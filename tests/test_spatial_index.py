@@ -0,0 +1,19 @@
+import numpy as np
+from shapely.geometry import Polygon
+
+from spatial_index import HexIndex
+
+def _square(x):
+    return Polygon([(x, 0), (x + 1, 0), (x + 1, 1), (x, 1)])
+
+def test_spacing_falls_back_when_widths_are_nan():
+    index = HexIndex([_square(0), _square(2)], widths=np.array([np.nan, np.nan]))
+
+    assert index.spacing == 1e-3
+
+def test_nearest_terminates_when_centroids_are_missing():
+    centroid_xy = np.array([[0.5, 0.5], [np.nan, np.nan], [2.5, 0.5]])
+    index = HexIndex([_square(0), Polygon(), _square(2)], centroid_xy=centroid_xy,
+                     widths=np.array([np.nan, np.nan, np.nan]))
+
+    np.testing.assert_array_equal(index.nearest(0.5, 0.4, k=3), [0, 2, 1])
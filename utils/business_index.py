@@ -0,0 +1,228 @@
+"""
+Local keyword search over the businesses the app has already seen
+
+Every DENUE result that goes through inegi_denue is added to a
+process-wide inverted index: names and activities are accent-folded and
+tokenized, and a trigram index over the vocabulary can match misspelled
+or partial words ("joyeira", "joy" -> "joyeria") when fuzzy matching is
+requested. The circles of the queries that fed the index are kept as
+coverage, so a keyword search inside an area already fetched with "todos"
+(or with the same keyword) is answered locally and only uncovered searches
+go to the DENUE API.
+"""
+
+import re
+import threading
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from helpers import calculate_distance_km
+from denue_schema import concat_denue
+from denue_store import fold_text
+
+# Words ignored when indexing and searching
+STOPWORDS = {'de', 'del', 'la', 'las', 'el', 'los', 'y', 'e', 'en', 'al', 'a', 'por', 'con', 'para', 'sa', 'cv'}
+
+# Minimum trigram Jaccard similarity for a fuzzy token match
+FUZZY_THRESHOLD = 0.45
+
+# Tokens this long or longer also match candidates one typo away
+# (insertion, deletion, substitution or swap of adjacent letters)
+TYPO_MIN_LENGTH = 5
+
+# Shortest query token matched as a prefix
+PREFIX_MIN_LENGTH = 3
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+def _tokens(folded):
+    return [token for token in _TOKEN_RE.findall(folded) if token not in STOPWORDS]
+
+def tokenize(text):
+    """Folded tokens of a text, without stopwords"""
+    return _tokens(fold_text(pd.Series([text])).iloc[0])
+
+def trigrams(token):
+    """Trigrams of a token padded with '$' at both ends"""
+    padded = f"${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _one_typo(a, b):
+    """True if b is a with one insertion, deletion, substitution or adjacent swap"""
+    if abs(len(a) - len(b)) > 1 or a == b:
+        return False
+    i = 0
+    while i < min(len(a), len(b)) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:] or (a[i + 2:] == b[i + 2:] and a[i:i + 2] == b[i:i + 2][::-1])
+    shorter, longer = (a, b) if len(a) < len(b) else (b, a)
+    return shorter[i:] == longer[i + 1:]
+
+class BusinessIndex:
+    """
+    Inverted index with trigram fuzzy matching and query coverage
+
+    Documents are the rows of a normalized DENUE table (denue_schema),
+    de-duplicated by DENUE id.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frames = []
+        self._table = None
+        self._ids = {}
+        self._postings = defaultdict(set)
+        self._grams = defaultdict(set)
+        self._coverage = []
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _rows(self):
+        """All indexed businesses as one table (document id = row position)"""
+        if self._table is None:
+            self._table = concat_denue(self._frames)
+            self._frames = [self._table]
+        return self._table
+
+    def add(self, negocios, keyword=None, lat=None, lng=None, meters=None):
+        """
+        Index businesses and, optionally, the query that returned them
+
+        Parameters:
+        - negocios: Normalized DENUE table (see denue_schema.normalize_denue)
+        - keyword, lat, lng, meters: Query whose complete result this is; its
+          circle is recorded as covered for that keyword (default: none)
+        """
+
+        with self._lock:
+            if len(negocios) > 0:
+                unseen = np.array([business_id not in self._ids for business_id in negocios['id']], dtype=bool)
+                new = unseen & (negocios['id'] != '').to_numpy() & ~negocios['id'].duplicated().to_numpy()
+                negocios = negocios[new]
+
+            if len(negocios) > 0:
+                start = len(self._ids)
+                texts = fold_text(negocios['nombre'] + ' ' + negocios['clase_actividad'].astype(str)
+                                  + ' ' + negocios['razon_social'])
+                for offset, (business_id, text) in enumerate(zip(negocios['id'], texts)):
+                    doc = start + offset
+                    self._ids[business_id] = doc
+                    for token in set(_tokens(text)):
+                        if token not in self._postings:
+                            for gram in trigrams(token):
+                                self._grams[gram].add(token)
+                        self._postings[token].add(doc)
+
+                self._frames.append(negocios)
+                self._table = None
+
+            if keyword is not None and lat is not None:
+                self._coverage.append((' '.join(tokenize(keyword)) or 'todos', float(lat), float(lng), float(meters)))
+
+    def covers(self, keyword, lat, lng, meters):
+        """
+        Check whether a search area was fully fetched before
+
+        Parameters:
+        - keyword: Search keyword
+        - lat, lng, meters: Search circle
+
+        Returns:
+        - bool: True if a "todos" query, or one with the same keyword,
+          covered a circle containing the search circle
+        """
+
+        keyword = ' '.join(tokenize(keyword)) or 'todos'
+        with self._lock:
+            circles = [c for c in self._coverage if c[0] in ('todos', keyword)]
+        if len(circles) == 0:
+            return False
+
+        c_lat = np.array([c[1] for c in circles])
+        c_lng = np.array([c[2] for c in circles])
+        c_meters = np.array([c[3] for c in circles])
+        distance = calculate_distance_km(float(lat), float(lng), c_lat, c_lng) * 1000
+        return bool(np.any(distance + float(meters) <= c_meters))
+
+    def _match_token(self, token, fuzzy):
+        """Documents containing the token or, when fuzzy, similar or extended tokens"""
+        docs = set(self._postings.get(token, ()))
+        if not fuzzy:
+            return docs
+
+        query_grams = trigrams(token)
+        candidates = set()
+        for gram in query_grams:
+            candidates |= self._grams.get(gram, set())
+
+        for candidate in candidates:
+            if candidate == token:
+                continue
+            if len(token) >= PREFIX_MIN_LENGTH and candidate.startswith(token):
+                docs |= self._postings[candidate]
+                continue
+            candidate_grams = trigrams(candidate)
+            similarity = len(query_grams & candidate_grams) / len(query_grams | candidate_grams)
+            if similarity >= FUZZY_THRESHOLD or (len(token) >= TYPO_MIN_LENGTH and _one_typo(token, candidate)):
+                docs |= self._postings[candidate]
+        return docs
+
+    def search(self, keyword, lat=None, lng=None, meters=None, fuzzy=False):
+        """
+        Indexed businesses matching every word of a keyword, optionally within a circle
+
+        Parameters:
+        - keyword: Search keyword, "todos" for every business
+        - lat, lng, meters: Search circle (default: no distance filter)
+        - fuzzy: Also match misspelled and partial words (default=False)
+
+        Returns:
+        - pandas.DataFrame: Matching businesses (denue_schema schema)
+        """
+
+        tokens = tokenize(keyword)
+        with self._lock:
+            table = self._rows()
+            if len(tokens) == 0 or tokens == ['todos']:
+                docs = np.arange(len(table))
+            else:
+                matches = None
+                for token in tokens:
+                    token_docs = self._match_token(token, fuzzy)
+                    matches = token_docs if matches is None else matches & token_docs
+                docs = np.fromiter(sorted(matches), dtype=np.int64)
+
+        result = table.iloc[docs]
+        if lat is not None and len(result) > 0:
+            distance = calculate_distance_km(float(lat), float(lng), result['latitud'].to_numpy(),
+                                             result['longitud'].to_numpy()) * 1000
+            result = result[distance <= float(meters)]
+        return result.reset_index(drop=True)
+
+_index = BusinessIndex()
+
+def get_business_index():
+    """Process-wide BusinessIndex"""
+    return _index
+
+def search_local(keyword, lat, lng, meters, fuzzy=False):
+    """
+    Answer a keyword search from the index if the area was already fetched
+
+    Parameters:
+    - keyword: Search keyword
+    - lat, lng, meters: Search circle
+    - fuzzy: Also match misspelled and partial words (default=False)
+
+    Returns:
+    - pandas.DataFrame, or None if the area is not covered and the DENUE
+      API must be queried
+    """
+
+    if not _index.covers(keyword, lat, lng, meters):
+        return None
+    return _index.search(keyword, lat, lng, meters, fuzzy=fuzzy)
@@ -0,0 +1,177 @@
+"""
+Nearest-competitor lookups for clicked map locations
+
+Lookups are memoized per clicked location and executed on a background
+worker so that Streamlit reruns never wait on network I/O.
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from inegi_denue import inegi_denue
+from helpers import calculate_distance_km
+
+# Decimal places used to identify a clicked location (~1 m at 5 decimals)
+CLICK_PRECISION = 5
+
+# Maximum number of clicked locations kept in memory
+COMPETENCIA_CACHE_SIZE = 256
+
+# Seconds a page waits for a running lookup between polls
+COMPETENCIA_POLL_SECONDS = 1.0
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="competencia")
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_pending = {}
+
+def click_key(lat, lng):
+    """
+    Build a hashable key identifying a clicked location
+
+    Parameters:
+    - lat: Latitude of the click
+    - lng: Longitude of the click
+
+    Returns:
+    - tuple: (rounded_lat, rounded_lng), or None if coordinates are invalid
+    """
+
+    try:
+        return (round(float(lat), CLICK_PRECISION), round(float(lng), CLICK_PRECISION))
+    except (ValueError, TypeError):
+        return None
+
+def nearest_competitors(lat, lng, token, n=5, meters=500, keyword="todos"):
+    """
+    Get the n businesses nearest to a location, memoized per location
+
+    Parameters:
+    - lat, lng: Coordinates of the clicked location
+    - token: INEGI API token
+    - n: Number of nearest businesses to keep (default=5)
+    - meters: DENUE search radius in meters (default=500)
+    - keyword: DENUE search keyword (default="todos")
+
+    Returns:
+    - pandas.DataFrame: Nearest businesses sorted by 'distancia' (km)
+    """
+
+    key = click_key(lat, lng) + (n, meters, keyword)
+
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    negocios = inegi_denue(
+        latitud=lat,
+        longitud=lng,
+        token=token,
+        meters=meters,
+        keyword=keyword
+    )
+
+    # inegi_denue returns typed float64 coordinates with missing ones dropped
+    if len(negocios) > 0:
+        distancia = calculate_distance_km(
+            lat, lng, negocios['latitud'].to_numpy(), negocios['longitud'].to_numpy()
+        )
+        nearest = np.argsort(distancia, kind='stable')[:n]
+        competencia = negocios.iloc[nearest].assign(distancia=distancia[nearest])
+    else:
+        competencia = pd.DataFrame()
+
+    with _cache_lock:
+        _cache[key] = competencia
+        _cache.move_to_end(key)
+        while len(_cache) > COMPETENCIA_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    return competencia
+
+def submit_nearest_competitors(lat, lng, token, n=5, meters=500, keyword="todos"):
+    """
+    Schedule a nearest-competitor lookup on the background worker
+
+    Concurrent submissions for the same location share a single future.
+
+    Parameters:
+    - Same as nearest_competitors
+
+    Returns:
+    - concurrent.futures.Future resolving to the nearest-competitor DataFrame
+    """
+
+    key = click_key(lat, lng) + (n, meters, keyword)
+
+    with _cache_lock:
+        future = _pending.get(key)
+        if future is not None and not future.done():
+            return future
+
+        future = _executor.submit(_run_lookup, key, lat, lng, token, n, meters, keyword)
+        _pending[key] = future
+        return future
+
+def _run_lookup(key, lat, lng, token, n, meters, keyword):
+    try:
+        return nearest_competitors(lat, lng, token, n=n, meters=meters, keyword=keyword)
+    except Exception as e:
+        warnings.warn(f"Error looking up nearest competitors: {e}")
+        return pd.DataFrame()
+    finally:
+        with _cache_lock:
+            _pending.pop(key, None)
+
+def collect_competencia(state, wait=False):
+    """
+    Move the result of a background competitor lookup into state['map_data']
+
+    Parameters:
+    - state: Session state holding 'competencia_future' and 'map_data'
+    - wait: Block until the lookup finishes (default=False)
+
+    Returns:
+    - bool: False while a lookup is still running, True otherwise
+    """
+
+    future = state.get('competencia_future')
+    if future is None:
+        return True
+
+    if not wait and not future.done():
+        return False
+
+    competencia = future.result()
+    state['competencia_future'] = None
+
+    if len(competencia) > 0:
+        state['map_data']['competencia'] = competencia
+
+    return True
+
+def wait_competencia(state, timeout=COMPETENCIA_POLL_SECONDS):
+    """
+    Wait up to timeout seconds for a running background competitor lookup
+
+    Parameters:
+    - state: Session state holding 'competencia_future'
+    - timeout: Seconds to wait (default=COMPETENCIA_POLL_SECONDS)
+
+    Returns:
+    - bool: True if a lookup was running, so the page should collect its
+      result (see collect_competencia) or keep polling
+    """
+
+    future = state.get('competencia_future')
+    if future is None:
+        return False
+
+    wait_futures([future], timeout=timeout)
+    return True
@@ -0,0 +1,302 @@
+"""
+Persistent response cache for INEGI DENUE queries
+
+Responses are stored zlib-compressed in a SQLite database keyed by the
+normalized query (keyword, rounded coordinates, radius) and expire after a
+TTL. The circle of every cached query is kept in an SQLite R*Tree, so a
+query whose circle lies inside a cached one (same keyword, smaller radius
+or nearby center) is answered by haversine-filtering the cached response
+instead of going to the network.
+
+The database runs in WAL mode with a busy timeout, so several Streamlit
+processes can read and write it at the same time; each thread uses its
+own connection. Hit and miss counters are kept in the database and are
+shared by every process using it.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from helpers import calculate_distance_km
+
+# Database file (override with the DENUE_CACHE_PATH environment variable)
+DENUE_CACHE_PATH = os.getenv("DENUE_CACHE_PATH", "data/cache/denue.sqlite")
+
+# Seconds a cached response stays valid (override with DENUE_CACHE_TTL)
+DENUE_CACHE_TTL = int(os.getenv("DENUE_CACHE_TTL", 7 * 24 * 3600))
+
+# Decimal places of cached query coordinates (~11 m at 4 decimals)
+DENUE_CACHE_PRECISION = 4
+
+# Meters per degree of latitude, for footprint bounding boxes
+METERS_PER_DEGREE = 111_320
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    keyword TEXT NOT NULL,
+    lat REAL NOT NULL,
+    lng REAL NOT NULL,
+    meters INTEGER NOT NULL,
+    payload BLOB NOT NULL,
+    created REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS footprints USING rtree (
+    id,
+    min_lat, max_lat,
+    min_lng, max_lng
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def normalize_query(keyword, lat, lng, meters):
+    """
+    Normalize DENUE query parameters so equivalent searches share a cache entry
+
+    Parameters:
+    - keyword: Search keyword (case and surrounding/repeated spaces are ignored)
+    - lat, lng: Search center
+    - meters: Search radius in meters
+
+    Returns:
+    - tuple: (keyword, lat, lng, meters) with coordinates rounded to
+      DENUE_CACHE_PRECISION decimals and an integer radius
+    """
+
+    keyword = ' '.join(str(keyword).lower().split()) or 'todos'
+    return (keyword, round(float(lat), DENUE_CACHE_PRECISION),
+            round(float(lng), DENUE_CACHE_PRECISION), int(round(float(meters))))
+
+def _query_key(keyword, lat, lng, meters):
+    return f"{keyword}|{lat:.{DENUE_CACHE_PRECISION}f}|{lng:.{DENUE_CACHE_PRECISION}f}|{meters}"
+
+def _circle_bbox(lat, lng, meters, pad=1.0):
+    """(min_lat, max_lat, min_lng, max_lng) of a circle, optionally enlarged by a factor"""
+    dlat = meters * pad / METERS_PER_DEGREE
+    dlng = meters * pad / (METERS_PER_DEGREE * np.cos(np.radians(lat)))
+    return (lat - dlat, lat + dlat, lng - dlng, lng + dlng)
+
+def filter_response(body, lat, lng, meters):
+    """
+    Keep the businesses of a DENUE response body within a circle
+
+    Parameters:
+    - body: Response body (JSON list of businesses with Latitud/Longitud)
+    - lat, lng: Circle center
+    - meters: Circle radius in meters
+
+    Returns:
+    - str: JSON body with the businesses at most meters away (haversine)
+    """
+
+    data = json.loads(body) if body and body.strip() else []
+    if not data:
+        return json.dumps([])
+
+    def coordinate(item, name):
+        for key, value in item.items():
+            if key.lower() == name:
+                try:
+                    return float(value)
+                except (TypeError, ValueError):
+                    return np.nan
+        return np.nan
+
+    lats = np.array([coordinate(item, 'latitud') for item in data])
+    lngs = np.array([coordinate(item, 'longitud') for item in data])
+    inside = calculate_distance_km(lat, lng, lats, lngs) * 1000 <= meters
+
+    return json.dumps([item for item, keep in zip(data, inside) if keep], ensure_ascii=False)
+
+class DenueCache:
+    """
+    SQLite-backed cache of raw DENUE response bodies
+
+    Parameters:
+    - path: Database file
+    - ttl: Seconds a response stays valid (default=DENUE_CACHE_TTL)
+    """
+
+    def __init__(self, path=DENUE_CACHE_PATH, ttl=DENUE_CACHE_TTL):
+        self.path = Path(path)
+        self.ttl = ttl
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connection()
+        conn.executescript(_SCHEMA)
+        self._add_missing_footprints(conn)
+
+    def _connection(self):
+        """This thread's connection, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _add_missing_footprints(self, conn):
+        """Index responses cached before footprints were kept"""
+        missing = conn.execute(
+            "SELECT rowid, lat, lng, meters FROM responses "
+            "WHERE rowid NOT IN (SELECT id FROM footprints)").fetchall()
+        for rowid, lat, lng, meters in missing:
+            conn.execute("INSERT OR REPLACE INTO footprints VALUES (?, ?, ?, ?, ?)",
+                         (rowid,) + _circle_bbox(lat, lng, meters, pad=1.01))
+
+    def _count(self, name):
+        self._connection().execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,))
+
+    def get(self, keyword, lat, lng, meters):
+        """
+        Get a cached response body answering a query
+
+        An exact entry is used when present; otherwise the smallest cached
+        circle with the same keyword that contains the query circle is
+        filtered down to the query radius.
+
+        Parameters:
+        - keyword, lat, lng, meters: Query parameters (normalized with normalize_query)
+
+        Returns:
+        - str: Response body, or None if no valid entry covers the query
+        """
+
+        keyword, lat, lng, meters = normalize_query(keyword, lat, lng, meters)
+        conn = self._connection()
+        oldest = time.time() - self.ttl
+
+        row = conn.execute(
+            "SELECT payload FROM responses WHERE key = ? AND created >= ?",
+            (_query_key(keyword, lat, lng, meters), oldest)).fetchone()
+        if row is not None:
+            self._count('hits')
+            return zlib.decompress(row[0]).decode('utf-8')
+
+        # Cached circles whose bounding box contains the query circle's
+        min_lat, max_lat, min_lng, max_lng = _circle_bbox(lat, lng, meters)
+        candidates = conn.execute(
+            "SELECT r.rowid, r.lat, r.lng, r.meters FROM footprints f "
+            "JOIN responses r ON r.rowid = f.id "
+            "WHERE f.min_lat <= ? AND f.max_lat >= ? AND f.min_lng <= ? AND f.max_lng >= ? "
+            "AND r.keyword = ? AND r.meters > ? AND r.created >= ? ORDER BY r.meters",
+            (min_lat, max_lat, min_lng, max_lng, keyword, meters, oldest)).fetchall()
+
+        for rowid, c_lat, c_lng, c_meters in candidates:
+            if calculate_distance_km(lat, lng, c_lat, c_lng) * 1000 + meters <= c_meters:
+                payload = conn.execute("SELECT payload FROM responses WHERE rowid = ?", (rowid,)).fetchone()[0]
+                self._count('containment_hits')
+                return filter_response(zlib.decompress(payload).decode('utf-8'), lat, lng, meters)
+
+        self._count('misses')
+        return None
+
+    def put(self, keyword, lat, lng, meters, body):
+        """
+        Store a response body, replacing any previous entry for the query
+
+        Parameters:
+        - keyword, lat, lng, meters: Query parameters (normalized with normalize_query)
+        - body: Response body text
+        """
+
+        keyword, lat, lng, meters = normalize_query(keyword, lat, lng, meters)
+        key = _query_key(keyword, lat, lng, meters)
+        conn = self._connection()
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM footprints WHERE id IN (SELECT rowid FROM responses WHERE key = ?)", (key,))
+            cursor = conn.execute(
+                "INSERT OR REPLACE INTO responses (key, keyword, lat, lng, meters, payload, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, keyword, lat, lng, meters, zlib.compress(body.encode('utf-8')), time.time()))
+            conn.execute("INSERT INTO footprints VALUES (?, ?, ?, ?, ?)",
+                         (cursor.lastrowid,) + _circle_bbox(lat, lng, meters, pad=1.01))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def bodies(self):
+        """
+        Every cached response body, expired or not
+
+        Yields:
+        - str: Response body
+        """
+
+        for (payload,) in self._connection().execute("SELECT payload FROM responses"):
+            yield zlib.decompress(payload).decode('utf-8')
+
+    def purge_expired(self):
+        """
+        Delete expired entries
+
+        Returns:
+        - int: Number of deleted entries
+        """
+
+        conn = self._connection()
+        oldest = time.time() - self.ttl
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM footprints WHERE id IN (SELECT rowid FROM responses WHERE created < ?)",
+                         (oldest,))
+            cursor = conn.execute("DELETE FROM responses WHERE created < ?", (oldest,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount
+
+    def stats(self):
+        """
+        Cache counters shared by every process using the database
+
+        Returns:
+        - dict: 'hits' (exact), 'containment_hits' (answered from a larger
+          cached circle), 'misses', 'hit_rate', 'entries' and 'bytes'
+          (compressed payloads)
+        """
+
+        conn = self._connection()
+        counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        entries, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM responses").fetchone()
+        hits, misses = counters.get('hits', 0), counters.get('misses', 0)
+        contained = counters.get('containment_hits', 0)
+        lookups = hits + contained + misses
+        return {
+            'hits': hits,
+            'containment_hits': contained,
+            'misses': misses,
+            'hit_rate': (hits + contained) / lookups if lookups > 0 else 0.0,
+            'entries': entries,
+            'bytes': size
+        }
+
+def get_denue_cache(path=DENUE_CACHE_PATH):
+    """Process-wide DenueCache for a database file"""
+    key = str(Path(path).resolve())
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = DenueCache(path)
+        return _caches[key]
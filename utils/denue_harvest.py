@@ -0,0 +1,143 @@
+"""
+Concurrent tiled DENUE harvesting
+
+The DENUE "Buscar" endpoint only searches a circle around a point. To
+cover a larger area (a municipality of the grid, the map viewport) the
+area is tiled with overlapping circles on a hexagonal packing, the queries
+run on a bounded thread pool and the businesses are de-duplicated by their
+DENUE id. Partial results are yielded as tiles finish, so the UI can show
+progress while the harvest runs.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import warnings
+
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+
+from inegi_denue import inegi_denue
+from denue_schema import concat_denue
+from grid_store import GRID_PROJECTED_CRS
+
+# Radius of each tile query in meters (DENUE allows up to 5000)
+HARVEST_RADIUS = 1000
+
+# Concurrent DENUE queries
+HARVEST_WORKERS = 8
+
+# Most tiles a single harvest may query
+HARVEST_MAX_TILES = 2000
+
+def cover_polygon(polygon, radius=HARVEST_RADIUS):
+    """
+    Centers of circles that together cover a polygon
+
+    Circles of the given radius on a hexagonal packing with spacing
+    radius * sqrt(3) cover the plane with no gaps; only those that touch
+    the polygon are kept.
+
+    Parameters:
+    - polygon: shapely geometry in EPSG:4326
+    - radius: Circle radius in meters (default=HARVEST_RADIUS)
+
+    Returns:
+    - numpy.ndarray: (n, 2) array of (lat, lng) circle centers
+    """
+
+    to_projected = Transformer.from_crs('EPSG:4326', GRID_PROJECTED_CRS, always_xy=True)
+    to_geographic = Transformer.from_crs(GRID_PROJECTED_CRS, 'EPSG:4326', always_xy=True)
+
+    projected = shapely.transform(polygon, lambda xy: np.column_stack(to_projected.transform(xy[:, 0], xy[:, 1])))
+    minx, miny, maxx, maxy = projected.bounds
+
+    dx = radius * np.sqrt(3)
+    dy = radius * 1.5
+    rows, cols = np.meshgrid(np.arange(int(np.ceil((maxy - miny) / dy)) + 2),
+                             np.arange(int(np.ceil((maxx - minx) / dx)) + 2), indexing='ij')
+    x = (minx - dx / 2 + cols * dx + (rows % 2) * dx / 2).ravel()
+    y = (miny - dy / 2 + rows * dy).ravel()
+
+    reach = projected.buffer(radius)
+    shapely.prepare(reach)
+    keep = shapely.contains_xy(reach, x, y)
+
+    lng, lat = to_geographic.transform(x[keep], y[keep])
+    return np.column_stack([lat, lng])
+
+def _business_key(negocios):
+    """De-duplication key: DENUE id, or name and coordinates when it is missing"""
+    fallback = (negocios['nombre'] + '|' + negocios['latitud'].astype(str)
+                + '|' + negocios['longitud'].astype(str))
+    return negocios['id'].where(negocios['id'] != '', fallback)
+
+def iter_harvest(polygon, token, keyword="todos", radius=HARVEST_RADIUS, max_workers=HARVEST_WORKERS):
+    """
+    Harvest the DENUE businesses of an area, yielding results as tiles finish
+
+    Parameters:
+    - polygon: shapely geometry in EPSG:4326
+    - token: INEGI API token
+    - keyword: DENUE search keyword (default="todos")
+    - radius: Tile radius in meters (default=HARVEST_RADIUS)
+    - max_workers: Concurrent queries (default=HARVEST_WORKERS)
+
+    Yields:
+    - tuple: (tiles done, total tiles, DataFrame of businesses not seen in
+      earlier tiles and located inside the polygon)
+    """
+
+    centers = cover_polygon(polygon, radius)
+    if len(centers) > HARVEST_MAX_TILES:
+        raise ValueError(f"Area needs {len(centers)} DENUE queries (max {HARVEST_MAX_TILES}); "
+                         f"use a larger radius or a smaller area")
+
+    shapely.prepare(polygon)
+    seen = set()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="denue_harvest") as executor:
+        futures = [executor.submit(inegi_denue, latitud=lat, longitud=lng, token=token,
+                                   meters=radius, keyword=keyword)
+                   for lat, lng in centers]
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                negocios = future.result()
+            except Exception as e:
+                warnings.warn(f"DENUE tile query failed: {e}")
+                negocios = pd.DataFrame()
+
+            if len(negocios) > 0:
+                keys = _business_key(negocios)
+                new = ~keys.isin(seen) & ~keys.duplicated()
+                inside = shapely.contains_xy(polygon, negocios['longitud'].to_numpy(), negocios['latitud'].to_numpy())
+                negocios = negocios[new.to_numpy() & inside]
+                seen.update(keys[new])
+            else:
+                negocios = pd.DataFrame()
+
+            yield done, len(futures), negocios
+
+def harvest_denue(polygon, token, keyword="todos", radius=HARVEST_RADIUS, max_workers=HARVEST_WORKERS,
+                  progress_callback=None):
+    """
+    Harvest every DENUE business of an area
+
+    Parameters:
+    - Same as iter_harvest
+    - progress_callback: Called as callback(done, total, businesses so far)
+      after every tile (default: none)
+
+    Returns:
+    - pandas.DataFrame: Unique businesses inside the polygon (denue_schema schema)
+    """
+
+    frames = []
+    found = 0
+    for done, total, negocios in iter_harvest(polygon, token, keyword, radius, max_workers):
+        frames.append(negocios)
+        found += len(negocios)
+        if progress_callback is not None:
+            progress_callback(done, total, found)
+
+    return concat_denue(frames)
@@ -0,0 +1,133 @@
+"""
+Typed, compact schema for DENUE business tables
+
+The DENUE API returns every field as a string. normalize_denue turns a
+response (or a local store result) into a table with float64 coordinates,
+categorical activity and size columns and only the text columns the app
+uses, and filter_denue selects businesses by SCIAN code, activity and
+size without touching the strings row by row.
+"""
+
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# Columns kept after normalization, in order
+DENUE_KEEP_COLUMNS = ['id', 'nombre', 'razon_social', 'clase_actividad', 'scian', 'estrato',
+                      'ubicacion', 'latitud', 'longitud']
+
+# Employee-size strata ("personal ocupado") from smallest to largest
+DENUE_ESTRATOS = ['0 a 5 personas', '6 a 10 personas', '11 a 30 personas', '31 a 50 personas',
+                  '51 a 100 personas', '101 a 250 personas', '251 y más personas']
+
+ESTRATO_DTYPE = pd.CategoricalDtype(DENUE_ESTRATOS, ordered=True)
+
+def _fold(text):
+    return unicodedata.normalize('NFKD', str(text).lower()).encode('ascii', 'ignore').decode('ascii')
+
+def _normalize_estrato(values):
+    """Map strata strings to DENUE_ESTRATOS regardless of case, accents and spacing"""
+    canonical = {' '.join(_fold(e).split()): e for e in DENUE_ESTRATOS}
+    categories = pd.Series(values.astype('category').cat.categories)
+    mapping = {cat: canonical.get(' '.join(_fold(cat).split())) for cat in categories}
+    return values.map(mapping).astype(ESTRATO_DTYPE)
+
+def normalize_denue(negocios):
+    """
+    Convert a DENUE table to the typed, compact schema
+
+    Parameters:
+    - negocios: DataFrame from the DENUE API (any column case) or the local store
+
+    Returns:
+    - pandas.DataFrame: DENUE_KEEP_COLUMNS with float64 'latitud'/'longitud'
+      (rows without coordinates dropped), 'id' as string, 'clase_actividad'
+      and 'scian' (6-digit code, missing for API results, which do not carry
+      it) as categoricals and 'estrato' as an ordered categorical
+    """
+
+    negocios = negocios.rename(columns=str.lower)
+    out = pd.DataFrame(index=negocios.index)
+
+    for col in ['id', 'nombre', 'razon_social', 'ubicacion']:
+        out[col] = negocios[col].fillna('').astype(str).str.strip() if col in negocios.columns else ''
+
+    clase = negocios['clase_actividad'] if 'clase_actividad' in negocios.columns else pd.Series('', index=negocios.index)
+    out['clase_actividad'] = clase.fillna('').astype(str).str.strip().astype('category')
+
+    if 'scian' in negocios.columns:
+        codes = pd.to_numeric(negocios['scian'], errors='coerce')
+        scian = codes.where(codes > 0).map(lambda code: f"{int(code):06d}", na_action='ignore')
+    else:
+        scian = pd.Series(np.nan, index=negocios.index, dtype=object)
+    out['scian'] = scian.astype('category')
+
+    estrato = negocios['estrato'] if 'estrato' in negocios.columns else pd.Series(np.nan, index=negocios.index)
+    out['estrato'] = _normalize_estrato(estrato.astype(object))
+
+    for col in ['latitud', 'longitud']:
+        values = negocios[col] if col in negocios.columns else pd.Series(np.nan, index=negocios.index)
+        out[col] = pd.to_numeric(values, errors='coerce').astype(np.float64)
+
+    out = out.loc[out['latitud'].notna() & out['longitud'].notna(), DENUE_KEEP_COLUMNS]
+    return out.reset_index(drop=True)
+
+def concat_denue(frames):
+    """
+    Concatenate normalized DENUE tables, keeping the categorical columns categorical
+
+    Parameters:
+    - frames: DataFrames from normalize_denue
+
+    Returns:
+    - pandas.DataFrame
+    """
+
+    frames = [frame for frame in frames if len(frame) > 0]
+    if len(frames) == 0:
+        return normalize_denue(pd.DataFrame())
+
+    negocios = pd.concat(frames, ignore_index=True)
+    for col in ['clase_actividad', 'scian']:
+        negocios[col] = negocios[col].astype('category')
+    return negocios
+
+def _category_mask(values, predicate):
+    """Evaluate a predicate once per category and broadcast it to the rows"""
+    categories = values.cat.categories
+    matches = np.array([predicate(cat) for cat in categories] + [False], dtype=bool)
+    return matches[values.cat.codes.to_numpy()]
+
+def filter_denue(negocios, scian=None, clase=None, estrato_min=None, estrato_max=None):
+    """
+    Filter a normalized DENUE table
+
+    Parameters:
+    - negocios: DataFrame from normalize_denue
+    - scian: SCIAN code prefix or list of prefixes (e.g. '4632' for jewelry
+      and watches retail); businesses without a code never match
+    - clase: Text contained in 'clase_actividad' (case and accents ignored)
+    - estrato_min, estrato_max: Smallest / largest size stratum (values of DENUE_ESTRATOS)
+
+    Returns:
+    - pandas.DataFrame: Matching rows
+    """
+
+    mask = np.ones(len(negocios), dtype=bool)
+
+    if scian is not None:
+        prefixes = (scian,) if isinstance(scian, str) else tuple(str(p) for p in scian)
+        mask &= _category_mask(negocios['scian'], lambda code: code.startswith(prefixes))
+
+    if clase:
+        needle = _fold(clase).strip()
+        mask &= _category_mask(negocios['clase_actividad'], lambda name: needle in _fold(name))
+
+    codes = negocios['estrato'].cat.codes.to_numpy()
+    if estrato_min is not None:
+        mask &= codes >= DENUE_ESTRATOS.index(estrato_min)
+    if estrato_max is not None:
+        mask &= (codes >= 0) & (codes <= DENUE_ESTRATOS.index(estrato_max))
+
+    return negocios[mask]
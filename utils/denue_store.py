@@ -0,0 +1,326 @@
+"""
+Offline DENUE store built from INEGI's bulk download
+
+Imports a bulk DENUE CSV in chunks into a local Parquet file with the
+column names of the DENUE "Buscar" API (as returned by inegi_denue),
+typed coordinates, integer SCIAN activity codes, EPSG:6372 coordinates and
+a folded search text. DenueStore keeps the table in Arrow memory with an
+STRtree over the points and answers radius + keyword searches locally,
+without network access or an API token.
+
+Usage:
+    python utils/denue_store.py [--store PARQUET] import --src DENUE_CSV [--encoding ENC]
+    python utils/denue_store.py [--store PARQUET] query --lat LAT --lng LNG [--meters M] [--keyword K]
+"""
+
+import argparse
+import os
+import threading
+import time
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+from pyproj import Transformer
+from shapely import STRtree
+
+from grid_store import GRID_PROJECTED_CRS
+
+# Local store file (override with the DENUE_STORE_PATH environment variable)
+DENUE_STORE_PATH = os.getenv("DENUE_STORE_PATH", "data/denue/denue.parquet")
+
+# Rows read per CSV chunk
+DENUE_CHUNKSIZE = 200_000
+
+# Columns of a DENUE "Buscar" response, lowercased as inegi_denue returns them
+DENUE_COLUMNS = ['id', 'nombre', 'razon_social', 'clase_actividad', 'estrato', 'tipo_vialidad',
+                 'calle', 'num_exterior', 'num_interior', 'colonia', 'cp', 'ubicacion', 'telefono',
+                 'correo_e', 'sitio_internet', 'tipo', 'longitud', 'latitud', 'centrocomercial',
+                 'tipocentrocomercial', 'numlocal']
+
+# Bulk CSV column (lowercased) -> API column
+DENUE_BULK_COLUMNS = {
+    'id': 'id',
+    'nom_estab': 'nombre',
+    'raz_social': 'razon_social',
+    'nombre_act': 'clase_actividad',
+    'per_ocu': 'estrato',
+    'tipo_vial': 'tipo_vialidad',
+    'nom_vial': 'calle',
+    'numero_ext': 'num_exterior',
+    'numero_int': 'num_interior',
+    'nomb_asent': 'colonia',
+    'cod_postal': 'cp',
+    'telefono': 'telefono',
+    'correoelec': 'correo_e',
+    'www': 'sitio_internet',
+    'tipounieco': 'tipo',
+    'longitud': 'longitud',
+    'latitud': 'latitud',
+    'nom_cencom': 'centrocomercial',
+    'tipocencom': 'tipocentrocomercial',
+    'num_local': 'numlocal'
+}
+
+# Bulk CSV columns used to build 'ubicacion' and 'scian'
+DENUE_BULK_EXTRA = ['localidad', 'municipio', 'entidad', 'codigo_act']
+
+# Store-only columns
+DENUE_STORE_EXTRA = ['scian', 'x_6372', 'y_6372', 'texto']
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def fold_text(values):
+    """
+    Lowercase, accent-free text for keyword matching
+
+    Parameters:
+    - values: String Series
+
+    Returns:
+    - pandas.Series: Folded strings ('Joyería' -> 'joyeria')
+    """
+
+    return (values.fillna('').astype(str).str.lower()
+            .map(lambda s: unicodedata.normalize('NFKD', s).encode('ascii', 'ignore').decode('ascii')))
+
+def prepare_chunk(chunk, transformer):
+    """
+    Convert a chunk of the bulk CSV to the store schema
+
+    Parameters:
+    - chunk: DataFrame read from the bulk CSV (all columns as strings)
+    - transformer: pyproj Transformer from EPSG:4326 to GRID_PROJECTED_CRS
+
+    Returns:
+    - pandas.DataFrame: DENUE_COLUMNS + DENUE_STORE_EXTRA, rows without coordinates dropped
+    """
+
+    chunk = chunk.rename(columns=str.lower)
+    out = pd.DataFrame({api: chunk[bulk].str.strip() if bulk in chunk.columns else ''
+                        for bulk, api in DENUE_BULK_COLUMNS.items()}, index=chunk.index).fillna('')
+
+    out['latitud'] = pd.to_numeric(out['latitud'], errors='coerce')
+    out['longitud'] = pd.to_numeric(out['longitud'], errors='coerce')
+    out = out[out['latitud'].notna() & out['longitud'].notna()]
+    chunk = chunk.loc[out.index]
+
+    parts = [chunk[col].fillna('').str.strip() for col in ['localidad', 'municipio', 'entidad'] if col in chunk.columns]
+    out['ubicacion'] = pd.concat(parts, axis=1).agg(', '.join, axis=1) if parts else ''
+    codigo = chunk['codigo_act'] if 'codigo_act' in chunk.columns else pd.Series(index=chunk.index, dtype=str)
+    out['scian'] = pd.to_numeric(codigo, errors='coerce').fillna(0).astype(np.int32)
+
+    x, y = transformer.transform(out['longitud'].to_numpy(), out['latitud'].to_numpy())
+    out['x_6372'] = x
+    out['y_6372'] = y
+    out['texto'] = fold_text(out['nombre'] + ' ' + out['razon_social'] + ' ' + out['clase_actividad'])
+
+    return out[DENUE_COLUMNS + DENUE_STORE_EXTRA].reset_index(drop=True)
+
+def import_denue_csv(src, dst=DENUE_STORE_PATH, encoding='latin-1', chunksize=DENUE_CHUNKSIZE):
+    """
+    Import a bulk DENUE CSV into the local store
+
+    The CSV is read in chunks and each chunk is appended to the Parquet
+    file, so memory stays bounded for national files. The file is written
+    under a temporary name and renamed into place.
+
+    Parameters:
+    - src: Bulk DENUE CSV (one or several states)
+    - dst: Output Parquet file (default=DENUE_STORE_PATH)
+    - encoding: CSV encoding (default='latin-1', as INEGI publishes it)
+    - chunksize: Rows per chunk (default=DENUE_CHUNKSIZE)
+
+    Returns:
+    - int: Number of businesses imported
+    """
+
+    dst = Path(dst)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_suffix('.tmp.parquet')
+    transformer = Transformer.from_crs('EPSG:4326', GRID_PROJECTED_CRS, always_xy=True)
+    wanted = set(DENUE_BULK_COLUMNS) | set(DENUE_BULK_EXTRA)
+
+    rows = 0
+    writer = None
+    try:
+        for chunk in pd.read_csv(src, dtype=str, encoding=encoding, chunksize=chunksize,
+                                 usecols=lambda col: col.strip().lower() in wanted):
+            chunk.columns = chunk.columns.str.strip()
+            table = pa.Table.from_pandas(prepare_chunk(chunk, transformer), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp, table.schema, compression='zstd')
+            writer.write_table(table)
+            rows += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        raise ValueError(f"No rows found in '{src}'")
+
+    os.replace(tmp, dst)
+    return rows
+
+def _match_keyword(texto, keyword):
+    """Boolean mask of rows whose folded text contains every word of the keyword"""
+    words = fold_text(pd.Series([keyword])).iloc[0].split()
+    mask = np.ones(len(texto), dtype=bool)
+    for word in words:
+        mask &= texto.str.contains(word, regex=False).to_numpy()
+    return mask
+
+class DenueStore:
+    """
+    In-memory query backend over the local DENUE store
+
+    Parameters:
+    - path: Parquet file written by import_denue_csv
+    """
+
+    def __init__(self, path=DENUE_STORE_PATH):
+        self.path = Path(path)
+        self.mtime = self.path.stat().st_mtime
+        # One chunk per column, so take() does not concatenate chunks on every query
+        self.table = pq.read_table(self.path).combine_chunks()
+        self.x = self.table['x_6372'].to_numpy()
+        self.y = self.table['y_6372'].to_numpy()
+        self._tree = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def _transform(self, lng, lat):
+        # Transformers must not be shared between threads
+        transformer = getattr(self._local, 'transformer', None)
+        if transformer is None:
+            transformer = Transformer.from_crs('EPSG:4326', GRID_PROJECTED_CRS, always_xy=True)
+            self._local.transformer = transformer
+        return transformer.transform(lng, lat)
+
+    @property
+    def tree(self):
+        """STRtree over the business points, built on first use"""
+        with self._lock:
+            if self._tree is None:
+                self._tree = STRtree(shapely.points(self.x, self.y))
+            return self._tree
+
+    def rows(self, positions, keyword="todos"):
+        """
+        Businesses at some row positions, filtered by keyword
+
+        Parameters:
+        - positions: Row positions in the store
+        - keyword: Search keyword, "todos" for every business (default="todos")
+
+        Returns:
+        - pandas.DataFrame: DENUE_COLUMNS plus 'scian', in position order
+        """
+
+        positions = np.sort(np.asarray(positions, dtype=np.int64))
+        if keyword and keyword.strip().lower() != 'todos' and len(positions) > 0:
+            texto = self.table['texto'].take(positions).to_pandas()
+            positions = positions[_match_keyword(texto, keyword)]
+
+        return self.table.select(DENUE_COLUMNS + ['scian']).take(positions).to_pandas()
+
+    def search(self, lat, lng, meters=250, keyword="todos"):
+        """
+        Radius + keyword search, as the DENUE "Buscar" endpoint
+
+        Parameters:
+        - lat, lng: Search center
+        - meters: Search radius in meters (default=250)
+        - keyword: Search keyword (default="todos")
+
+        Returns:
+        - pandas.DataFrame: DENUE_COLUMNS plus 'scian', numeric coordinates
+        """
+
+        x, y = self._transform(float(lng), float(lat))
+        positions = self.tree.query(shapely.Point(x, y), predicate='dwithin', distance=float(meters))
+        return self.rows(positions, keyword)
+
+    def within(self, polygon, keyword="todos"):
+        """
+        Businesses inside a polygon
+
+        Parameters:
+        - polygon: shapely geometry in EPSG:4326
+        - keyword: Search keyword (default="todos")
+
+        Returns:
+        - pandas.DataFrame: DENUE_COLUMNS plus 'scian', numeric coordinates
+        """
+
+        projected = shapely.transform(
+            polygon, lambda xy: np.column_stack(self._transform(xy[:, 0], xy[:, 1])))
+        positions = self.tree.query(projected, predicate='intersects')
+        return self.rows(positions, keyword)
+
+def get_denue_store(path=DENUE_STORE_PATH):
+    """
+    Process-wide DenueStore, reloaded when the file is re-imported
+
+    Returns:
+    - DenueStore, or None if no local store has been imported
+    """
+
+    path = Path(path)
+    if not path.exists():
+        return None
+
+    key = str(path.resolve())
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None or store.mtime != path.stat().st_mtime:
+            store = DenueStore(path)
+            _stores[key] = store
+        return store
+
+def main(argv=None):
+    """Command line entry point"""
+
+    parser = argparse.ArgumentParser(description="Offline DENUE store tools")
+    parser.add_argument('--store', default=DENUE_STORE_PATH, help="Local store Parquet file")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help="Import a bulk DENUE CSV")
+    import_parser.add_argument('--src', required=True, help="Bulk DENUE CSV")
+    import_parser.add_argument('--encoding', default='latin-1', help="CSV encoding")
+    import_parser.add_argument('--chunksize', type=int, default=DENUE_CHUNKSIZE, help="CSV rows per chunk")
+
+    query_parser = subparsers.add_parser('query', help="Radius + keyword search")
+    query_parser.add_argument('--lat', type=float, required=True)
+    query_parser.add_argument('--lng', type=float, required=True)
+    query_parser.add_argument('--meters', type=float, default=250)
+    query_parser.add_argument('--keyword', default="todos")
+
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.command == 'import':
+        rows = import_denue_csv(args.src, args.store, encoding=args.encoding, chunksize=args.chunksize)
+        print(f"Imported {rows} businesses to '{args.store}' in {time.perf_counter() - start:.2f} s")
+
+    elif args.command == 'query':
+        store = get_denue_store(args.store)
+        if store is None:
+            parser.error(f"No local DENUE store at '{args.store}'")
+        store.search(args.lat, args.lng, 1, 'todos')
+        loaded = time.perf_counter()
+        negocios = store.search(args.lat, args.lng, args.meters, args.keyword)
+        print(f"Loaded {len(store)} businesses in {loaded - start:.2f} s; "
+              f"found {len(negocios)} in {(time.perf_counter() - loaded) * 1000:.1f} ms")
+        print(negocios[['id', 'nombre', 'clase_actividad', 'latitud', 'longitud']].head(20).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Memory-mapped feature matrix of the hexagonal grid
+
+Publishes the numeric grid features as a read-only .npy file in the cache
+directory (plus a small JSON column index) and maps it back with numpy's
+mmap_mode. Every process that opens the same file shares its pages through
+the OS page cache instead of holding its own copy of the features.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from helpers import get_grid_derived
+from grid_store import get_grid_handle
+
+# Columns stored in the matrix, in order
+FEATURE_MATRIX_COLUMNS = ['poblacion_total', 'joven_digital', 'mama_emprendedora',
+                          'mayorista_experimentado', 'clientes_totales']
+
+# Where matrices are published (override with the FEATURE_CACHE_DIR environment variable)
+FEATURE_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", "data/cache")
+
+class FeatureMatrix:
+    """
+    Read-only view of a published feature matrix
+
+    The array is stored column-major, so every column is a contiguous,
+    zero-copy view of the mapped file. Rows follow the grid row positions.
+    """
+
+    def __init__(self, array, columns, has_nan):
+        self.array = array
+        self.columns = list(columns)
+        self.has_nan = dict(zip(self.columns, has_nan))
+        self._positions = {col: i for i, col in enumerate(self.columns)}
+
+    def __len__(self):
+        return self.array.shape[0]
+
+    def __contains__(self, column):
+        return column in self._positions
+
+    def column(self, name):
+        """
+        Get one feature as a read-only view
+
+        Parameters:
+        - name: Column name
+
+        Returns:
+        - numpy.ndarray: float32 values, NaN where missing
+        """
+
+        return self.array[:, self._positions[name]]
+
+    def select(self, names, fill_value=None):
+        """
+        Get several features as an (n_rows, len(names)) array
+
+        Parameters:
+        - names: Column names
+        - fill_value: Replacement for missing values (default: keep NaN)
+
+        Returns:
+        - numpy.ndarray: float32 array; a view when the columns are adjacent in
+          the file and no filling is needed, a copy otherwise
+        """
+
+        positions = [self._positions[name] for name in names]
+        if positions == list(range(positions[0], positions[0] + len(positions))):
+            values = self.array[:, positions[0]:positions[0] + len(positions)]
+        else:
+            values = self.array[:, positions]
+
+        if fill_value is not None and any(self.has_nan[name] for name in names):
+            values = np.where(np.isnan(values), np.float32(fill_value), values)
+
+        return values
+
+def features_path_for(handle, cache_dir=FEATURE_CACHE_DIR):
+    """
+    Path of the feature matrix published for a grid
+
+    Files are named '<source prefix>.<content hash>.features.npy', so the
+    matrices of one source differ only in the hash.
+
+    Parameters:
+    - handle: GridHandle of the grid
+    - cache_dir: Folder of the published matrices (default=FEATURE_CACHE_DIR)
+
+    Returns:
+    - pathlib.Path: Path of the .npy file (the column index uses .json)
+    """
+
+    # Several grids can come from one source (e.g. partition sets of a store)
+    return Path(cache_dir) / f"{_source_prefix(handle)}.{handle.short_hash}.features.npy"
+
+def _source_prefix(handle):
+    """File name prefix shared by the matrices of a grid's source"""
+    if handle.source is None:
+        return "grid"
+    source_path = Path(handle.source).resolve()
+    digest = hashlib.sha1(str(source_path).encode('utf-8')).hexdigest()[:8]
+    return f"{source_path.stem}-{digest}"
+
+def remove_stale_matrices(handle, cache_dir=FEATURE_CACHE_DIR):
+    """
+    Delete the matrices published for an older version of a grid's source
+
+    One source can back several live grids (e.g. partition sets of one
+    store manifest, or different column selections), so a matrix is only
+    stale when it was written for a different modification time of the
+    source. Grids without a source file are left alone, since their prefix
+    is shared by unrelated grids.
+
+    Parameters:
+    - handle: GridHandle of the current grid
+    - cache_dir: Folder of the published matrices (default=FEATURE_CACHE_DIR)
+
+    Returns:
+    - int: Number of matrices deleted
+    """
+
+    if handle.source is None:
+        return 0
+
+    current = features_path_for(handle, cache_dir)
+    removed = 0
+    for npy_path in Path(cache_dir).glob(f"{_source_prefix(handle)}.*.features.npy"):
+        if npy_path == current or _read_index(npy_path).get('source_mtime') == handle.mtime:
+            continue
+        try:
+            # Processes that mapped the old file keep their mapping (POSIX)
+            npy_path.unlink()
+            _index_path(npy_path).unlink(missing_ok=True)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+def _index_path(npy_path):
+    return Path(npy_path).with_suffix('.json')
+
+def _read_index(npy_path):
+    """Column index of a published matrix, empty if missing or unreadable"""
+    try:
+        with open(_index_path(npy_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def publish_feature_matrix(agebs_hex, npy_path, handle=None, columns=FEATURE_MATRIX_COLUMNS):
+    """
+    Write the grid features as a column-major float32 .npy file and its column index
+
+    Files are written under temporary names and renamed into place, so
+    readers in other processes never see a partial file.
+
+    Parameters:
+    - agebs_hex: Grid GeoDataFrame
+    - npy_path: Output .npy path
+    - handle: GridHandle of the grid (default: get_grid_handle(agebs_hex)),
+      its content hash and source modification time are recorded for
+      staleness checks
+    - columns: Feature columns to store (default=FEATURE_MATRIX_COLUMNS)
+
+    Returns:
+    - dict: The column index written next to the matrix
+    """
+
+    if handle is None:
+        handle = get_grid_handle(agebs_hex)
+
+    npy_path = Path(npy_path)
+    npy_path.parent.mkdir(parents=True, exist_ok=True)
+
+    columns = [col for col in columns if col in agebs_hex.columns]
+    array = np.empty((len(agebs_hex), len(columns)), dtype=np.float32, order='F')
+    for i, col in enumerate(columns):
+        array[:, i] = agebs_hex[col].to_numpy(dtype=np.float32, na_value=np.nan)
+
+    index = {
+        'columns': columns,
+        'rows': len(agebs_hex),
+        'has_nan': [bool(np.isnan(array[:, i]).any()) for i in range(len(columns))],
+        'content_hash': handle.content_hash,
+        'source': handle.source,
+        'source_mtime': handle.mtime
+    }
+
+    fd, tmp_npy = tempfile.mkstemp(suffix='.npy', dir=npy_path.parent)
+    with os.fdopen(fd, 'wb') as f:
+        np.save(f, array)
+    fd, tmp_index = tempfile.mkstemp(suffix='.json', dir=npy_path.parent)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(index, f)
+
+    os.replace(tmp_npy, npy_path)
+    os.replace(tmp_index, _index_path(npy_path))
+
+    return index
+
+def open_feature_matrix(npy_path):
+    """
+    Map a published feature matrix read-only
+
+    Parameters:
+    - npy_path: Path of the .npy file
+
+    Returns:
+    - FeatureMatrix
+    """
+
+    with open(_index_path(npy_path)) as f:
+        index = json.load(f)
+
+    array = np.load(npy_path, mmap_mode='r')
+    return FeatureMatrix(array, index['columns'], index['has_nan'])
+
+def _is_current(npy_path, handle, columns):
+    """Check that a published matrix was written for this grid content, columns and source version"""
+    if not Path(npy_path).exists():
+        return False
+
+    index = _read_index(npy_path)
+    return (index.get('content_hash') == handle.content_hash and index.get('columns') == columns
+            and index.get('source_mtime') == handle.mtime)
+
+def get_feature_matrix(agebs_hex):
+    """
+    Get the memory-mapped feature matrix of a grid, publishing it if needed
+
+    The matrix is republished whenever the grid's content hash or its
+    source file changes, and the matrices written for older versions of the
+    source are then deleted.
+
+    Parameters:
+    - agebs_hex: Grid GeoDataFrame
+
+    Returns:
+    - FeatureMatrix
+    """
+
+    def build(gdf):
+        handle = get_grid_handle(gdf)
+        npy_path = features_path_for(handle)
+        columns = [col for col in FEATURE_MATRIX_COLUMNS if col in gdf.columns]
+        published = False
+        if not _is_current(npy_path, handle, columns):
+            publish_feature_matrix(gdf, npy_path, handle, columns)
+            published = True
+        try:
+            matrix = open_feature_matrix(npy_path)
+        except FileNotFoundError:
+            # Removed as stale by a process loading another version of the source
+            publish_feature_matrix(gdf, npy_path, handle, columns)
+            published = True
+            matrix = open_feature_matrix(npy_path)
+        if published:
+            remove_stale_matrices(handle)
+        return matrix
+
+    return get_grid_derived(agebs_hex, 'feature_matrix', build)
@@ -4,11 +4,19 @@ Google Places API interaction functions
 
 import requests
 import warnings
-from config import GOOGLE_PLACES_API_KEY
+from config import GOOGLE_PLACES_API_KEY, GOOGLE_PLACES_API_URL
+from http_client import http_get
+from singleflight import SingleFlight
 
 # Default rating to use when API is not available or fails
 DEFAULT_RATING = 3.5
 
+# Decimal places identifying a place's location in coalesced lookups (~1 m)
+RATING_KEY_PRECISION = 5
+
+# Concurrent lookups of the same place share one request
+_rating_flights = SingleFlight()
+
 def get_google_place_rating(place_name, lat, lng):
     """
     Get Google Places rating for a business
@@ -26,9 +34,20 @@ def get_google_place_rating(place_name, lat, lng):
     if not GOOGLE_PLACES_API_KEY or len(GOOGLE_PLACES_API_KEY.strip()) == 0:
         return DEFAULT_RATING
     
+    try:
+        key = (' '.join(str(place_name).lower().split()),
+               round(float(lat), RATING_KEY_PRECISION), round(float(lng), RATING_KEY_PRECISION))
+    except (ValueError, TypeError):
+        return DEFAULT_RATING
+    
+    return _rating_flights.do(key, _fetch_place_rating, place_name, lat, lng)
+
+def _fetch_place_rating(place_name, lat, lng):
+    """Request a place's rating from the Nearby Search API (see get_google_place_rating)"""
+    
     try:
         # Google Places Nearby Search API
-        base_url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+        base_url = f"{GOOGLE_PLACES_API_URL}/nearbysearch/json"
         
         params = {
             'location': f"{lat},{lng}",
@@ -37,7 +56,7 @@ def get_google_place_rating(place_name, lat, lng):
             'key': GOOGLE_PLACES_API_KEY
         }
         
-        response = requests.get(base_url, params=params, timeout=10)
+        response = http_get(base_url, params=params, endpoint='places.nearbysearch')
         
         if response.status_code != 200:
             warnings.warn(f"Google Places API error: {response.status_code}")
@@ -102,7 +121,7 @@ def search_google_places(query, lat, lng, radius=1000):
         return []
     
     try:
-        base_url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
+        base_url = f"{GOOGLE_PLACES_API_URL}/textsearch/json"
         
         params = {
             'query': query,
@@ -111,7 +130,7 @@ def search_google_places(query, lat, lng, radius=1000):
             'key': GOOGLE_PLACES_API_KEY
         }
         
-        response = requests.get(base_url, params=params, timeout=15)
+        response = http_get(base_url, params=params, endpoint='places.textsearch')
         
         if response.status_code != 200:
             warnings.warn(f"Google Places Text Search API error: {response.status_code}")
@@ -0,0 +1,431 @@
+"""
+Hexagonal grid builder (Python port of utils/oaxaca_grid.R)
+
+Generates a hexagonal lattice over the Oaxaca ZMO AGEBs and apportions the
+census profile counts of each AGEB to the hexagons it overlaps, weighted by
+the share of the AGEB's area inside each hexagon. Hexagon/AGEB pairs come
+from an STRtree query instead of intersecting every hexagon with every
+AGEB, and tiles of the lattice are processed in parallel. The result is
+written directly as the prepared GeoParquet grid read by the app.
+
+Usage:
+    python utils/grid_builder.py [--agebs DIR] [--perfiles FILE] [--dst PARQUET]
+                                 [--cell-size M] [--tile-size N] [--workers N] [--compare]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from shapely import STRtree
+
+from grid_store import GRID_PROJECTED_CRS, prepare_grid, write_grid_parquet
+from perfiles import PERFILES_FILEPATH
+
+# CVE_MUN codes of the municipalities in the Oaxaca ZMO
+ZMO_MUNICIPIOS = [
+    '045', '063', '067', '083', '087', '091', '107', '115', '157', '174',
+    '227', '293', '338', '350', '375', '385', '390', '399', '403', '409',
+    '519', '539', '553', '565'
+]
+
+# Default AGEB input (profiles default to perfiles.PERFILES_FILEPATH)
+AGEB_SHAPEFILE_FOLDER = "../data/agebs_oaxaca/conjunto_de_datos"
+
+# Distance between opposite edges of a hexagon, in meters
+HEX_CELL_SIZE = 500
+
+# Lattice tiles are tile_size x tile_size hexagons
+TILE_SIZE = 40
+
+# Profile columns apportioned to hexagons -> grid shapefile column names
+PROFILE_COUNT_COLUMNS = {
+    'POBTOT': 'pblcn_t',
+    'estimado_ctes_joven': 'jvn_dgt',
+    'estimado_ctes_mama': 'mm_mprn',
+    'estimado_ctes_mayorista': 'myrst_x',
+    'estimado_ctes_total': 'cts_ttl'
+}
+
+# Optional name columns carried to each hexagon from its largest-overlap AGEB
+PROFILE_NAME_COLUMNS = ['NOM_MUN', 'NOM_LOC']
+
+def hex_centers(origin, n_rows, n_cols, cell_size):
+    """
+    Centers of a pointy-top hexagonal lattice
+
+    Odd rows are shifted by half a cell, as in sf::st_make_grid(square = FALSE).
+
+    Parameters:
+    - origin: (x, y) of the first center
+    - n_rows, n_cols: Lattice size
+    - cell_size: Distance between opposite edges of a hexagon
+
+    Returns:
+    - numpy.ndarray: (n_rows * n_cols, 2) array of centers, row by row
+    """
+
+    row_step = 1.5 * cell_size / np.sqrt(3)
+    rows, cols = np.meshgrid(np.arange(n_rows), np.arange(n_cols), indexing='ij')
+    cx = origin[0] + cols * cell_size + (rows % 2) * cell_size / 2
+    cy = origin[1] + rows * row_step
+    return np.column_stack([cx.ravel(), cy.ravel()])
+
+def hexagon_vertices(centers, cell_size):
+    """
+    Closed vertex rings of pointy-top hexagons around centers
+
+    Parameters:
+    - centers: (n, 2) array of centers
+    - cell_size: Distance between opposite edges of a hexagon
+
+    Returns:
+    - numpy.ndarray: (n, 7, 2) array of vertices, first vertex repeated last
+    """
+
+    angles = np.radians(np.arange(30, 390, 60))
+    ring = np.column_stack([np.cos(angles), np.sin(angles)]) * cell_size / np.sqrt(3)
+    ring = np.vstack([ring, ring[:1]])
+    return centers[:, None, :] + ring[None, :, :]
+
+def hexagons(centers, cell_size):
+    """
+    Pointy-top hexagons around centers, built from one vertex array
+
+    Parameters:
+    - centers: (n, 2) array of centers
+    - cell_size: Distance between opposite edges of a hexagon
+
+    Returns:
+    - numpy.ndarray: Array of shapely Polygons
+    """
+
+    return shapely.polygons(hexagon_vertices(centers, cell_size))
+
+def hex_lattice(bounds, cell_size):
+    """
+    Pointy-top hexagonal lattice covering a bounding box
+
+    Uses the same layout as sf::st_make_grid(square = FALSE): cell_size is
+    the distance between opposite edges and odd rows are shifted by half a
+    cell.
+
+    Parameters:
+    - bounds: (minx, miny, maxx, maxy) in projected units
+    - cell_size: Distance between opposite edges of a hexagon
+
+    Returns:
+    - tuple: (polygons, centers) with an array of shapely Polygons and an
+      (n, 2) array of hexagon centers
+    """
+
+    minx, miny, maxx, maxy = bounds
+    radius = cell_size / np.sqrt(3)
+
+    n_cols = int(np.ceil((maxx - minx) / cell_size)) + 2
+    n_rows = int(np.ceil((maxy - miny) / (1.5 * radius))) + 2
+
+    centers = hex_centers((minx - cell_size / 2, miny - radius), n_rows, n_cols, cell_size)
+    return hexagons(centers, cell_size), centers
+
+def read_agebs(folder=AGEB_SHAPEFILE_FOLDER, municipios=ZMO_MUNICIPIOS):
+    """
+    Read the AGEB polygons of the ZMO municipalities
+
+    Parameters:
+    - folder: Folder with the AGEB shapefile (the first .shp found is used)
+    - municipios: CVE_MUN codes to keep (default=ZMO_MUNICIPIOS, None for all)
+
+    Returns:
+    - GeoDataFrame: AGEBs with 'CVEGEO'
+    """
+
+    shp_files = sorted(Path(folder).glob("*.shp"))
+    if len(shp_files) == 0:
+        raise FileNotFoundError(f"No .shp file found in {folder}")
+    if len(shp_files) > 1:
+        print(f"Multiple .shp files found in {folder}. Using the first one: {shp_files[0]}")
+
+    agebs = gpd.read_file(shp_files[0])
+    if municipios is not None and 'CVE_MUN' in agebs.columns:
+        agebs = agebs[agebs['CVE_MUN'].astype(str).str.zfill(3).isin(municipios)]
+
+    return agebs
+
+def read_profiles(path=PERFILES_FILEPATH):
+    """
+    Read the AGEB customer profiles (output of utils/perfiles.py)
+
+    Parameters:
+    - path: Parquet or CSV file with 'CVEGEO' and the PROFILE_COUNT_COLUMNS
+
+    Returns:
+    - pandas.DataFrame
+    """
+
+    path = Path(path)
+    if path.suffix == '.csv':
+        return pd.read_csv(path, dtype={'CVEGEO': str})
+
+    perfiles = pd.read_parquet(path)
+    perfiles['CVEGEO'] = perfiles['CVEGEO'].astype(str)
+    return perfiles
+
+def prepare_agebs(agebs, perfiles):
+    """
+    Join AGEB polygons with their profiles and project them for overlay
+
+    Parameters:
+    - agebs: AGEB GeoDataFrame with 'CVEGEO'
+    - perfiles: Profiles DataFrame with 'CVEGEO'
+
+    Returns:
+    - GeoDataFrame: Valid AGEB polygons in GRID_PROJECTED_CRS with profile counts
+    """
+
+    keep = ['CVEGEO'] + [col for col in list(PROFILE_COUNT_COLUMNS) + PROFILE_NAME_COLUMNS
+                         if col in perfiles.columns]
+    agebs = agebs[['CVEGEO', 'geometry']].merge(perfiles[keep], on='CVEGEO', how='inner')
+    agebs = agebs[agebs['POBTOT'].notna()].to_crs(GRID_PROJECTED_CRS)
+
+    geometries = agebs.geometry.values
+    invalid = ~shapely.is_valid(np.asarray(geometries))
+    if invalid.any():
+        agebs.loc[invalid, 'geometry'] = shapely.make_valid(np.asarray(geometries)[invalid])
+
+    return agebs.reset_index(drop=True)
+
+def overlay_pairs(hexes, agebs_geoms, ageb_tree):
+    """
+    Intersect hexagons with the AGEBs they overlap, using the AGEB STRtree
+
+    Parameters:
+    - hexes: Array of hexagon polygons
+    - agebs_geoms: Array of AGEB polygons
+    - ageb_tree: STRtree over agebs_geoms
+
+    Returns:
+    - tuple: (hex positions, AGEB positions, intersection areas) for pairs
+      with a positive overlap
+    """
+
+    hex_idx, ageb_idx = ageb_tree.query(hexes, predicate='intersects')
+    areas = shapely.area(shapely.intersection(hexes[hex_idx], agebs_geoms[ageb_idx]))
+    overlapping = areas > 0
+    return hex_idx[overlapping], ageb_idx[overlapping], areas[overlapping]
+
+def overlay_pairs_naive(hexes, agebs_geoms, chunk_size=2000):
+    """
+    Intersect every hexagon with every AGEB (reference for timing comparisons)
+
+    Parameters:
+    - hexes: Array of hexagon polygons
+    - agebs_geoms: Array of AGEB polygons
+    - chunk_size: Hexagons intersected per batch (default=2000)
+
+    Returns:
+    - tuple: (hex positions, AGEB positions, intersection areas), as overlay_pairs
+    """
+
+    hex_parts, ageb_parts, area_parts = [], [], []
+    for start in range(0, len(hexes), chunk_size):
+        chunk = hexes[start:start + chunk_size]
+        areas = shapely.area(shapely.intersection(chunk[:, None], agebs_geoms[None, :]))
+        hex_idx, ageb_idx = np.nonzero(areas > 0)
+        hex_parts.append(hex_idx + start)
+        ageb_parts.append(ageb_idx)
+        area_parts.append(areas[hex_idx, ageb_idx])
+
+    return np.concatenate(hex_parts), np.concatenate(ageb_parts), np.concatenate(area_parts)
+
+def apportion(hex_idx, ageb_idx, areas, agebs, n_hexes):
+    """
+    Area-weighted apportionment of AGEB counts to hexagons
+
+    Each pair receives the AGEB counts times the share of the AGEB's area
+    inside the hexagon.
+
+    Parameters:
+    - hex_idx, ageb_idx, areas: Overlapping pairs (see overlay_pairs)
+    - agebs: Projected AGEB GeoDataFrame with profile counts and 'ageb_area'
+    - n_hexes: Number of hexagons
+
+    Returns:
+    - pandas.DataFrame: One row per hexagon with the apportioned counts and,
+      when available, the names of the AGEB with the largest overlap
+    """
+
+    weights = areas / agebs['ageb_area'].to_numpy()[ageb_idx]
+
+    result = pd.DataFrame(index=pd.RangeIndex(n_hexes))
+    for col in PROFILE_COUNT_COLUMNS:
+        if col in agebs.columns:
+            values = agebs[col].fillna(0).to_numpy(dtype=float)[ageb_idx] * weights
+            result[col] = np.bincount(hex_idx, weights=values, minlength=n_hexes)
+
+    name_cols = [col for col in PROFILE_NAME_COLUMNS if col in agebs.columns]
+    if name_cols and len(hex_idx) > 0:
+        # Pair with the largest overlap per hexagon
+        order = np.lexsort((-areas, hex_idx))
+        first = order[np.r_[True, hex_idx[order][1:] != hex_idx[order][:-1]]]
+        for col in name_cols:
+            result[col] = None
+            result.loc[hex_idx[first], col] = agebs[col].to_numpy()[ageb_idx[first]]
+
+    return result
+
+def _tile_labels(centers, cell_size, tile_size):
+    """Tile number of every hexagon center"""
+    radius = cell_size / np.sqrt(3)
+    tile_x = np.floor((centers[:, 0] - centers[:, 0].min()) / (cell_size * tile_size)).astype(np.int64)
+    tile_y = np.floor((centers[:, 1] - centers[:, 1].min()) / (1.5 * radius * tile_size)).astype(np.int64)
+    return tile_y * (tile_x.max() + 1) + tile_x
+
+def _print_progress(done, total, elapsed):
+    end = "\n" if done == total else ""
+    print(f"\r  tiles {done}/{total} ({100 * done / total:.0f}%) - {elapsed:.1f} s", end=end,
+          file=sys.stderr, flush=True)
+
+def build_grid(agebs, cell_size=HEX_CELL_SIZE, tile_size=TILE_SIZE, workers=None,
+               progress=_print_progress):
+    """
+    Build the hexagonal grid with area-weighted AGEB counts
+
+    Parameters:
+    - agebs: Projected AGEB GeoDataFrame from prepare_agebs
+    - cell_size: Distance between opposite hexagon edges in meters (default=HEX_CELL_SIZE)
+    - tile_size: Hexagons per tile side (default=TILE_SIZE)
+    - workers: Parallel tile workers (default: CPU count)
+    - progress: Callable (done, total, elapsed_s) called after each tile, or None
+
+    Returns:
+    - GeoDataFrame: Grid in EPSG:4326 with the grid shapefile column names
+      ('id_hx_x', 'pblcn_t', ...), keeping only hexagons that received data
+    """
+
+    agebs = agebs.copy()
+    agebs['ageb_area'] = shapely.area(np.asarray(agebs.geometry.values))
+    agebs_geoms = np.asarray(agebs.geometry.values)
+    ageb_tree = STRtree(agebs_geoms)
+
+    hexes, centers = hex_lattice(agebs.total_bounds, cell_size)
+    tiles = _tile_labels(centers, cell_size, tile_size)
+    tile_positions = [np.flatnonzero(tiles == t) for t in np.unique(tiles)]
+
+    def process(positions):
+        hex_idx, ageb_idx, areas = overlay_pairs(hexes[positions], agebs_geoms, ageb_tree)
+        return positions[hex_idx], ageb_idx, areas
+
+    # shapely 2 releases the GIL in its vectorized operations, so tiles run in threads
+    start = time.perf_counter()
+    parts = []
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = [executor.submit(process, positions) for positions in tile_positions]
+        for done, future in enumerate(as_completed(futures), start=1):
+            parts.append(future.result())
+            if progress is not None:
+                progress(done, len(futures), time.perf_counter() - start)
+
+    hex_idx = np.concatenate([p[0] for p in parts]) if parts else np.array([], dtype=np.intp)
+    ageb_idx = np.concatenate([p[1] for p in parts]) if parts else np.array([], dtype=np.intp)
+    areas = np.concatenate([p[2] for p in parts]) if parts else np.array([], dtype=float)
+
+    counts = apportion(hex_idx, ageb_idx, areas, agebs, len(hexes))
+    counts.insert(0, 'id_hex', np.arange(1, len(hexes) + 1))
+
+    count_cols = [col for col in PROFILE_COUNT_COLUMNS if col in counts.columns]
+    has_data = (counts[count_cols] > 0).any(axis=1).to_numpy()
+
+    grid = gpd.GeoDataFrame(counts[has_data], geometry=hexes[has_data], crs=GRID_PROJECTED_CRS)
+    grid = grid.rename(columns={'id_hex': 'id_hx_x', **PROFILE_COUNT_COLUMNS})
+
+    return grid.to_crs('EPSG:4326').reset_index(drop=True)
+
+def compare_overlay(agebs, cell_size=HEX_CELL_SIZE):
+    """
+    Time the indexed overlay against intersecting every hexagon with every AGEB
+
+    Parameters:
+    - agebs: Projected AGEB GeoDataFrame from prepare_agebs
+    - cell_size: Distance between opposite hexagon edges in meters
+
+    Returns:
+    - dict with 'pairs', 'indexed_s', 'naive_s' and 'max_abs_diff' (largest
+      difference in apportioned population between both methods)
+    """
+
+    agebs = agebs.copy()
+    agebs['ageb_area'] = shapely.area(np.asarray(agebs.geometry.values))
+    agebs_geoms = np.asarray(agebs.geometry.values)
+    hexes, _ = hex_lattice(agebs.total_bounds, cell_size)
+
+    start = time.perf_counter()
+    indexed = overlay_pairs(hexes, agebs_geoms, STRtree(agebs_geoms))
+    indexed_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    naive = overlay_pairs_naive(hexes, agebs_geoms)
+    naive_s = time.perf_counter() - start
+
+    pob_indexed = apportion(*indexed, agebs, len(hexes))['POBTOT']
+    pob_naive = apportion(*naive, agebs, len(hexes))['POBTOT']
+
+    return {
+        'pairs': len(indexed[0]),
+        'indexed_s': indexed_s,
+        'naive_s': naive_s,
+        'max_abs_diff': float((pob_indexed - pob_naive).abs().max())
+    }
+
+def main(argv=None):
+    """Command line entry point"""
+
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from config import APP_CONFIG
+
+    parser = argparse.ArgumentParser(description="Build the hexagonal grid from AGEBs and profiles")
+    parser.add_argument('--agebs', default=AGEB_SHAPEFILE_FOLDER, help="Folder with the AGEB shapefile")
+    parser.add_argument('--perfiles', default=PERFILES_FILEPATH, help="Profiles file (.parquet or .csv)")
+    parser.add_argument('--dst', default=APP_CONFIG['oaxaca_grid_parquet_filepath'], help="Output GeoParquet grid")
+    parser.add_argument('--cell-size', type=float, default=HEX_CELL_SIZE, help="Hexagon size in meters")
+    parser.add_argument('--tile-size', type=int, default=TILE_SIZE, help="Hexagons per tile side")
+    parser.add_argument('--workers', type=int, default=None, help="Parallel tile workers")
+    parser.add_argument('--compare', action='store_true',
+                        help="Also time the indexed overlay against an all-pairs intersection")
+    args = parser.parse_args(argv)
+
+    timings = {}
+
+    start = time.perf_counter()
+    agebs = prepare_agebs(read_agebs(args.agebs), read_profiles(args.perfiles))
+    timings['read'] = time.perf_counter() - start
+    print(f"Loaded {len(agebs)} AGEBs with profiles")
+
+    start = time.perf_counter()
+    grid = build_grid(agebs, cell_size=args.cell_size, tile_size=args.tile_size, workers=args.workers)
+    timings['build'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    output = write_grid_parquet(prepare_grid(grid), args.dst)
+    timings['write'] = time.perf_counter() - start
+
+    print(f"Wrote {len(grid)} hexagons to '{output}'")
+    print(f"Population: AGEBs {agebs['POBTOT'].sum():,.0f}, grid {grid['pblcn_t'].sum():,.0f}")
+    print("Timings: " + ", ".join(f"{step} {seconds:.2f} s" for step, seconds in timings.items()))
+
+    if args.compare:
+        result = compare_overlay(agebs, cell_size=args.cell_size)
+        print(f"Overlay of {result['pairs']} pairs: indexed {result['indexed_s']:.2f} s, "
+              f"all-pairs {result['naive_s']:.2f} s "
+              f"({result['naive_s'] / max(result['indexed_s'], 1e-9):.1f}x), "
+              f"max population difference {result['max_abs_diff']:.2e}")
+
+if __name__ == "__main__":
+    main()
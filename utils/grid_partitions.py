@@ -0,0 +1,310 @@
+"""
+Partitioned multi-region grid store
+
+Stores prepared grids as one GeoParquet file per municipality (or per
+region) under a store folder, with a small JSON manifest holding every
+partition's region, municipality, bounds and row count. Only the
+partitions that intersect a view or match a selection are read, so memory
+and load time follow what is on screen instead of national coverage.
+
+Layout:
+    <store>/manifest.json
+    <store>/<region>/<partition>.parquet
+
+Usage:
+    python utils/grid_partitions.py add --region NAME [--src GRID] [--by COLUMN] [--store DIR]
+    python utils/grid_partitions.py list [--store DIR]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+import geopandas as gpd
+
+from grid_store import grid_content_hash, read_grid_parquet, read_grid_shapefile, write_grid_parquet
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Raw partitions kept in memory per store
+PARTITION_CACHE_SIZE = 32
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def _slug(name):
+    """ASCII file name for a region or municipality name"""
+    ascii_name = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode('ascii')
+    slug = ''.join(ch if ch.isalnum() else '_' for ch in ascii_name.lower()).strip('_')
+    return slug or 'sin_nombre'
+
+def _bounds_intersect(a, b):
+    """Intersection test for (minx, miny, maxx, maxy) boxes"""
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+class GridPartitionStore:
+    """
+    Lazy reader of a partitioned grid store
+
+    The manifest is re-read when its file changes; partitions are read on
+    demand and the most recently used ones are kept in memory.
+    """
+
+    def __init__(self, store_dir, cache_size=PARTITION_CACHE_SIZE):
+        self.store_dir = Path(store_dir)
+        self.manifest_path = self.store_dir / MANIFEST_NAME
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._manifest_mtime = None
+        self._cache = OrderedDict()
+
+    def exists(self):
+        """Return True if the store has a manifest"""
+        return self.manifest_path.exists()
+
+    @property
+    def partitions(self):
+        """Manifest entries, one dict per partition"""
+        mtime = self.manifest_path.stat().st_mtime if self.exists() else None
+        with self._lock:
+            if self._manifest is None or mtime != self._manifest_mtime:
+                if mtime is None:
+                    self._manifest = {'version': MANIFEST_VERSION, 'partitions': []}
+                else:
+                    with open(self.manifest_path, encoding='utf-8') as f:
+                        self._manifest = json.load(f)
+                self._manifest_mtime = mtime
+                self._cache.clear()
+            return self._manifest['partitions']
+
+    def regions(self):
+        """Sorted region names"""
+        return sorted({p['region'] for p in self.partitions})
+
+    def municipios(self, region=None):
+        """Sorted municipality names, optionally within a region"""
+        return sorted({p['municipio'] for p in self.partitions
+                       if p['municipio'] is not None and (region is None or p['region'] == region)})
+
+    def select(self, region=None, municipio=None):
+        """
+        Partition ids matching a region and/or municipality
+
+        Parameters:
+        - region: Region name (default: all)
+        - municipio: Municipality name (default: all)
+
+        Returns:
+        - list: Partition ids
+        """
+
+        return [p['id'] for p in self.partitions
+                if (region is None or p['region'] == region)
+                and (municipio is None or p['municipio'] == municipio)]
+
+    def intersecting(self, bounds, region=None):
+        """
+        Partition ids whose bounds intersect a view
+
+        Parameters:
+        - bounds: (south, west, north, east) of the view
+        - region: Region name to restrict to (default: all)
+
+        Returns:
+        - list: Partition ids
+        """
+
+        south, west, north, east = bounds
+        box = (west, south, east, north)
+        return [p['id'] for p in self.partitions
+                if (region is None or p['region'] == region) and _bounds_intersect(p['bounds'], box)]
+
+    def read_partition(self, partition_id):
+        """
+        Read one partition (prepared grid columns, EPSG:4326)
+
+        Parameters:
+        - partition_id: Partition id from the manifest
+
+        Returns:
+        - GeoDataFrame
+        """
+
+        entries = {p['id']: p for p in self.partitions}
+        if partition_id not in entries:
+            raise KeyError(f"Unknown grid partition: {partition_id}")
+
+        with self._lock:
+            if partition_id in self._cache:
+                self._cache.move_to_end(partition_id)
+                return self._cache[partition_id]
+
+        gdf = read_grid_parquet(self.store_dir / entries[partition_id]['path'])
+
+        with self._lock:
+            self._cache[partition_id] = gdf
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return gdf
+
+    def load(self, partition_ids, columns=None):
+        """
+        Read and concatenate partitions
+
+        Parameters:
+        - partition_ids: Partition ids to read
+        - columns: Prepared columns to keep (default: all), geometry is always kept
+
+        Returns:
+        - GeoDataFrame: Rows of the partitions in the given order
+        """
+
+        frames = [self.read_partition(pid) for pid in partition_ids]
+        if len(frames) == 0:
+            return gpd.GeoDataFrame(geometry=[], crs='EPSG:4326')
+
+        gdf = gpd.GeoDataFrame(pd.concat(frames, ignore_index=True), crs=frames[0].crs)
+        if columns is not None:
+            keep = [col for col in columns if col in gdf.columns and col != 'geometry']
+            gdf = gdf[keep + ['geometry']]
+        return gdf
+
+def get_partition_store(store_dir):
+    """Process-wide GridPartitionStore for a folder"""
+    key = str(Path(store_dir).resolve())
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = GridPartitionStore(store_dir)
+        return _stores[key]
+
+def _write_manifest(manifest_path, manifest):
+    """Write the manifest atomically"""
+    fd, tmp_path = tempfile.mkstemp(suffix='.json', dir=manifest_path.parent)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, manifest_path)
+
+def add_region(agebs_hex, store_dir, region, by='nombre_municipio'):
+    """
+    Partition a prepared grid and add it to a store, replacing the region if present
+
+    Partition files are named after the municipality; names that fold to
+    the same file name get a numeric suffix ('san_juan', 'san_juan_2').
+    Files of a replaced region that the new partitions do not reuse are
+    deleted once the manifest no longer lists them.
+
+    Parameters:
+    - agebs_hex: Prepared grid GeoDataFrame in EPSG:4326
+    - store_dir: Store folder
+    - region: Region name (e.g. a metro area)
+    - by: Column defining the partitions (default='nombre_municipio');
+      the whole region is one partition if the column is missing
+
+    Returns:
+    - list: Manifest entries of the region's partitions
+
+    Raises:
+    - ValueError: If another region of the store has the same folder name
+    """
+
+    store_dir = Path(store_dir)
+    manifest_path = store_dir / MANIFEST_NAME
+    if manifest_path.exists():
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    else:
+        manifest = {'version': MANIFEST_VERSION, 'partitions': []}
+
+    region_slug = _slug(region)
+    clashing = {p['region'] for p in manifest['partitions']
+                if p['region'] != region and _slug(p['region']) == region_slug}
+    if clashing:
+        raise ValueError(f"Region '{region}' would share the folder '{region_slug}' "
+                         f"with region '{sorted(clashing)[0]}'")
+
+    region_dir = store_dir / region_slug
+    region_dir.mkdir(parents=True, exist_ok=True)
+
+    if by in agebs_hex.columns:
+        groups = agebs_hex.groupby(agebs_hex[by].astype(object).fillna('Desconocido'), sort=True)
+    else:
+        groups = [(None, agebs_hex)]
+
+    entries = []
+    used = set()
+    for name, part in groups:
+        part = part.reset_index(drop=True)
+        stem = _slug(name) if name is not None else 'todo'
+        if stem in used:
+            suffix = 2
+            while f"{stem}_{suffix}" in used:
+                suffix += 1
+            stem = f"{stem}_{suffix}"
+        used.add(stem)
+        file_name = f"{stem}.parquet"
+        write_grid_parquet(part, region_dir / file_name)
+        entries.append({
+            'id': f"{region_slug}/{stem}",
+            'region': region,
+            'municipio': name,
+            'path': f"{region_slug}/{file_name}",
+            'bounds': [float(b) for b in part.total_bounds],
+            'rows': len(part),
+            'content_hash': grid_content_hash(part)
+        })
+
+    superseded = {p['path'] for p in manifest['partitions'] if p['region'] == region}
+    superseded -= {e['path'] for e in entries}
+
+    manifest['partitions'] = [p for p in manifest['partitions'] if p['region'] != region] + entries
+    _write_manifest(manifest_path, manifest)
+
+    for path in superseded:
+        (store_dir / path).unlink(missing_ok=True)
+
+    return entries
+
+def main(argv=None):
+    """Command line entry point"""
+
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from config import APP_CONFIG
+
+    parser = argparse.ArgumentParser(description="Partitioned grid store tools")
+    parser.add_argument('--store', default=APP_CONFIG['grid_store_dir'], help="Store folder")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add_parser = subparsers.add_parser('add', help="Add (or replace) a region")
+    add_parser.add_argument('--region', required=True, help="Region name")
+    add_parser.add_argument('--src', default=APP_CONFIG['oaxaca_grid_parquet_filepath'],
+                            help="Grid file (.parquet or .shp)")
+    add_parser.add_argument('--by', default='nombre_municipio', help="Partition column")
+
+    subparsers.add_parser('list', help="List partitions")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'add':
+        src = Path(args.src)
+        agebs_hex = read_grid_shapefile(src) if src.suffix == '.shp' else read_grid_parquet(src)
+        entries = add_region(agebs_hex, args.store, args.region, by=args.by)
+        print(f"Added region '{args.region}': {len(entries)} partitions, "
+              f"{sum(e['rows'] for e in entries)} hexagons")
+
+    elif args.command == 'list':
+        store = GridPartitionStore(args.store)
+        for p in store.partitions:
+            print(f"{p['id']:<40} {p['rows']:>8} rows  {p['municipio']}")
+
+if __name__ == "__main__":
+    main()
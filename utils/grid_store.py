@@ -0,0 +1,547 @@
+"""
+Columnar storage for the hexagonal grid
+
+Converts the grid shapefile into a GeoParquet file with column renames and
+log transforms already applied, and reads it back with column projection.
+
+Usage:
+    python utils/grid_store.py convert [--src SHP] [--dst PARQUET]
+    python utils/grid_store.py benchmark [--src SHP] [--dst PARQUET] [--repeats N]
+    python utils/grid_store.py memory
+"""
+
+import argparse
+import hashlib
+import json
+import subprocess
+import sys
+import time
+import warnings
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from helpers import get_grid_derived
+
+# Shapefile column names (truncated by the DBF format) -> app column names
+GRID_COLUMN_RENAMES = {
+    'id_hx_x': 'id_hex',
+    'pblcn_t': 'poblacion_total',
+    'jvn_dgt': 'joven_digital_raw',
+    'mm_mprn': 'mama_emprendedora_raw',
+    'myrst_x': 'mayorista_experimentado_raw',
+    'cts_ttl': 'clientes_totales_raw',
+    'NOM_MUN': 'nombre_municipio',
+    'NOM_LOC': 'nombre_localidad'
+}
+
+# Raw count columns stored as log1p under the name without '_raw'
+GRID_LOG_COLUMNS = ['joven_digital_raw', 'mama_emprendedora_raw',
+                    'mayorista_experimentado_raw', 'clientes_totales_raw']
+
+# Columns kept in the prepared grid
+GRID_FINAL_COLUMNS = ['id_hex', 'poblacion_total', 'joven_digital',
+                      'mama_emprendedora', 'mayorista_experimentado',
+                      'clientes_totales', 'nombre_municipio', 'nombre_localidad', 'geometry']
+
+def prepare_grid(agebs_hex):
+    """
+    Standardize a raw grid GeoDataFrame read from the shapefile
+
+    Adds placeholder name columns, renames columns, applies log1p to the
+    customer profile counts and keeps only the columns used by the app.
+
+    Parameters:
+    - agebs_hex: GeoDataFrame as read from the grid shapefile
+
+    Returns:
+    - GeoDataFrame: Prepared grid
+    """
+
+    # Check and add missing columns
+    if 'NOM_MUN' not in agebs_hex.columns:
+        warnings.warn("Column 'NOM_MUN' not found. Adding placeholder.")
+        agebs_hex['NOM_MUN'] = 'Desconocido'
+
+    if 'NOM_LOC' not in agebs_hex.columns:
+        warnings.warn("Column 'NOM_LOC' not found. Adding placeholder.")
+        agebs_hex['NOM_LOC'] = 'Desconocida'
+
+    # Standardize column names
+    agebs_hex = agebs_hex.rename(columns=GRID_COLUMN_RENAMES)
+
+    # Apply log transformations
+    for col in GRID_LOG_COLUMNS:
+        if col in agebs_hex.columns:
+            new_col = col.replace('_raw', '')
+            agebs_hex[new_col] = np.log1p(agebs_hex[col].fillna(0))
+
+    # Select final columns
+    available_cols = [col for col in GRID_FINAL_COLUMNS if col in agebs_hex.columns]
+    return agebs_hex[available_cols]
+
+# Numeric feature columns and repeated name columns of the prepared grid
+GRID_FEATURE_COLUMNS = ['poblacion_total', 'joven_digital', 'mama_emprendedora',
+                        'mayorista_experimentado', 'clientes_totales']
+GRID_NAME_COLUMNS = ['nombre_municipio', 'nombre_localidad']
+
+def compact_grid(agebs_hex):
+    """
+    Convert a prepared grid to compact dtypes
+
+    Float features become float32, integer features int32, name columns
+    categoricals and 'id_hex' an integer when its values are numeric.
+
+    Parameters:
+    - agebs_hex: Prepared grid GeoDataFrame
+
+    Returns:
+    - GeoDataFrame: Compact copy of the grid
+    """
+
+    compact = agebs_hex.copy()
+
+    for col in GRID_FEATURE_COLUMNS:
+        if col not in compact.columns:
+            continue
+        if pd.api.types.is_integer_dtype(compact[col]):
+            # int32 rather than the smallest type, so sums and products don't overflow
+            compact[col] = compact[col].astype(np.int32)
+        else:
+            compact[col] = compact[col].astype(np.float32)
+
+    for col in GRID_NAME_COLUMNS:
+        if col in compact.columns:
+            compact[col] = compact[col].astype('category')
+
+    if 'id_hex' in compact.columns:
+        # Shapefiles store integer ids as floats; non-numeric ids are kept as they are
+        ids = pd.to_numeric(compact['id_hex'], errors='coerce')
+        if ids.notna().all() and (ids % 1 == 0).all():
+            fits_int32 = ids.abs().max() < 2 ** 31 if len(ids) else True
+            compact['id_hex'] = ids.astype(np.int32 if fits_int32 else np.int64)
+
+    return compact
+
+# Projected CRS used for metric columns (Mexico ITRF2008 / LCC)
+GRID_PROJECTED_CRS = 'EPSG:6372'
+
+# Geometry-derived numeric columns added at load time
+GRID_DERIVED_COLUMNS = ['centroid_lat', 'centroid_lng', 'bbox_minx', 'bbox_miny',
+                        'bbox_maxx', 'bbox_maxy', 'x_6372', 'y_6372', 'area_m2']
+
+def add_derived_columns(agebs_hex):
+    """
+    Add geometry-derived numeric columns to a grid, computed once and vectorized
+
+    Adds the centroid ('centroid_lat', 'centroid_lng'), the bounding box
+    ('bbox_minx', 'bbox_miny', 'bbox_maxx', 'bbox_maxy'), the centroid
+    projected to EPSG:6372 in meters ('x_6372', 'y_6372') and the area in
+    square meters ('area_m2'). Missing or empty geometries get NaN.
+
+    Parameters:
+    - agebs_hex: Grid GeoDataFrame in EPSG:4326
+
+    Returns:
+    - GeoDataFrame: Copy of the grid with GRID_DERIVED_COLUMNS
+    """
+
+    agebs_hex = agebs_hex.copy()
+    if agebs_hex.crs is None:
+        agebs_hex = agebs_hex.set_crs('EPSG:4326')
+
+    geometries = np.asarray(agebs_hex.geometry.values)
+    projected = np.asarray(agebs_hex.geometry.to_crs(GRID_PROJECTED_CRS).values)
+
+    centroids = shapely.centroid(geometries)
+    bounds = shapely.bounds(geometries)
+    projected_centroids = shapely.centroid(projected)
+
+    agebs_hex['centroid_lat'] = shapely.get_y(centroids)
+    agebs_hex['centroid_lng'] = shapely.get_x(centroids)
+    agebs_hex['bbox_minx'] = bounds[:, 0]
+    agebs_hex['bbox_miny'] = bounds[:, 1]
+    agebs_hex['bbox_maxx'] = bounds[:, 2]
+    agebs_hex['bbox_maxy'] = bounds[:, 3]
+    agebs_hex['x_6372'] = shapely.get_x(projected_centroids)
+    agebs_hex['y_6372'] = shapely.get_y(projected_centroids)
+    agebs_hex['area_m2'] = shapely.area(projected)
+
+    # Keep geometry as the last column
+    columns = [col for col in agebs_hex.columns if col != agebs_hex.geometry.name]
+    return agebs_hex[columns + [agebs_hex.geometry.name]]
+
+def project_points(lat, lng):
+    """
+    Project WGS84 coordinates to GRID_PROJECTED_CRS
+
+    Parameters:
+    - lat, lng: Latitudes and longitudes (scalars or arrays)
+
+    Returns:
+    - tuple: (x, y) in meters
+    """
+
+    from pyproj import Transformer
+
+    transformer = Transformer.from_crs('EPSG:4326', GRID_PROJECTED_CRS, always_xy=True)
+    return transformer.transform(lng, lat)
+
+def grid_coordinates(agebs_hex):
+    """
+    Hexagon centroid coordinates as a separate contiguous array
+
+    Uses the 'centroid_lng'/'centroid_lat' columns when the grid has them.
+
+    Parameters:
+    - agebs_hex: Grid GeoDataFrame
+
+    Returns:
+    - numpy.ndarray: float64 array of shape (n, 2) with (lng, lat) per row
+    """
+
+    def build(gdf):
+        if 'centroid_lng' in gdf.columns and 'centroid_lat' in gdf.columns:
+            return np.ascontiguousarray(gdf[['centroid_lng', 'centroid_lat']].to_numpy(dtype=np.float64))
+        centroids = shapely.centroid(np.asarray(gdf.geometry.values))
+        return np.column_stack([shapely.get_x(centroids), shapely.get_y(centroids)])
+
+    return get_grid_derived(agebs_hex, 'coordinates', build)
+
+def memory_report(agebs_hex, compact=None, show=True):
+    """
+    Report memory used per column by a grid before and after compaction
+
+    Geometry bytes only count the column's array of geometry references,
+    not the geometries themselves.
+
+    Parameters:
+    - agebs_hex: Grid GeoDataFrame
+    - compact: Compact version of the grid (default: compact_grid(agebs_hex))
+    - show: Print the report (default=True)
+
+    Returns:
+    - pandas.DataFrame: Bytes per column with 'original', 'compact' and 'saved_pct'
+    """
+
+    if compact is None:
+        compact = compact_grid(agebs_hex)
+
+    report = pd.DataFrame({
+        'original': agebs_hex.memory_usage(deep=True, index=True),
+        'compact': compact.memory_usage(deep=True, index=True)
+    }).fillna(0).astype(np.int64)
+    report.loc['TOTAL'] = report.sum()
+    report['saved_pct'] = (100 * (1 - report['compact'] / report['original'].where(report['original'] > 0))).round(1)
+
+    if show:
+        print(report.to_string())
+
+    return report
+
+@dataclass(frozen=True)
+class GridHandle:
+    """
+    Identity of a loaded grid
+
+    Attributes:
+    - content_hash: Hash of the grid's columns and geometries (stable across processes)
+    - source: File the grid was read from, None for simulated grids
+    - mtime: Modification time of the source file, None for simulated grids
+    - simulated: True if the grid was generated instead of read
+    - rows: Number of hexagons
+    """
+
+    content_hash: str
+    source: Optional[str]
+    mtime: Optional[float]
+    simulated: bool
+    rows: int
+
+    @property
+    def short_hash(self):
+        return self.content_hash[:8]
+
+def grid_content_hash(agebs_hex):
+    """
+    Stable hash of a grid's contents
+
+    Covers column names, dtypes, values and geometries (as WKB), so the same
+    data gives the same hash in every process.
+
+    Parameters:
+    - agebs_hex: Grid GeoDataFrame
+
+    Returns:
+    - str: Hex digest
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+    geometry_name = agebs_hex.geometry.name
+    attributes = agebs_hex.drop(columns=[geometry_name])
+
+    digest.update(json.dumps([(col, str(dtype)) for col, dtype in attributes.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(attributes, index=True).to_numpy().tobytes())
+    for wkb in shapely.to_wkb(np.asarray(agebs_hex.geometry.values)):
+        digest.update(wkb if wkb is not None else b'')
+
+    return digest.hexdigest()
+
+def make_grid_handle(agebs_hex, source=None):
+    """
+    Build the handle of a loaded grid
+
+    Parameters:
+    - agebs_hex: Grid GeoDataFrame
+    - source: File the grid was read from (None for simulated grids)
+
+    Returns:
+    - GridHandle
+    """
+
+    mtime = Path(source).stat().st_mtime if source is not None and Path(source).exists() else None
+    return GridHandle(
+        content_hash=grid_content_hash(agebs_hex),
+        source=str(source) if source is not None else None,
+        mtime=mtime,
+        simulated=source is None,
+        rows=len(agebs_hex)
+    )
+
+def register_grid_handle(agebs_hex, handle):
+    """Attach a handle to a grid GeoDataFrame (see get_grid_handle)"""
+    return get_grid_derived(agebs_hex, 'grid_handle', lambda gdf: handle)
+
+def get_grid_handle(agebs_hex):
+    """
+    Get the handle of a grid
+
+    Grids returned by config.load_global_data carry the handle registered
+    by the loader; for other GeoDataFrames (e.g. subsets) a handle without
+    source is computed once.
+
+    Parameters:
+    - agebs_hex: Grid GeoDataFrame
+
+    Returns:
+    - GridHandle
+    """
+
+    return get_grid_derived(agebs_hex, 'grid_handle', make_grid_handle)
+
+def cache_key(agebs_hex, *parts):
+    """
+    Key for a memoized computation on a grid
+
+    Parameters:
+    - agebs_hex: Grid GeoDataFrame (or its GridHandle)
+    - parts: Hashable parameters of the computation
+
+    Returns:
+    - tuple: (grid content hash, *parts)
+    """
+
+    handle = agebs_hex if isinstance(agebs_hex, GridHandle) else get_grid_handle(agebs_hex)
+    return (handle.content_hash,) + tuple(parts)
+
+def parquet_path_for(shp_path):
+    """Default GeoParquet path for a grid shapefile (same name, .parquet)"""
+    return Path(shp_path).with_suffix('.parquet')
+
+def is_parquet_fresh(parquet_path, shp_path=None):
+    """
+    Check whether a converted grid can be used instead of the shapefile
+
+    Parameters:
+    - parquet_path: Path of the GeoParquet grid
+    - shp_path: Path of the source shapefile (optional)
+
+    Returns:
+    - bool: True if the GeoParquet exists and is newer than the shapefile
+    """
+
+    parquet_path = Path(parquet_path)
+    if not parquet_path.exists():
+        return False
+
+    if shp_path is None or not Path(shp_path).exists():
+        return True
+
+    return parquet_path.stat().st_mtime >= Path(shp_path).stat().st_mtime
+
+def read_grid_shapefile(shp_path, columns=None):
+    """
+    Read and prepare the grid from its shapefile
+
+    Parameters:
+    - shp_path: Path of the grid shapefile
+    - columns: Prepared columns to keep (default: all), geometry is always kept
+
+    Returns:
+    - GeoDataFrame: Prepared grid
+    """
+
+    agebs_hex = prepare_grid(gpd.read_file(shp_path))
+    return _project(agebs_hex, columns)
+
+def read_grid_parquet(parquet_path, columns=None):
+    """
+    Read a prepared grid from GeoParquet, loading only the requested columns
+
+    Parameters:
+    - parquet_path: Path of the GeoParquet grid
+    - columns: Prepared columns to read (default: all), geometry is always read
+
+    Returns:
+    - GeoDataFrame: Prepared grid
+    """
+
+    if columns is None:
+        return gpd.read_parquet(parquet_path)
+
+    import pyarrow.parquet as pq
+
+    available = set(pq.read_schema(parquet_path).names)
+    wanted = [col for col in columns if col in available and col != 'geometry']
+    return gpd.read_parquet(parquet_path, columns=wanted + ['geometry'])
+
+def convert_grid(shp_path, parquet_path=None):
+    """
+    Convert the grid shapefile into a prepared GeoParquet file
+
+    Parameters:
+    - shp_path: Path of the grid shapefile
+    - parquet_path: Output path (default: shapefile path with .parquet suffix)
+
+    Returns:
+    - pathlib.Path: Path of the written GeoParquet file
+    """
+
+    parquet_path = Path(parquet_path) if parquet_path else parquet_path_for(shp_path)
+    parquet_path.parent.mkdir(parents=True, exist_ok=True)
+
+    return write_grid_parquet(read_grid_shapefile(shp_path), parquet_path)
+
+def write_grid_parquet(agebs_hex, parquet_path):
+    """
+    Write a prepared grid to GeoParquet
+
+    Parameters:
+    - agebs_hex: Prepared grid GeoDataFrame
+    - parquet_path: Output path
+
+    Returns:
+    - pathlib.Path: Path of the written GeoParquet file
+    """
+
+    parquet_path = Path(parquet_path)
+    parquet_path.parent.mkdir(parents=True, exist_ok=True)
+    agebs_hex.to_parquet(parquet_path, index=False, compression='zstd')
+    return parquet_path
+
+def _project(agebs_hex, columns):
+    if columns is None:
+        return agebs_hex
+    keep = [col for col in columns if col in agebs_hex.columns and col != 'geometry']
+    return agebs_hex[keep + ['geometry']]
+
+_BENCHMARK_SNIPPET = """
+import sys, time, json, warnings
+warnings.simplefilter('ignore')
+sys.path.insert(0, {utils_dir!r})
+start = time.perf_counter()
+import grid_store
+loaded = time.perf_counter()
+gdf = getattr(grid_store, {reader!r})({path!r})
+end = time.perf_counter()
+print(json.dumps({{'import_s': loaded - start, 'read_s': end - loaded, 'rows': len(gdf)}}))
+"""
+
+def benchmark_grid_load(shp_path, parquet_path, repeats=3):
+    """
+    Compare cold-load times of the shapefile and GeoParquet grids
+
+    Each load runs in a fresh Python process so no in-process cache helps.
+
+    Parameters:
+    - shp_path: Path of the grid shapefile
+    - parquet_path: Path of the GeoParquet grid
+    - repeats: Number of loads per format (default=3)
+
+    Returns:
+    - dict: format -> dict with 'rows', 'best_s' and 'mean_s' read times
+    """
+
+    utils_dir = str(Path(__file__).parent)
+    results = {}
+
+    for name, reader, path in (('shapefile', 'read_grid_shapefile', shp_path),
+                               ('geoparquet', 'read_grid_parquet', parquet_path)):
+        if not Path(path).exists():
+            warnings.warn(f"Skipping {name}: '{path}' not found")
+            continue
+
+        timings = []
+        rows = 0
+        for _ in range(repeats):
+            snippet = _BENCHMARK_SNIPPET.format(utils_dir=utils_dir, reader=reader, path=str(path))
+            output = subprocess.run([sys.executable, '-c', snippet], capture_output=True,
+                                    text=True, check=True).stdout
+            run = json.loads(output.strip().splitlines()[-1])
+            timings.append(run['read_s'])
+            rows = run['rows']
+
+        results[name] = {'rows': rows, 'best_s': min(timings), 'mean_s': sum(timings) / len(timings)}
+
+    return results
+
+def main(argv=None):
+    """Command line entry point"""
+
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from config import APP_CONFIG
+
+    default_src = APP_CONFIG['oaxaca_grid_filepath']
+    default_dst = APP_CONFIG['oaxaca_grid_parquet_filepath']
+
+    parser = argparse.ArgumentParser(description="Grid storage tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    convert_parser = subparsers.add_parser('convert', help="Convert the grid shapefile to GeoParquet")
+    convert_parser.add_argument('--src', default=default_src, help="Grid shapefile")
+    convert_parser.add_argument('--dst', default=default_dst, help="Output GeoParquet file")
+
+    bench_parser = subparsers.add_parser('benchmark', help="Compare cold-load times")
+    bench_parser.add_argument('--src', default=default_src, help="Grid shapefile")
+    bench_parser.add_argument('--dst', default=default_dst, help="GeoParquet file")
+    bench_parser.add_argument('--repeats', type=int, default=3, help="Loads per format")
+
+    subparsers.add_parser('memory', help="Report grid memory per column before and after compaction")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        start = time.perf_counter()
+        output = convert_grid(args.src, args.dst)
+        print(f"Converted '{args.src}' -> '{output}' in {time.perf_counter() - start:.2f} s")
+
+    elif args.command == 'benchmark':
+        results = benchmark_grid_load(args.src, args.dst, repeats=args.repeats)
+        for name, res in results.items():
+            print(f"{name:>10}: {res['rows']} rows, best {res['best_s'] * 1000:.1f} ms, "
+                  f"mean {res['mean_s'] * 1000:.1f} ms")
+        if 'shapefile' in results and 'geoparquet' in results:
+            speedup = results['shapefile']['best_s'] / max(results['geoparquet']['best_s'], 1e-9)
+            print(f"GeoParquet speedup: {speedup:.1f}x")
+
+    elif args.command == 'memory':
+        from config import load_global_data
+        memory_report(load_global_data(compact=False))
+
+if __name__ == "__main__":
+    main()
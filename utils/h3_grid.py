@@ -0,0 +1,198 @@
+"""
+H3 multi-resolution grid backend
+
+Apportions the hexagonal grid onto H3 cells once, then rolls the counts up
+to coarser resolutions with integer H3 index arithmetic. Every resolution
+is precomputed, so switching resolution at runtime needs no polygon work.
+
+The h3 package is optional (pip install -r requirements_h3.txt); without
+it the map only offers the 500 m hexagon grid.
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from helpers import get_grid_derived
+
+try:
+    import h3
+except ImportError:  # Optional dependency
+    h3 = None
+
+# Resolutions kept in the pyramid, finest last
+H3_RESOLUTIONS = (6, 7, 8, 9)
+
+# Columns summed when rolling up; log-scaled columns are summed as counts
+COUNT_COLUMNS = ['poblacion_total', 'joven_digital', 'mama_emprendedora',
+                 'mayorista_experimentado', 'clientes_totales']
+LOG_COLUMNS = ['joven_digital', 'mama_emprendedora',
+               'mayorista_experimentado', 'clientes_totales']
+
+# H3 index bit layout: 4 resolution bits at 52..55, 15 digits of 3 bits below 45
+_H3_RES_OFFSET = np.uint64(52)
+_H3_RES_MASK = np.uint64(0xF) << _H3_RES_OFFSET
+_H3_DIGIT_BITS = 3
+_H3_MAX_RES = 15
+
+def h3_available():
+    """Return True if the optional h3 package is installed"""
+    return h3 is not None
+
+def cell_to_parent_array(cells, res):
+    """
+    Get the parent of many H3 cells at a coarser resolution
+
+    Parameters:
+    - cells: Array of H3 cell indexes as uint64
+    - res: Parent resolution (must not be finer than the cells)
+
+    Returns:
+    - numpy.ndarray: Parent cell indexes as uint64
+    """
+
+    cells = np.asarray(cells, dtype=np.uint64)
+    # Digits finer than the parent resolution are set to 7 (unused)
+    unused_digits = np.uint64((1 << ((_H3_MAX_RES - res) * _H3_DIGIT_BITS)) - 1)
+    return (cells & ~_H3_RES_MASK) | (np.uint64(res) << _H3_RES_OFFSET) | unused_digits
+
+def resolution_for_zoom(zoom, resolutions=H3_RESOLUTIONS):
+    """
+    Pick the H3 resolution to display at a web map zoom level
+
+    Parameters:
+    - zoom: Map zoom level
+    - resolutions: Available resolutions (default=H3_RESOLUTIONS)
+
+    Returns:
+    - int: H3 resolution
+    """
+
+    # Roughly one resolution step per zoom level around city scale
+    target = int(zoom) - 5 if zoom < 13 else (8 if zoom < 15 else 9)
+    return int(min(resolutions, key=lambda r: abs(r - target)))
+
+def _integer_counts(agebs_hex):
+    """Integer counts per hexagon for every rolled-up column"""
+    counts = {}
+    for col in COUNT_COLUMNS:
+        if col not in agebs_hex.columns:
+            continue
+        values = agebs_hex[col].fillna(0).to_numpy(dtype=float)
+        if col in LOG_COLUMNS:
+            values = np.expm1(values)
+        counts[col] = np.rint(np.clip(values, 0, None)).astype(np.int64)
+    return counts
+
+def _apportion(totals, group_sizes):
+    """Split integer totals evenly over groups, distributing remainders"""
+    repeated = np.repeat(totals, group_sizes)
+    sizes = np.repeat(group_sizes, group_sizes)
+    offsets = np.repeat(np.cumsum(group_sizes) - group_sizes, group_sizes)
+    rank = np.arange(len(repeated)) - offsets
+    return repeated // sizes + (rank < repeated % sizes)
+
+def _cells_to_polygons(cells):
+    """Build boundary polygons for H3 cells"""
+    boundaries = [h3.cell_to_boundary(h3.int_to_str(int(c))) for c in cells]
+    n_vertices = max((len(b) for b in boundaries), default=0)
+    if n_vertices == 0:
+        return np.array([], dtype=object)
+    # Pad pentagons by repeating their last vertex so all rings share a shape
+    coords = np.array([list(b) + [b[-1]] * (n_vertices - len(b)) for b in boundaries])
+    return shapely.polygons(coords[:, :, ::-1])
+
+def build_h3_pyramid(agebs_hex, resolutions=H3_RESOLUTIONS):
+    """
+    Aggregate a grid GeoDataFrame onto H3 cells at several resolutions
+
+    Each grid hexagon is apportioned over the finest-resolution H3 cells
+    whose centers fall inside it (or the cell containing its centroid),
+    splitting integer counts exactly. Coarser resolutions are exact sums of
+    their children, computed from the cell indexes alone.
+
+    Parameters:
+    - agebs_hex: Grid GeoDataFrame in EPSG:4326
+    - resolutions: H3 resolutions to build (default=H3_RESOLUTIONS)
+
+    Returns:
+    - dict: resolution -> GeoDataFrame with 'h3_cell', 'id_hex', the
+      COUNT_COLUMNS available in the grid (log columns re-logged with log1p)
+      and 'geometry'
+    """
+
+    if h3 is None:
+        raise ImportError("The h3 package is required for the H3 grid backend")
+
+    resolutions = sorted(resolutions)
+    base_res = resolutions[-1]
+    counts = _integer_counts(agebs_hex)
+
+    # Map every hexagon to its base-resolution cells (done once)
+    hex_cells = []
+    for geom in agebs_hex.geometry.values:
+        if geom is None or geom.is_empty:
+            hex_cells.append([])
+            continue
+        cells = h3.geo_to_cells(geom, base_res)
+        if len(cells) == 0:
+            point = geom.centroid
+            cells = [h3.latlng_to_cell(point.y, point.x, base_res)]
+        hex_cells.append(sorted(h3.str_to_int(c) for c in cells))
+
+    group_sizes = np.array([len(c) for c in hex_cells], dtype=np.int64)
+    base_cells = np.fromiter((c for cells in hex_cells for c in cells), dtype=np.uint64,
+                             count=int(group_sizes.sum()))
+
+    base = pd.DataFrame({'h3_cell': base_cells})
+    for col, values in counts.items():
+        base[col] = _apportion(values, group_sizes)
+
+    base = base.groupby('h3_cell', sort=True).sum()
+
+    pyramid = {}
+    for res in resolutions:
+        if res == base_res:
+            level = base
+        else:
+            parents = cell_to_parent_array(base.index.to_numpy(dtype=np.uint64), res)
+            level = base.groupby(parents, sort=True).sum()
+            level.index.name = 'h3_cell'
+
+        level = level.reset_index()
+        layer = pd.DataFrame({
+            'h3_cell': level['h3_cell'].to_numpy(dtype=np.uint64),
+            'id_hex': [h3.int_to_str(int(c)) for c in level['h3_cell']]
+        })
+        for col in counts:
+            values = level[col].to_numpy()
+            layer[col] = np.log1p(values) if col in LOG_COLUMNS else values
+
+        pyramid[res] = gpd.GeoDataFrame(
+            layer,
+            geometry=_cells_to_polygons(layer['h3_cell'].to_numpy()),
+            crs='EPSG:4326'
+        )
+
+    return pyramid
+
+def get_h3_pyramid(agebs_hex):
+    """
+    Get the process-wide H3 pyramid for a grid, building it on first use
+
+    Parameters:
+    - agebs_hex: Grid GeoDataFrame
+
+    Returns:
+    - dict: resolution -> GeoDataFrame (see build_h3_pyramid), or None if
+      the h3 package is not installed
+    """
+
+    if h3 is None:
+        warnings.warn("h3 package not installed. H3 grid backend unavailable.")
+        return None
+
+    return get_grid_derived(agebs_hex, 'h3_pyramid', build_h3_pyramid)
@@ -5,9 +5,183 @@ Helper functions for geographic operations and data processing
 import pandas as pd
 import numpy as np
 import geopandas as gpd
+import shapely
 from shapely.geometry import Point
+import threading
+import weakref
 import warnings
 
+# Objects derived from a grid GeoDataFrame (spatial indexes, lookup tables),
+# keyed by the id of the frame they were built from
+_grid_derived = {}
+_grid_derived_lock = threading.RLock()
+
+def get_grid_derived(sf_data, name, builder):
+    """
+    Get an object derived from a grid GeoDataFrame, building it only once
+
+    The object is shared by every caller in the process and is discarded
+    when the GeoDataFrame it was built from is garbage collected.
+
+    Parameters:
+    - sf_data: GeoDataFrame the object is derived from
+    - name: Name identifying the derived object (e.g. 'hex_index')
+    - builder: Callable receiving sf_data and returning the derived object
+
+    Returns:
+    - The derived object
+    """
+
+    frame_id = id(sf_data)
+
+    with _grid_derived_lock:
+        entry = _grid_derived.get(frame_id)
+        if entry is None:
+            entry = {}
+            _grid_derived[frame_id] = entry
+            weakref.finalize(sf_data, _grid_derived.pop, frame_id, None)
+
+        if name not in entry:
+            entry[name] = builder(sf_data)
+
+        return entry[name]
+
+def _normalize_name(name):
+    """Normalize an area name for case-insensitive matching"""
+    if name is None or (isinstance(name, float) and np.isnan(name)):
+        return None
+    name = str(name).strip().lower()
+    return name if len(name) > 0 else None
+
+def _normalized_codes(values):
+    """Factorize a name column into codes of its normalized unique values"""
+    codes, uniques = pd.factorize(values)
+    normalized = pd.Index([_normalize_name(u) for u in uniques], dtype=object)
+    norm_uniques, norm_of_unique = np.unique(normalized.fillna(''), return_inverse=True)
+    norm_codes = np.where(codes >= 0, norm_of_unique[codes], -1)
+    norm_uniques = [u if u != '' else None for u in norm_uniques]
+    return norm_codes, norm_uniques
+
+def build_area_lookup(sf_data):
+    """
+    Precompute name lookups, centroids and bounds for every area of a grid
+
+    Centroids are the area-weighted mean of hexagon centroids, which equals
+    the centroid of the union for non-overlapping hexagons.
+
+    Parameters:
+    - sf_data: GeoDataFrame with 'nombre_municipio' and 'nombre_localidad' columns
+
+    Returns:
+    - dict with keys:
+      - 'municipios': Sorted municipality names for dropdowns
+      - 'localidades': Sorted locality names for dropdowns
+      - 'localidades_por_municipio': Municipality name -> sorted locality names
+      - 'rows': (normalized municipio, normalized localidad) -> row positions
+      - 'areas': (normalized municipio, normalized localidad) -> dict with
+        'lat', 'lng' and 'bounds' (minx, miny, maxx, maxy)
+      Either element of a key may be None to match any value.
+    """
+
+    municipios_raw = sf_data['nombre_municipio']
+    localidades_raw = sf_data['nombre_localidad']
+
+    # Pre-sorted dropdown lists
+    municipios = sorted(municipios_raw.dropna().unique())
+    localidades = sorted(localidades_raw.dropna().unique())
+    pairs = pd.DataFrame({'mun': municipios_raw, 'loc': localidades_raw}).dropna().drop_duplicates()
+    localidades_por_municipio = {
+        mun: sorted(group['loc'].unique()) for mun, group in pairs.groupby('mun', sort=False, observed=True)
+    }
+
+    # Per-hexagon geometry summaries, taken from the load-time derived columns when present
+    geom_array = np.asarray(sf_data.geometry.values)
+    valid = ~(shapely.is_missing(geom_array) | shapely.is_empty(geom_array))
+    derived_cols = ['centroid_lng', 'centroid_lat', 'bbox_minx', 'bbox_miny', 'bbox_maxx', 'bbox_maxy', 'area_m2']
+    if all(col in sf_data.columns for col in derived_cols):
+        centroid_xy = sf_data[['centroid_lng', 'centroid_lat']].to_numpy(dtype=float)
+        bounds = sf_data[['bbox_minx', 'bbox_miny', 'bbox_maxx', 'bbox_maxy']].to_numpy(dtype=float)
+        areas = np.where(valid, sf_data['area_m2'].to_numpy(dtype=float), 0.0)
+    else:
+        areas = np.where(valid, shapely.area(geom_array), 0.0)
+        centroid_xy = np.full((len(sf_data), 2), np.nan)
+        if valid.any():
+            centroid_xy[valid] = shapely.get_coordinates(shapely.centroid(geom_array[valid]))
+        bounds = shapely.bounds(geom_array)
+
+    mun_codes, mun_names = _normalized_codes(municipios_raw)
+    loc_codes, loc_names = _normalized_codes(localidades_raw)
+
+    summary = pd.DataFrame({
+        'mun': mun_codes,
+        'loc': loc_codes,
+        'area': areas,
+        'wx': centroid_xy[:, 0] * areas,
+        'wy': centroid_xy[:, 1] * areas,
+        'cx': centroid_xy[:, 0],
+        'cy': centroid_xy[:, 1],
+        'minx': bounds[:, 0],
+        'miny': bounds[:, 1],
+        'maxx': bounds[:, 2],
+        'maxy': bounds[:, 3]
+    })[valid]
+
+    rows = {}
+    area_index = {}
+
+    for key_cols in (['mun'], ['loc'], ['mun', 'loc']):
+        subset = summary[(summary[key_cols] >= 0).all(axis=1)]
+        grouped = subset.groupby(key_cols, sort=False)
+        agg = grouped.agg(
+            area=('area', 'sum'), wx=('wx', 'sum'), wy=('wy', 'sum'),
+            cx=('cx', 'mean'), cy=('cy', 'mean'),
+            minx=('minx', 'min'), miny=('miny', 'min'),
+            maxx=('maxx', 'max'), maxy=('maxy', 'max')
+        )
+        # Group positions are relative to the subset; its index holds the grid positions
+        subset_pos = subset.index.to_numpy()
+        positions = grouped.indices
+
+        for group_key, agg_row in zip(agg.index, agg.itertuples(index=False)):
+            codes = group_key if isinstance(group_key, tuple) else (group_key,)
+            code_map = dict(zip(key_cols, codes))
+            key = (
+                mun_names[code_map['mun']] if 'mun' in code_map else None,
+                loc_names[code_map['loc']] if 'loc' in code_map else None
+            )
+            if agg_row.area > 0:
+                lng, lat = agg_row.wx / agg_row.area, agg_row.wy / agg_row.area
+            else:
+                lng, lat = agg_row.cx, agg_row.cy
+
+            rows[key] = np.asarray(subset_pos[positions[group_key]], dtype=np.intp)
+            area_index[key] = {
+                'lat': float(lat),
+                'lng': float(lng),
+                'bounds': (float(agg_row.minx), float(agg_row.miny), float(agg_row.maxx), float(agg_row.maxy))
+            }
+
+    return {
+        'municipios': municipios,
+        'localidades': localidades,
+        'localidades_por_municipio': localidades_por_municipio,
+        'rows': rows,
+        'areas': area_index
+    }
+
+def get_area_lookup(sf_data):
+    """
+    Get the precomputed area lookup for a grid, building it on first use
+
+    Parameters:
+    - sf_data: GeoDataFrame with 'nombre_municipio' and 'nombre_localidad' columns
+
+    Returns:
+    - dict: See build_area_lookup
+    """
+
+    return get_grid_derived(sf_data, 'area_lookup', build_area_lookup)
+
 def get_centroid_for_area(municipio_name=None, localidad_name=None, sf_data=None):
     """
     Get centroid coordinates for a specified municipality and/or locality
@@ -18,7 +192,7 @@ def get_centroid_for_area(municipio_name=None, localidad_name=None, sf_data=None
     - sf_data: GeoDataFrame with geographic data
     
     Returns:
-    - dict: Dictionary with 'lat' and 'lng' keys, or None if not found
+    - dict: Dictionary with 'lat', 'lng' and 'bounds' keys, or None if not found
     """
     
     if sf_data is None or not isinstance(sf_data, gpd.GeoDataFrame):
@@ -29,60 +203,22 @@ def get_centroid_for_area(municipio_name=None, localidad_name=None, sf_data=None
         raise ValueError("sf_data must contain 'nombre_municipio' and 'nombre_localidad' columns")
     
     # Normalize inputs
-    mun_query = None
-    if municipio_name and len(str(municipio_name).strip()) > 0:
-        mun_query = str(municipio_name).strip().lower()
-    
-    loc_query = None
-    if localidad_name and len(str(localidad_name).strip()) > 0:
-        loc_query = str(localidad_name).strip().lower()
+    mun_query = _normalize_name(municipio_name)
+    loc_query = _normalize_name(localidad_name)
     
     if mun_query is None and loc_query is None:
         return None
     
-    # Filter data
-    filtered_data = sf_data.copy()
-    
-    if mun_query is not None:
-        # Case-insensitive matching for municipality
-        mask = filtered_data['nombre_municipio'].astype(str).str.strip().str.lower() == mun_query
-        filtered_data = filtered_data[mask]
-    
-    if len(filtered_data) == 0 and mun_query is not None:
-        return None
-    
-    if loc_query is not None:
-        # Case-insensitive matching for locality
-        mask = filtered_data['nombre_localidad'].astype(str).str.strip().str.lower() == loc_query
-        filtered_data = filtered_data[mask]
-    
-    if len(filtered_data) == 0:
-        return None
-    
     try:
-        # Combine geometries if multiple rows matched
-        if len(filtered_data) == 1:
-            combined_geometry = filtered_data.geometry.iloc[0]
-        else:
-            # Union all geometries
-            combined_geometry = filtered_data.geometry.unary_union
-        
-        # Calculate centroid
-        centroid = combined_geometry.centroid
-        
-        # Extract coordinates
-        if hasattr(centroid, 'x') and hasattr(centroid, 'y'):
-            return {
-                'lat': centroid.y,
-                'lng': centroid.x
-            }
-        else:
-            warnings.warn(f"Could not extract coordinates from centroid for area")
-            return None
-    
+        area = get_area_lookup(sf_data)['areas'].get((mun_query, loc_query))
     except Exception as e:
         warnings.warn(f"Error calculating centroid for area: {e}")
         return None
+    
+    if area is None:
+        return None
+    
+    return dict(area)
 
 def calculate_distance_km(lat1, lng1, lat2, lng2):
     """
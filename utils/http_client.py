@@ -0,0 +1,200 @@
+"""
+Shared HTTP client for the DENUE and Google Places APIs
+
+One requests.Session with keep-alive connection pools is shared by every
+thread, so repeated calls reuse TCP/TLS connections. Requests get per-host
+timeouts and bounded retries with jittered exponential backoff on 429/5xx
+responses and connection errors. Read timeouts are not retried by default,
+so a slow API cannot hold an interactive page for several read timeouts.
+Latencies are recorded per endpoint in fixed-bucket histograms (see
+latency_histograms and format_latency_histograms, printed by
+'python utils/mock_server.py bench').
+"""
+
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# (connect, read) timeouts in seconds per host
+HOST_TIMEOUTS = {
+    'www.inegi.org.mx': (5, 20),
+    'maps.googleapis.com': (5, 15)
+}
+DEFAULT_TIMEOUT = (5, 30)
+
+# Connection pools kept per host and connections per pool
+POOL_CONNECTIONS = 8
+POOL_MAXSIZE = 16
+
+# Retry policy
+RETRY_STATUS = {429, 500, 502, 503, 504}
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+# Upper bounds of the latency histogram buckets in milliseconds
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+_session = None
+_session_lock = threading.Lock()
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+def get_session():
+    """Process-wide requests.Session with pooled keep-alive connections"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+def host_timeout(url):
+    """(connect, read) timeout for a URL's host"""
+    return HOST_TIMEOUTS.get(urlsplit(url).hostname, DEFAULT_TIMEOUT)
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    Seconds to wait before a retry
+
+    Parameters:
+    - attempt: Number of the retry (1 for the first)
+    - retry_after: Retry-After header value, honored when numeric
+
+    Returns:
+    - float: Full-jitter exponential delay, at most BACKOFF_MAX
+    """
+
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def _record(endpoint, elapsed_ms, error=False, retry=False):
+    with _histograms_lock:
+        hist = _histograms.get(endpoint)
+        if hist is None:
+            hist = {'buckets': [0] * len(LATENCY_BUCKETS_MS), 'count': 0, 'errors': 0,
+                    'retries': 0, 'total_ms': 0.0}
+            _histograms[endpoint] = hist
+        if retry:
+            hist['retries'] += 1
+        if error:
+            hist['errors'] += 1
+        if elapsed_ms is not None:
+            bucket = next(i for i, bound in enumerate(LATENCY_BUCKETS_MS) if elapsed_ms <= bound)
+            hist['buckets'][bucket] += 1
+            hist['count'] += 1
+            hist['total_ms'] += elapsed_ms
+
+def http_get(url, params=None, timeout=None, endpoint=None, max_retries=MAX_RETRIES, retry_timeouts=False):
+    """
+    GET a URL through the shared session, retrying transient failures
+
+    Parameters:
+    - url: Request URL
+    - params: Query parameters (default: none)
+    - timeout: Seconds or (connect, read) tuple (default: host_timeout(url))
+    - endpoint: Histogram label (default: the URL's host); use a fixed label
+      when the URL path carries parameters or credentials
+    - max_retries: Retries after the first attempt (default=MAX_RETRIES)
+    - retry_timeouts: Also retry read timeouts (default=False); connection
+      errors and connect timeouts are always retried
+
+    Returns:
+    - requests.Response: The first non-retryable response, or the last one
+      once retries are exhausted
+
+    Raises:
+    - requests.exceptions.RequestException: If the last attempt failed to
+      connect, or a read timed out (at once unless retry_timeouts)
+    """
+
+    if timeout is None:
+        timeout = host_timeout(url)
+    if endpoint is None:
+        endpoint = urlsplit(url).hostname
+
+    session = get_session()
+    for attempt in range(max_retries + 1):
+        start = time.perf_counter()
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            read_timeout = isinstance(e, requests.exceptions.ReadTimeout)
+            retry = attempt < max_retries and (retry_timeouts or not read_timeout)
+            _record(endpoint, None, error=True, retry=retry)
+            if not retry:
+                raise
+            time.sleep(backoff_delay(attempt + 1))
+            continue
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        retryable = response.status_code in RETRY_STATUS
+        _record(endpoint, elapsed_ms, error=retryable, retry=retryable and attempt < max_retries)
+        if not retryable or attempt == max_retries:
+            return response
+
+        retry_after = response.headers.get('Retry-After')
+        response.close()
+        time.sleep(backoff_delay(attempt + 1, retry_after))
+
+def latency_histograms():
+    """
+    Snapshot of the per-endpoint latency histograms
+
+    Returns:
+    - dict: endpoint -> {'buckets': [(upper bound ms, count), ...], 'count',
+      'errors', 'retries', 'mean_ms'}
+    """
+
+    with _histograms_lock:
+        return {
+            endpoint: {
+                'buckets': list(zip(LATENCY_BUCKETS_MS, hist['buckets'])),
+                'count': hist['count'],
+                'errors': hist['errors'],
+                'retries': hist['retries'],
+                'mean_ms': hist['total_ms'] / hist['count'] if hist['count'] > 0 else None
+            }
+            for endpoint, hist in _histograms.items()
+        }
+
+def format_latency_histograms(histograms=None):
+    """
+    Text report of the per-endpoint latency histograms
+
+    Parameters:
+    - histograms: Snapshot from latency_histograms (default: current one)
+
+    Returns:
+    - str: One block per endpoint with its counters and bucket counts
+    """
+
+    if histograms is None:
+        histograms = latency_histograms()
+
+    lines = []
+    for endpoint, hist in sorted(histograms.items()):
+        mean = f"{hist['mean_ms']:.1f} ms" if hist['mean_ms'] is not None else "-"
+        lines.append(f"{endpoint}: {hist['count']} responses, {hist['errors']} errors, "
+                     f"{hist['retries']} retries, mean {mean}")
+        for bound, count in hist['buckets']:
+            if count > 0:
+                label = f"<= {bound:g} ms" if bound != float('inf') else f"> {LATENCY_BUCKETS_MS[-2]:g} ms"
+                lines.append(f"  {label:>12} {count:>7}")
+    return '\n'.join(lines)
+
+def reset_latency_histograms():
+    """Clear the recorded latencies"""
+    with _histograms_lock:
+        _histograms.clear()
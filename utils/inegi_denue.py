@@ -2,11 +2,23 @@
 INEGI DENUE API interaction functions
 """
 
+import json
 import requests
 import pandas as pd
 import warnings
 from urllib.parse import quote
 
+from config import DENUE_API_URL
+from business_index import get_business_index, search_local
+from denue_cache import get_denue_cache, normalize_query
+from denue_store import get_denue_store
+from denue_schema import normalize_denue
+from http_client import http_get
+from singleflight import SingleFlight
+
+# Concurrent identical API queries share one cache lookup and request
+_denue_flights = SingleFlight()
+
 def esta_en_mexico(lat, lon):
     """
     Check if coordinates are within Mexico's approximate boundaries
@@ -31,34 +43,110 @@ def esta_en_mexico(lat, lon):
     
     return True
 
-def inegi_denue(latitud, longitud, token, meters=250, keyword="todos", timeout_sec=60):
+def _parse_response(response_text):
+    """Parse a DENUE response body into a normalized DataFrame (see denue_schema)"""
+    
+    if not response_text or len(response_text.strip()) == 0:
+        return pd.DataFrame()
+    
+    data = json.loads(response_text)
+    
+    if not data or len(data) == 0:
+        return pd.DataFrame()
+    
+    # Typed coordinates, categorical activity/size, unused text columns dropped
+    return normalize_denue(pd.DataFrame(data))
+
+def inegi_denue(latitud, longitud, token, meters=250, keyword="todos", timeout_sec=None, use_cache=True,
+                backend="auto", fuzzy=False):
     """
     Query INEGI DENUE API for nearby businesses
     
+    Successful responses are kept in the persistent DENUE cache
+    (see denue_cache), so repeating a search within the cache TTL does not
+    call the API. Cached queries use the normalized keyword and coordinates
+    rounded to denue_cache.DENUE_CACHE_PRECISION decimals.
+    
+    Every result is also added to the in-memory business index (see
+    business_index): a search inside an area already fetched with "todos"
+    or the same keyword is answered from it, with accent-insensitive keyword
+    matching (misspelled and partial words only with fuzzy=True), and only
+    searches outside that coverage reach the cache or the API.
+    
+    When a bulk DENUE file has been imported (see denue_store), searches are
+    answered locally without a token or network access.
+    
     Parameters:
     - latitud: Latitude of search center
     - longitud: Longitude of search center  
     - token: INEGI API token
     - meters: Search radius in meters (default=250)
     - keyword: Search keyword (default="todos")
-    - timeout_sec: Request timeout in seconds (default=60)
+    - timeout_sec: Request timeout in seconds (default: http_client.HOST_TIMEOUTS)
+    - use_cache: Read and write the persistent response cache and the
+      business index (default=True)
+    - backend: "auto" uses the local DENUE store when one has been imported
+      and the API otherwise, "api" always calls the API, "local" never does
+      (default="auto")
+    - fuzzy: Let searches answered from the business index also match
+      misspelled and partial words (default=False)
     
     Returns:
-    - pandas.DataFrame: Business data with standardized column names
+    - pandas.DataFrame: Businesses in the schema of denue_schema.normalize_denue
+      (float64 coordinates, categorical 'clase_actividad', 'scian' and 'estrato')
     """
     
+    # Check if coordinates are within Mexico
+    if not esta_en_mexico(latitud, longitud):
+        warnings.warn("Provided coordinates are outside Mexico. Query will not be performed.")
+        return pd.DataFrame()
+    
+    # Local bulk-import store
+    if backend != "api":
+        store = get_denue_store()
+        if store is not None:
+            return normalize_denue(store.search(latitud, longitud, meters, keyword))
+        if backend == "local":
+            warnings.warn("No local DENUE store has been imported. Query will not be performed.")
+            return pd.DataFrame()
+    
     # Validate token
     if not token or not isinstance(token, str) or len(token.strip()) == 0:
         warnings.warn("INEGI API token not provided or empty. Cannot perform query.")
         return pd.DataFrame()
     
-    # Check if coordinates are within Mexico
-    if not esta_en_mexico(latitud, longitud):
-        warnings.warn("Provided coordinates are outside Mexico. Query will not be performed.")
-        return pd.DataFrame()
+    if use_cache:
+        keyword, latitud, longitud, meters = normalize_query(keyword, latitud, longitud, meters)
+        
+        # Businesses already seen in a covering search
+        local = search_local(keyword, latitud, longitud, meters, fuzzy=fuzzy)
+        if local is not None:
+            return local
+    
+    key = (keyword, latitud, longitud, meters, token, use_cache)
+    df = _denue_flights.do(key, _query_api, latitud, longitud, token, meters, keyword, timeout_sec, use_cache)
+    
+    # Callers sharing a flight get their own frame
+    return df.copy()
+
+def _query_api(latitud, longitud, token, meters, keyword, timeout_sec, use_cache):
+    """Answer a DENUE query from the response cache or the API (see inegi_denue)"""
+    
+    cache = None
+    if use_cache:
+        try:
+            cache = get_denue_cache()
+            cached = cache.get(keyword, latitud, longitud, meters)
+            if cached is not None:
+                df = _parse_response(cached)
+                get_business_index().add(df, keyword, latitud, longitud, meters)
+                return df
+        except Exception as e:
+            warnings.warn(f"DENUE cache unavailable: {e}")
+            cache = None
     
     # Build API URL
-    base_url = "https://www.inegi.org.mx/app/api/denue/v1/consulta/Buscar/"
+    base_url = f"{DENUE_API_URL}/Buscar/"
     
     # URL encode the keyword to handle special characters
     keyword_encoded = quote(keyword)
@@ -66,8 +154,8 @@ def inegi_denue(latitud, longitud, token, meters=250, keyword="todos", timeout_s
     consulta_url = f"{base_url}{keyword_encoded}/{latitud},{longitud}/{meters}/{token}"
     
     try:
-        # Make request with timeout
-        response = requests.get(consulta_url, timeout=timeout_sec)
+        # Pooled request, retried on 429/5xx and connection errors
+        response = http_get(consulta_url, timeout=timeout_sec, endpoint='denue.buscar')
         
         # Check HTTP status code
         if response.status_code != 200:
@@ -80,29 +168,23 @@ def inegi_denue(latitud, longitud, token, meters=250, keyword="todos", timeout_s
         # Get response content
         response_text = response.text
         
-        if not response_text or len(response_text.strip()) == 0:
-            return pd.DataFrame()
-        
         # Parse JSON response
         try:
-            import json
-            data = json.loads(response_text)
-            
-            if not data or len(data) == 0:
-                return pd.DataFrame()
-            
-            # Convert to DataFrame
-            df = pd.DataFrame(data)
-            
-            # Standardize column names to lowercase
-            if len(df) > 0:
-                df.columns = df.columns.str.lower()
-            
-            return df
-            
+            df = _parse_response(response_text)
         except json.JSONDecodeError as e:
             warnings.warn(f"Could not parse JSON response from DENUE: {e}")
             return pd.DataFrame()
+        
+        # Only well-formed responses are cached and indexed
+        if cache is not None:
+            try:
+                cache.put(keyword, latitud, longitud, meters, response_text)
+            except Exception as e:
+                warnings.warn(f"Could not store DENUE response in cache: {e}")
+        if use_cache:
+            get_business_index().add(df, keyword, latitud, longitud, meters)
+        
+        return df
     
     except requests.exceptions.Timeout:
         warnings.warn("Request to DENUE API timed out")
@@ -114,4 +196,4 @@ def inegi_denue(latitud, longitud, token, meters=250, keyword="todos", timeout_s
     
     except Exception as e:
         warnings.warn(f"Unexpected error during DENUE query: {e}")
-        return pd.DataFrame()
\ No newline at end of file
+        return pd.DataFrame()
@@ -0,0 +1,389 @@
+"""
+Local stand-in for the DENUE and Google Places APIs
+
+Serves the DENUE "Buscar" endpoint and the Places Nearby Search and Text
+Search endpoints from deterministic data: the seeded synthetic business
+layer (synthetic_grid.synthetic_denue) or a recorded fixture file of DENUE
+records. Places results are the same businesses with ratings derived from
+their ids. Latency and error responses can be injected to exercise the
+client layer (retries, timeouts, caching, single-flight) and to benchmark
+it without keys or network access.
+
+Point the app at it with the DENUE_API_URL and GOOGLE_PLACES_API_URL
+environment variables (see config.py).
+
+Usage:
+    python utils/mock_server.py serve [--port 8765] [--seed S] [--fixtures JSON]
+                                      [--latency-ms MS] [--jitter-ms MS] [--error-rate P]
+    python utils/mock_server.py record --dst JSON
+    python utils/mock_server.py bench [--requests N] [--workers W] [--latency-ms MS] [--error-rate P]
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+import unicodedata
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+
+from helpers import calculate_distance_km
+from synthetic_grid import synthetic_denue
+
+MOCK_HOST = "127.0.0.1"
+MOCK_PORT = 8765
+
+# Path prefixes of the mocked APIs (DENUE_API_URL / GOOGLE_PLACES_API_URL = server URL + prefix)
+DENUE_PREFIX = "/denue"
+PLACES_PREFIX = "/place"
+
+# Largest radius accepted by the DENUE "Buscar" endpoint
+DENUE_MAX_METERS = 5000
+
+_BUSCAR_RE = re.compile(r'/Buscar/([^/]*)/([-0-9.]+),([-0-9.]+)/([0-9]+)/([^/]*)$')
+
+def _fold(text):
+    return unicodedata.normalize('NFKD', str(text).lower()).encode('ascii', 'ignore').decode('ascii')
+
+def place_rating(business_id):
+    """Deterministic Google rating (3.0 to 5.0) of a business"""
+    return 3.0 + (zlib.crc32(str(business_id).encode('utf-8')) % 21) / 10
+
+def load_fixtures(path):
+    """
+    Read recorded DENUE records
+
+    Parameters:
+    - path: JSON file with a list of DENUE "Buscar" records (see record_fixtures)
+
+    Returns:
+    - list of dicts
+    """
+
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def record_fixtures(dst, cache=None):
+    """
+    Write every business in the DENUE response cache as a fixture file
+
+    Parameters:
+    - dst: Output JSON file
+    - cache: DenueCache to read (default: denue_cache.get_denue_cache())
+
+    Returns:
+    - int: Number of unique businesses written
+    """
+
+    from denue_cache import get_denue_cache
+
+    cache = cache if cache is not None else get_denue_cache()
+    records = {}
+    for body in cache.bodies():
+        for record in json.loads(body) if body.strip() else []:
+            records.setdefault(str(record.get('Id', len(records))), record)
+
+    with open(dst, 'w', encoding='utf-8') as f:
+        json.dump(list(records.values()), f, ensure_ascii=False)
+    return len(records)
+
+class MockBackend:
+    """
+    Business data behind the mock server
+
+    Parameters:
+    - fixtures: DENUE records to serve; None serves the synthetic layer
+    - seed: Seed of the synthetic layer (default=42)
+    """
+
+    def __init__(self, fixtures=None, seed=42):
+        self.seed = seed
+        self.fixtures = fixtures
+        if fixtures is not None:
+            self._lat = np.array([float(r.get('Latitud', 'nan') or 'nan') for r in fixtures])
+            self._lng = np.array([float(r.get('Longitud', 'nan') or 'nan') for r in fixtures])
+            self._text = [_fold(f"{r.get('Nombre', '')} {r.get('Razon_social', '')} {r.get('Clase_actividad', '')}")
+                          for r in fixtures]
+
+    def search(self, lat, lng, meters, keyword="todos"):
+        """DENUE records within a circle matching every keyword word ("todos" for all)"""
+        if self.fixtures is None:
+            return synthetic_denue(lat, lng, meters, keyword, seed=self.seed)
+
+        words = [] if _fold(keyword).strip() == 'todos' else _fold(keyword).split()
+        inside = calculate_distance_km(lat, lng, self._lat, self._lng) * 1000 <= meters
+        return [record for record, keep, text in zip(self.fixtures, inside, self._text)
+                if keep and all(word in text for word in words)]
+
+    def places(self, lat, lng, meters, query=""):
+        """Places API results for the businesses within a circle matching a query"""
+        results = []
+        for record in self.search(lat, lng, meters, query or "todos"):
+            results.append({
+                'place_id': f"mock-{record.get('Id', '')}",
+                'name': record.get('Nombre', ''),
+                'rating': place_rating(record.get('Id', '')),
+                'user_ratings_total': zlib.crc32(str(record.get('Id', '')).encode('utf-8')) % 500,
+                'geometry': {'location': {'lat': float(record['Latitud']), 'lng': float(record['Longitud'])}},
+                'vicinity': record.get('Ubicacion', ''),
+                'formatted_address': record.get('Ubicacion', ''),
+                'types': ['establishment']
+            })
+        return results
+
+class MockServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server for the mocked APIs
+
+    Parameters:
+    - address: (host, port); port 0 picks a free port
+    - backend: MockBackend
+    - latency_ms, jitter_ms: Delay added to every response (default: none)
+    - error_rate: Fraction of requests answered with error_status (default=0)
+    - error_status: Status of injected errors (default=503)
+    - seed: Seed of the latency and error draws (default=42)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, backend, latency_ms=0, jitter_ms=0, error_rate=0.0, error_status=503, seed=42):
+        super().__init__(address, _MockHandler)
+        self.backend = backend
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    @property
+    def url(self):
+        """Base URL of the server"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def draw(self, endpoint):
+        """Count a request and draw its (delay in seconds, injected error)"""
+        with self._lock:
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            error = self._rng.random() < self.error_rate
+        return delay, error
+
+    def stats(self):
+        """Requests received per endpoint"""
+        with self._lock:
+            return dict(self.counts)
+
+    def handle_error(self, request, client_address):
+        # Clients that time out on injected latency close the connection mid-response
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        path = unquote(parts.path)
+        params = {name: values[0] for name, values in parse_qs(parts.query).items()}
+
+        if path == '/__stats':
+            return self._send(200, json.dumps(self.server.stats()))
+
+        buscar = _BUSCAR_RE.search(path) if path.startswith(DENUE_PREFIX) else None
+        if buscar is not None:
+            endpoint = 'denue.buscar'
+        elif path == f"{PLACES_PREFIX}/nearbysearch/json":
+            endpoint = 'places.nearbysearch'
+        elif path == f"{PLACES_PREFIX}/textsearch/json":
+            endpoint = 'places.textsearch'
+        else:
+            return self._send(404, json.dumps({'error': f"Unknown path {path}"}))
+
+        delay, error = self.server.draw(endpoint)
+        if delay > 0:
+            time.sleep(delay)
+        if error:
+            return self._send(self.server.error_status, json.dumps({'error': 'Injected error'}), {'Retry-After': '0'})
+
+        backend = self.server.backend
+        if endpoint == 'denue.buscar':
+            keyword, lat, lng, meters, token = buscar.groups()
+            if not token:
+                return self._send(401, json.dumps({'error': 'Token requerido'}))
+            records = backend.search(float(lat), float(lng), min(int(meters), DENUE_MAX_METERS), keyword)
+            return self._send(200, json.dumps(records, ensure_ascii=False))
+
+        if not params.get('key'):
+            return self._send(200, json.dumps({'status': 'REQUEST_DENIED', 'results': []}))
+        try:
+            lat, lng = (float(v) for v in params.get('location', '').split(','))
+        except ValueError:
+            return self._send(200, json.dumps({'status': 'INVALID_REQUEST', 'results': []}))
+
+        meters = min(float(params.get('radius', 1000)), 50_000)
+        if endpoint == 'places.nearbysearch':
+            query = params.get('name', params.get('keyword', ''))
+        else:
+            query = params.get('query', '')
+        results = backend.places(lat, lng, meters, query)[:20]
+        status = 'OK' if results else 'ZERO_RESULTS'
+        return self._send(200, json.dumps({'status': status, 'results': results}, ensure_ascii=False))
+
+def start_mock_server(host=MOCK_HOST, port=0, fixtures=None, seed=42, **options):
+    """
+    Start a mock server on a background thread
+
+    Parameters:
+    - host, port: Address to listen on; port 0 picks a free port (default)
+    - fixtures: DENUE records to serve instead of the synthetic layer
+    - seed: Seed of the synthetic layer and of the injected latency/errors
+    - options: latency_ms, jitter_ms, error_rate, error_status (see MockServer)
+
+    Returns:
+    - MockServer: Running server; use .url for the base URL and
+      .shutdown() to stop it
+    """
+
+    server = MockServer((host, port), MockBackend(fixtures, seed), seed=seed, **options)
+    threading.Thread(target=server.serve_forever, name="mock_server", daemon=True).start()
+    return server
+
+def run_benchmark(requests_count=200, workers=8, seed=42, **options):
+    """
+    Drive the shared HTTP client against a local mock server
+
+    Sends DENUE "Buscar" requests for random points around the default
+    location from a thread pool, through http_client.http_get (connection
+    pool, retries, backoff), and records their latencies.
+
+    Parameters:
+    - requests_count: Number of requests (default=200)
+    - workers: Concurrent threads (default=8)
+    - seed: Seed of the server and of the request points (default=42)
+    - options: latency_ms, jitter_ms, error_rate, error_status (see MockServer)
+
+    Returns:
+    - dict: 'seconds', 'requests', 'failed' (still failing after retries),
+      'server' (requests received per endpoint) and 'histograms'
+      (http_client.latency_histograms)
+    """
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    from http_client import http_get, latency_histograms, reset_latency_histograms
+
+    rng = random.Random(seed)
+    points = [(17.0594 + rng.uniform(-0.05, 0.05), -96.7216 + rng.uniform(-0.05, 0.05))
+              for _ in range(requests_count)]
+
+    server = start_mock_server(seed=seed, **options)
+    reset_latency_histograms()
+
+    def fetch(point):
+        url = f"{server.url}{DENUE_PREFIX}/Buscar/todos/{point[0]:.6f},{point[1]:.6f}/1000/bench"
+        try:
+            return http_get(url, endpoint='denue.buscar').ok
+        except Exception:
+            return False
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(fetch, points))
+        seconds = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return {
+        'seconds': seconds,
+        'requests': requests_count,
+        'failed': results.count(False),
+        'server': server.stats(),
+        'histograms': latency_histograms()
+    }
+
+def main(argv=None):
+    """Command line entry point"""
+
+    parser = argparse.ArgumentParser(description="Mock DENUE and Google Places APIs")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help="Run the mock server")
+    serve.add_argument('--host', default=MOCK_HOST)
+    serve.add_argument('--port', type=int, default=MOCK_PORT)
+    serve.add_argument('--seed', type=int, default=42, help="Seed of the synthetic businesses")
+    serve.add_argument('--fixtures', default=None, help="JSON file of recorded DENUE records")
+    serve.add_argument('--latency-ms', type=float, default=0, help="Delay added to every response")
+    serve.add_argument('--jitter-ms', type=float, default=0, help="Random +/- variation of the delay")
+    serve.add_argument('--error-rate', type=float, default=0, help="Fraction of requests that fail")
+    serve.add_argument('--error-status', type=int, default=503, help="Status of injected errors")
+
+    record = commands.add_parser('record', help="Write the cached DENUE businesses as fixtures")
+    record.add_argument('--dst', required=True, help="Output JSON file")
+
+    bench = commands.add_parser('bench', help="Benchmark the HTTP client against a local mock server")
+    bench.add_argument('--requests', type=int, default=200, help="Number of requests")
+    bench.add_argument('--workers', type=int, default=8, help="Concurrent threads")
+    bench.add_argument('--seed', type=int, default=42)
+    bench.add_argument('--latency-ms', type=float, default=50, help="Delay added to every response")
+    bench.add_argument('--jitter-ms', type=float, default=25, help="Random +/- variation of the delay")
+    bench.add_argument('--error-rate', type=float, default=0.05, help="Fraction of requests that fail")
+    bench.add_argument('--error-status', type=int, default=503, help="Status of injected errors")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        print(f"Wrote {record_fixtures(args.dst)} businesses to '{args.dst}'")
+        return
+
+    if args.command == 'bench':
+        from http_client import format_latency_histograms
+
+        result = run_benchmark(args.requests, args.workers, seed=args.seed, latency_ms=args.latency_ms,
+                               jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                               error_status=args.error_status)
+        print(f"{result['requests']} requests in {result['seconds']:.2f} s "
+              f"({result['requests'] / result['seconds']:.1f} req/s), {result['failed']} failed, "
+              f"{sum(result['server'].values())} reached the server")
+        print(format_latency_histograms(result['histograms']))
+        return
+
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else None
+    server = MockServer((args.host, args.port), MockBackend(fixtures, args.seed),
+                        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                        error_rate=args.error_rate, error_status=args.error_status, seed=args.seed)
+    print(f"Mock APIs at {server.url}:\n"
+          f"  export DENUE_API_URL={server.url}{DENUE_PREFIX}\n"
+          f"  export GOOGLE_PLACES_API_URL={server.url}{PLACES_PREFIX}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
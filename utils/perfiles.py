@@ -0,0 +1,259 @@
+"""
+Customer profile scoring from the AGEB census (Python port of utils/perfiles.R)
+
+Streams the CPV 2020 AGEB urbana CSV in chunks, keeping only the columns
+the profiles use, aggregates the block rows to AGEBs, fits one PCA per
+profile (joven, mamá, mayorista) on a shared standardized matrix and
+estimates potential customers per AGEB. The result is written as a Parquet
+file read by utils/grid_builder.py.
+
+Usage:
+    python utils/perfiles.py [--src CSV] [--dst PARQUET] [--chunksize N] [--entidad CODE]
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Default input and output
+CENSUS_FILEPATH = "../data/CensoOaxaca/conjunto_de_datos/conjunto_de_datos_ageb_urbana_20_cpv2020.csv"
+PERFILES_FILEPATH = "data/perfiles.parquet"
+
+# Rows read per chunk
+CENSUS_CHUNKSIZE = 200_000
+
+# Census variables of each profile
+VARS_JOVEN = ['P_18A24', 'P18A24A', 'PEA', 'GRAPROES', 'TVIVPARHAB',
+              'VPH_PC', 'VPH_CEL', 'VPH_INTER', 'VPH_SINTIC']
+VARS_MAMA = ['P_15A49_F', 'P_15A17_F', 'P_18A24_F', 'PROM_HNV', 'P18YM_PB_F',
+             'GRAPROES_F', 'POCUPADA_F', 'TOTHOG', 'HOGJEF_F', 'PHOGJEF_F',
+             'VPH_CEL', 'VPH_INTER']
+VARS_MAYORISTA = ['POBTOT', 'POB0_14', 'P_15A17', 'P_18A24', 'P_60YMAS',
+                  'P18YM_PB', 'VPH_AUTOM']
+
+# Variables of each PCA, including the derived population segments
+PROFILE_PCA_VARS = {
+    'joven_digital': VARS_JOVEN,
+    'mama_emprendedora': ['POB_MAMA'] + VARS_MAMA,
+    'mayorista_experimentado': ['POB_MAYOR'] + VARS_MAYORISTA
+}
+
+CENSUS_KEY_COLUMNS = ['ENTIDAD', 'MUN', 'LOC', 'AGEB']
+CENSUS_NAME_COLUMNS = ['NOM_ENT', 'NOM_MUN', 'NOM_LOC']
+CENSUS_VALUE_COLUMNS = list(dict.fromkeys(VARS_JOVEN + VARS_MAMA + VARS_MAYORISTA))
+
+def census_dtypes():
+    """Explicit dtypes for the census columns read by the pipeline"""
+    dtypes = {col: str for col in CENSUS_KEY_COLUMNS + CENSUS_NAME_COLUMNS}
+    dtypes.update({col: np.float32 for col in CENSUS_VALUE_COLUMNS})
+    return dtypes
+
+def build_cvegeo(entidad, mun, loc, ageb):
+    """
+    Build CVEGEO keys from census code columns, vectorized
+
+    Parameters:
+    - entidad, mun, loc, ageb: String Series of the census codes
+
+    Returns:
+    - pandas.Series: 13-character CVEGEO keys
+    """
+
+    return (entidad.str.strip().str.zfill(2) + mun.str.strip().str.zfill(3)
+            + loc.str.strip().str.zfill(4) + ageb.str.strip().str.zfill(4))
+
+def read_census_agebs(path=CENSUS_FILEPATH, chunksize=CENSUS_CHUNKSIZE, entidad=None):
+    """
+    Stream the census CSV and aggregate its block rows to AGEBs
+
+    Summary rows ('Total ...' in NOM_LOC) are dropped, "*" markers are read
+    as missing and values are summed per CVEGEO skipping missing ones, as
+    sum(na.rm = TRUE) in utils/perfiles.R (an all-missing AGEB sums to 0).
+    Only one chunk plus the per-AGEB partial sums are held in memory.
+
+    Parameters:
+    - path: Census CSV path
+    - chunksize: Rows per chunk (default=CENSUS_CHUNKSIZE)
+    - entidad: State code to keep (default: all)
+
+    Returns:
+    - pandas.DataFrame: One row per CVEGEO with the names and CENSUS_VALUE_COLUMNS
+    """
+
+    usecols = CENSUS_KEY_COLUMNS + CENSUS_NAME_COLUMNS + CENSUS_VALUE_COLUMNS
+    reader = pd.read_csv(path, usecols=usecols, dtype=census_dtypes(), na_values=['*', 'N/D'],
+                         chunksize=chunksize, encoding_errors='replace')
+
+    partials = []
+    for chunk in reader:
+        chunk = chunk[~chunk['NOM_LOC'].str.startswith('Total', na=False)]
+        if entidad is not None:
+            chunk = chunk[chunk['ENTIDAD'].str.strip().str.zfill(2) == str(entidad).zfill(2)]
+        if len(chunk) == 0:
+            continue
+
+        chunk = chunk.assign(CVEGEO=build_cvegeo(chunk['ENTIDAD'], chunk['MUN'], chunk['LOC'], chunk['AGEB']))
+        grouped = chunk.groupby('CVEGEO', sort=False)
+        partial = grouped[CENSUS_VALUE_COLUMNS].sum(min_count=0)
+        partial[CENSUS_NAME_COLUMNS] = grouped[CENSUS_NAME_COLUMNS].first()
+        partials.append(partial)
+
+    if len(partials) == 0:
+        return pd.DataFrame(columns=['CVEGEO'] + CENSUS_NAME_COLUMNS + CENSUS_VALUE_COLUMNS)
+
+    # An AGEB may span two chunks
+    combined = pd.concat(partials)
+    grouped = combined.groupby(level=0, sort=True)
+    agebs = grouped[CENSUS_VALUE_COLUMNS].sum(min_count=0)
+    agebs[CENSUS_NAME_COLUMNS] = grouped[CENSUS_NAME_COLUMNS].first()
+
+    return agebs.rename_axis('CVEGEO').reset_index()
+
+def profile_matrix(agebs):
+    """
+    Census variables used by the PCAs, with the derived segments
+
+    Parameters:
+    - agebs: AGEB census DataFrame from read_census_agebs
+
+    Returns:
+    - pandas.DataFrame: float64 variables, VPH_SINTIC inverted
+    """
+
+    data = agebs[CENSUS_VALUE_COLUMNS].astype(np.float64)
+    data['VPH_SINTIC'] = -data['VPH_SINTIC']  # Fewer dwellings without ICT is more digital
+    data['POB_MAMA'] = data['P_15A49_F'] - data['P_15A17_F'] - data['P_18A24_F']
+    data['POB_MAYOR'] = data['POBTOT'] - data['POB0_14'] - data['P_15A17'] - data['P_18A24'] - data['P_60YMAS']
+    return data
+
+def fit_profile_pcas(data, profiles=PROFILE_PCA_VARS):
+    """
+    First principal component of every profile from one standardized matrix
+
+    Variables are standardized once (missing values imputed with the column
+    mean, population standard deviation like FactoMineR's scale.unit) and
+    their correlation matrix is computed once; each profile's PCA is an
+    eigendecomposition of its block of that matrix. Component signs are
+    fixed so that the loadings sum to a positive value.
+
+    Parameters:
+    - data: DataFrame of variables (see profile_matrix)
+    - profiles: Profile name -> variables (default=PROFILE_PCA_VARS)
+
+    Returns:
+    - tuple: (indices, loadings) with a DataFrame of 'indice_<profile>'
+      columns and a dict profile -> Series of PC1 loadings
+    """
+
+    columns = list(dict.fromkeys(col for variables in profiles.values() for col in variables))
+    values = data[columns].to_numpy(dtype=np.float64)
+
+    means = np.nanmean(values, axis=0)
+    values = np.where(np.isnan(values), means, values)
+    stds = values.std(axis=0)
+    stds[stds == 0] = 1.0
+    z = (values - means) / stds
+
+    correlation = z.T @ z / len(z)
+    position = {col: i for i, col in enumerate(columns)}
+
+    indices = pd.DataFrame(index=data.index)
+    loadings = {}
+    for name, variables in profiles.items():
+        idx = [position[col] for col in variables]
+        _, eigenvectors = np.linalg.eigh(correlation[np.ix_(idx, idx)])
+        pc1 = eigenvectors[:, -1]
+        if pc1.sum() < 0:
+            pc1 = -pc1
+        indices[f'indice_{name}'] = z[:, idx] @ pc1
+        loadings[name] = pd.Series(pc1, index=variables)
+
+    return indices, loadings
+
+def _rescale(values):
+    """Rescale to the 0-1 range (scales::rescale)"""
+    vmin, vmax = np.nanmin(values), np.nanmax(values)
+    if vmax == vmin:
+        return np.full_like(values, 0.5, dtype=np.float64)
+    return (values - vmin) / (vmax - vmin)
+
+def estimate_customers(agebs, indices):
+    """
+    Estimate potential customers per AGEB from the profile indices
+
+    Parameters:
+    - agebs: AGEB census DataFrame from read_census_agebs
+    - indices: Profile indices from fit_profile_pcas
+
+    Returns:
+    - pandas.DataFrame: 'CVEGEO', 'NOM_MUN', 'NOM_LOC', 'POBTOT' and the
+      'estimado_ctes_*' columns (with the +5 offset of utils/perfiles.R)
+    """
+
+    afinidad_joven = _rescale(indices['indice_joven_digital'].to_numpy())
+    afinidad_mama = _rescale(indices['indice_mama_emprendedora'].to_numpy())
+    afinidad_mayorista = _rescale(indices['indice_mayorista_experimentado'].to_numpy())
+
+    pob_mama = (agebs['P_15A49_F'] - agebs['P_15A17_F'] - agebs['P_18A24_F']).to_numpy(dtype=np.float64)
+    joven = np.round(agebs['P18A24A'].to_numpy(dtype=np.float64) * afinidad_joven * 0.60)
+    mama = np.round(pob_mama * afinidad_mama * 0.30)
+    mayorista = np.round(agebs['P18YM_PB'].to_numpy(dtype=np.float64) * afinidad_mayorista * 0.10)
+
+    # Total capped at 30% of the AGEB population
+    pobtot = agebs['POBTOT'].to_numpy(dtype=np.float64)
+    total = np.round(np.minimum(joven + mama + mayorista, pobtot * 0.30))
+
+    return pd.DataFrame({
+        'CVEGEO': agebs['CVEGEO'].to_numpy(),
+        'NOM_MUN': agebs['NOM_MUN'].to_numpy(),
+        'NOM_LOC': agebs['NOM_LOC'].to_numpy(),
+        'POBTOT': pobtot,
+        'estimado_ctes_joven': joven + 5,
+        'estimado_ctes_mama': mama + 5,
+        'estimado_ctes_mayorista': mayorista + 5,
+        'estimado_ctes_total': total + 5
+    })
+
+def build_profiles(src=CENSUS_FILEPATH, dst=PERFILES_FILEPATH, chunksize=CENSUS_CHUNKSIZE, entidad=None):
+    """
+    Run the profile pipeline from the census CSV to the Parquet output
+
+    Parameters:
+    - src: Census CSV path
+    - dst: Output Parquet path
+    - chunksize: CSV rows per chunk
+    - entidad: State code to keep (default: all)
+
+    Returns:
+    - pandas.DataFrame: The written profiles
+    """
+
+    agebs = read_census_agebs(src, chunksize=chunksize, entidad=entidad)
+    indices, _ = fit_profile_pcas(profile_matrix(agebs))
+    perfiles = estimate_customers(agebs, indices)
+
+    dst = Path(dst)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    perfiles.to_parquet(dst, index=False, compression='zstd')
+
+    return perfiles
+
+def main(argv=None):
+    """Command line entry point"""
+
+    parser = argparse.ArgumentParser(description="Estimate customer profiles per AGEB from the census")
+    parser.add_argument('--src', default=CENSUS_FILEPATH, help="Census AGEB urbana CSV")
+    parser.add_argument('--dst', default=PERFILES_FILEPATH, help="Output Parquet file")
+    parser.add_argument('--chunksize', type=int, default=CENSUS_CHUNKSIZE, help="CSV rows per chunk")
+    parser.add_argument('--entidad', default=None, help="State code to keep (e.g. 20 for Oaxaca)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    perfiles = build_profiles(args.src, args.dst, chunksize=args.chunksize, entidad=args.entidad)
+    print(f"Wrote {len(perfiles)} AGEB profiles to '{args.dst}' in {time.perf_counter() - start:.2f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Server-side raster rendering of grid choropleths
+
+Burns hexagon values into a NumPy image aligned with the web-mercator
+pixels of a map view and serves it as a single PNG image overlay, so the
+browser receives one image instead of one vector polygon per hexagon.
+"""
+
+import base64
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import shapely
+
+from helpers import get_grid_derived
+from grid_store import cache_key
+from spatial_index import get_hex_index
+
+# Color ramp used for choropleths (low -> high)
+CHOROPLETH_COLORS = ['#f1f5ef', '#c9dcc6', '#a3c2a2', '#7a9e7e', '#4f7453', '#2e4a31']
+
+# Longest image side in pixels; larger views are rendered at lower detail
+RASTER_MAX_SIZE = 1024
+
+# Rendered overlays kept per grid
+RASTER_CACHE_SIZE = 64
+
+_raster_lock = threading.Lock()
+
+def _mercator_y(lat):
+    lat = np.radians(np.clip(lat, -85.0511, 85.0511))
+    return np.log(np.tan(np.pi / 4 + lat / 2))
+
+def _inverse_mercator_y(y):
+    return np.degrees(2 * np.arctan(np.exp(y)) - np.pi / 2)
+
+def raster_shape(bounds, zoom, max_size=RASTER_MAX_SIZE):
+    """
+    Pixel size of a map view at a zoom level
+
+    Parameters:
+    - bounds: (south, west, north, east)
+    - zoom: Web map zoom level
+    - max_size: Longest allowed side in pixels (default=RASTER_MAX_SIZE)
+
+    Returns:
+    - tuple: (height, width) in pixels
+    """
+
+    south, west, north, east = bounds
+    world_px = 256 * 2 ** zoom
+    width = (east - west) / 360.0 * world_px
+    height = (_mercator_y(north) - _mercator_y(south)) / (2 * np.pi) * world_px
+
+    scale = min(1.0, max_size / max(width, height, 1))
+    return max(1, int(round(height * scale))), max(1, int(round(width * scale)))
+
+def zoom_for_bounds(bounds, width=700, height=500):
+    """
+    Largest zoom level at which bounds fit in a map of the given pixel size
+
+    Parameters:
+    - bounds: (south, west, north, east)
+    - width, height: Map size in pixels
+
+    Returns:
+    - int: Zoom level between 1 and 18
+    """
+
+    south, west, north, east = bounds
+    dx = max(east - west, 1e-9) / 360.0
+    dy = max(_mercator_y(north) - _mercator_y(south), 1e-9) / (2 * np.pi)
+    zoom = np.floor(np.log2(min(width / (256 * dx), height / (256 * dy))))
+    return int(np.clip(zoom, 1, 18))
+
+def rasterize_grid(agebs_hex, column, bounds, zoom, max_size=RASTER_MAX_SIZE):
+    """
+    Burn hexagon values into an image covering a map view
+
+    Every pixel center is located in the grid with one bulk STRtree query,
+    so the cost depends on the number of pixels, not on the number of
+    hexagons.
+
+    Parameters:
+    - agebs_hex: Grid GeoDataFrame in EPSG:4326
+    - column: Column whose values are burned
+    - bounds: (south, west, north, east) of the view
+    - zoom: Web map zoom level
+    - max_size: Longest allowed side in pixels (default=RASTER_MAX_SIZE)
+
+    Returns:
+    - numpy.ndarray: float32 image (row 0 is north), NaN outside the grid
+    """
+
+    south, west, north, east = bounds
+    height, width = raster_shape(bounds, zoom, max_size)
+
+    # Pixel centers, evenly spaced in web-mercator like the map tiles
+    xs = west + (np.arange(width) + 0.5) * (east - west) / width
+    y_north, y_south = _mercator_y(north), _mercator_y(south)
+    ys = _inverse_mercator_y(y_north - (np.arange(height) + 0.5) * (y_north - y_south) / height)
+
+    grid_x, grid_y = np.meshgrid(xs, ys)
+    pixels = shapely.points(grid_x.ravel(), grid_y.ravel())
+
+    pixel_idx, hex_idx = get_hex_index(agebs_hex).tree.query(pixels, predicate='intersects')
+
+    values = agebs_hex[column].to_numpy(dtype=np.float32, na_value=np.nan)
+    image = np.full(height * width, np.nan, dtype=np.float32)
+    image[pixel_idx] = values[hex_idx]
+
+    return image.reshape(height, width)
+
+def colorize(image, vmin=None, vmax=None, colors=CHOROPLETH_COLORS, alpha=180):
+    """
+    Map an image of values to RGBA colors
+
+    Parameters:
+    - image: 2D float array, NaN for transparent pixels
+    - vmin, vmax: Value range of the ramp (default: image min/max)
+    - colors: Hex color ramp, low to high (default=CHOROPLETH_COLORS)
+    - alpha: Opacity of valid pixels, 0-255 (default=180)
+
+    Returns:
+    - numpy.ndarray: uint8 array of shape (height, width, 4)
+    """
+
+    valid = ~np.isnan(image)
+    if vmin is None:
+        vmin = float(np.nanmin(image)) if valid.any() else 0.0
+    if vmax is None:
+        vmax = float(np.nanmax(image)) if valid.any() else 1.0
+
+    scaled = np.zeros(image.shape, dtype=np.float32)
+    if vmax > vmin:
+        scaled[valid] = np.clip((image[valid] - vmin) / (vmax - vmin), 0, 1)
+
+    ramp = np.array([[int(c[i:i + 2], 16) for i in (1, 3, 5)] for c in colors], dtype=np.float32)
+    stops = np.linspace(0, 1, len(colors))
+
+    rgba = np.zeros(image.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        rgba[..., channel] = np.interp(scaled, stops, ramp[:, channel]).astype(np.uint8)
+    rgba[..., 3] = np.where(valid, alpha, 0)
+
+    return rgba
+
+def encode_png(rgba):
+    """Encode an RGBA array as a PNG data URL"""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, 'RGBA').save(buffer, format='PNG', optimize=False)
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+def get_choropleth_overlay(agebs_hex, column, bounds, zoom, precision=4):
+    """
+    Render (or fetch from cache) a choropleth image overlay for a map view
+
+    Results are cached per grid by (grid content hash, column, rounded bounds, zoom).
+
+    Parameters:
+    - agebs_hex: Grid GeoDataFrame in EPSG:4326
+    - column: Column to map
+    - bounds: (south, west, north, east) of the view
+    - zoom: Web map zoom level
+    - precision: Decimal places used to round bounds in the cache key (default=4)
+
+    Returns:
+    - dict with keys 'image' (PNG data URL), 'bounds' ([[south, west], [north, east]]),
+      'vmin' and 'vmax'
+    """
+
+    bounds = tuple(round(float(b), precision) for b in bounds)
+    zoom = int(zoom)
+    key = cache_key(agebs_hex, column, bounds, zoom)
+
+    cache = get_grid_derived(agebs_hex, 'raster_cache', lambda gdf: OrderedDict())
+
+    with _raster_lock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+
+    # Color range comes from the whole grid so colors are stable across views
+    values = agebs_hex[column]
+    vmin, vmax = float(values.min()), float(values.max())
+
+    image = rasterize_grid(agebs_hex, column, bounds, zoom)
+    south, west, north, east = bounds
+    overlay = {
+        'image': encode_png(colorize(image, vmin, vmax)),
+        'bounds': [[south, west], [north, east]],
+        'vmin': vmin,
+        'vmax': vmax
+    }
+
+    with _raster_lock:
+        cache[key] = overlay
+        while len(cache) > RASTER_CACHE_SIZE:
+            cache.popitem(last=False)
+
+    return overlay
@@ -0,0 +1,75 @@
+"""
+Single-flight coalescing of concurrent identical calls
+
+While a call for a key is running, other threads asking for the same key
+wait for it and share its result (or exception) instead of issuing their
+own request. Nothing is cached once the call finishes; persistent caching
+is left to the callers (e.g. denue_cache).
+"""
+
+import threading
+from concurrent.futures import Future
+
+class SingleFlight:
+    """
+    Group of keyed calls where concurrent callers of a key share one execution
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) unless a call for the same key is in flight
+
+        Parameters:
+        - key: Hashable key identifying equivalent calls
+        - fn: Function to run
+        - args, kwargs: Arguments of fn
+
+        Returns:
+        - The result of the call that ran for this key (the same object for
+          every caller sharing it)
+
+        Raises:
+        - Whatever the shared call raised
+        """
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                future = Future()
+                self._in_flight[key] = future
+                self.calls += 1
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+        return future.result()
+
+    def stats(self):
+        """
+        Call counters
+
+        Returns:
+        - dict: 'calls' (executions), 'coalesced' (callers that shared one)
+          and 'in_flight'
+        """
+
+        with self._lock:
+            return {'calls': self.calls, 'coalesced': self.coalesced, 'in_flight': len(self._in_flight)}
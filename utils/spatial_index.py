@@ -0,0 +1,181 @@
+"""
+Spatial index over the hexagonal grid
+
+Wraps shapely 2 STRtree indexes over the hexagon polygons and their
+centroids to answer point-in-hex, k-nearest-hex and viewport queries in
+O(log n) instead of scanning the whole grid.
+"""
+
+import numpy as np
+import shapely
+from shapely import STRtree
+
+from helpers import get_grid_derived
+from grid_store import grid_coordinates
+
+class HexIndex:
+    """
+    STRtree-backed index over the hexagons of a grid GeoDataFrame
+
+    All queries return integer row positions (for use with .iloc / .take).
+    Distances are planar, in the units of the grid CRS (degrees for EPSG:4326).
+    """
+
+    def __init__(self, geometries, centroid_xy=None, widths=None):
+        self.geometries = np.asarray(geometries, dtype=object)
+        self.tree = STRtree(self.geometries)
+
+        # Precomputed centroids and bbox widths avoid recomputing them from the polygons
+        if centroid_xy is None:
+            self.centroids = shapely.centroid(self.geometries)
+            self.centroid_xy = np.column_stack([shapely.get_x(self.centroids), shapely.get_y(self.centroids)])
+        else:
+            self.centroid_xy = np.ascontiguousarray(centroid_xy, dtype=np.float64)
+            self.centroids = shapely.points(self.centroid_xy)
+        self.centroid_tree = STRtree(self.centroids)
+
+        # Typical hexagon spacing, used as the initial k-nearest search radius
+        if len(self.geometries) > 0:
+            if widths is None:
+                bounds = shapely.bounds(self.geometries)
+                widths = bounds[:, 2] - bounds[:, 0]
+            widths = np.asarray(widths, dtype=np.float64)
+            widths = widths[np.isfinite(widths)]
+            spacing = float(np.median(widths)) if len(widths) > 0 else np.nan
+            self.spacing = spacing if np.isfinite(spacing) and spacing > 0 else 1e-3
+        else:
+            self.spacing = 1e-3
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def locate(self, lat, lng):
+        """
+        Find the hexagon containing a point
+
+        Parameters:
+        - lat, lng: Coordinates of the point
+
+        Returns:
+        - int: Row position of the containing hexagon, or None if outside the grid
+        """
+
+        hits = self.tree.query(shapely.points(lng, lat), predicate='intersects')
+        if len(hits) == 0:
+            return None
+        return int(hits.min())
+
+    def nearest(self, lat, lng, k=1):
+        """
+        Find the k hexagons whose centroids are nearest to a point
+
+        Parameters:
+        - lat, lng: Coordinates of the point
+        - k: Number of hexagons to return (default=1)
+
+        Returns:
+        - numpy.ndarray: Row positions sorted by increasing distance
+        """
+
+        n = len(self)
+        if n == 0:
+            return np.array([], dtype=np.intp)
+
+        k = min(int(k), n)
+        if k == 1:
+            hits = self.centroid_tree.query_nearest(shapely.points(lng, lat))
+            return np.array([hits.min()], dtype=np.intp)
+
+        # Grow a search window until it holds k centroids within its radius;
+        # the window can miss some centroids forever (empty geometries, NaN
+        # coordinates), so the growth is capped and then every centroid is ranked
+        radius = self.spacing * np.sqrt(k)
+        for _ in range(n):
+            if not np.isfinite(radius):
+                break
+            window = shapely.box(lng - radius, lat - radius, lng + radius, lat + radius)
+            candidates = self.centroid_tree.query(window)
+            distances = self.distances(lat, lng, candidates)
+            inside = distances <= radius
+
+            if inside.sum() >= k or len(candidates) == n:
+                order = np.lexsort((candidates, distances))[:k]
+                return candidates[order].astype(np.intp)
+
+            radius *= 2
+
+        candidates = np.arange(n)
+        order = np.lexsort((candidates, self.distances(lat, lng)))[:k]
+        return candidates[order].astype(np.intp)
+
+    def in_bounds(self, south, west, north, east):
+        """
+        Find the hexagons intersecting a bounding box (e.g. the map viewport)
+
+        Parameters:
+        - south, west, north, east: Bounds of the box
+
+        Returns:
+        - numpy.ndarray: Sorted row positions of the intersecting hexagons
+        """
+
+        hits = self.tree.query(shapely.box(west, south, east, north), predicate='intersects')
+        return np.sort(hits).astype(np.intp)
+
+    def distances(self, lat, lng, positions=None):
+        """
+        Planar distance from a point to hexagon centroids
+
+        Parameters:
+        - lat, lng: Coordinates of the point
+        - positions: Row positions to measure (default: all hexagons)
+
+        Returns:
+        - numpy.ndarray: Distances in grid CRS units
+        """
+
+        xy = self.centroid_xy if positions is None else self.centroid_xy[positions]
+        return np.hypot(xy[:, 1] - lat, xy[:, 0] - lng)
+
+def get_hex_index(agebs_hex):
+    """
+    Get the process-wide spatial index for a grid GeoDataFrame
+
+    The index is built on first use and shared by every caller holding the
+    same GeoDataFrame.
+
+    Parameters:
+    - agebs_hex: Grid GeoDataFrame
+
+    Returns:
+    - HexIndex
+    """
+
+    def build(gdf):
+        widths = None
+        if 'bbox_minx' in gdf.columns:
+            widths = (gdf['bbox_maxx'] - gdf['bbox_minx']).to_numpy(dtype=np.float64)
+        return HexIndex(gdf.geometry.values, centroid_xy=grid_coordinates(gdf), widths=widths)
+
+    return get_grid_derived(agebs_hex, 'hex_index', build)
+
+def viewport_bounds(lat, lng, zoom, width=700, height=500, padding=0.5):
+    """
+    Approximate the geographic bounds of a web-mercator map view
+
+    Parameters:
+    - lat, lng: Center of the map
+    - zoom: Map zoom level
+    - width, height: Map size in pixels
+    - padding: Extra fraction of the view added on each side (default=0.5)
+
+    Returns:
+    - tuple: (south, west, north, east)
+    """
+
+    # Degrees of longitude per pixel at this zoom (256 px tiles)
+    deg_per_px = 360.0 / (256 * 2 ** zoom)
+    half_w = width / 2 * deg_per_px * (1 + 2 * padding)
+    half_h = height / 2 * deg_per_px * np.cos(np.radians(lat)) * (1 + 2 * padding)
+
+    return (lat - half_h, lng - half_w, lat + half_h, lng + half_w)
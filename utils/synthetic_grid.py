@@ -0,0 +1,374 @@
+"""
+Synthetic hexagonal grid generator
+
+Builds a tessellated hex lattice of any size (10^3 to 10^6 cells) around a
+center point with seeded, spatially structured features: population
+concentrated around urban cores, smoothly varying customer profile shares
+and municipality/locality names. Synthetic branches and competitors are
+sampled where the customers are, and synthetic_denue answers DENUE-style
+searches from a deterministic business layer covering any area. Used as
+the simulated fallback data, by the mock API server (mock_server) and for
+benchmarking at production scale.
+
+Usage:
+    python utils/synthetic_grid.py --cells N [--seed S] [--dst PARQUET]
+"""
+
+import argparse
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from pyproj import Transformer
+
+from grid_builder import hex_centers, hexagon_vertices
+from grid_store import GRID_PROJECTED_CRS, write_grid_parquet
+from helpers import calculate_distance_km
+
+# Center of the Oaxaca ZMO
+SYNTHETIC_CENTER = (17.0594, -96.7216)
+
+# Named urban cores: (municipio, lat, lng, relative size)
+SYNTHETIC_CORES = [
+    ('Oaxaca de Juárez', 17.0650, -96.7236, 1.0),
+    ('Santa Cruz Xoxocotlán', 17.0270, -96.7350, 0.6),
+    ('Santa Lucía del Camino', 17.0600, -96.6850, 0.5),
+    ('San Jacinto Amilpas', 17.0970, -96.7600, 0.35),
+    ('Santa María Atzompa', 17.0800, -96.7850, 0.35),
+    ('San Agustín de las Juntas', 17.0150, -96.7050, 0.25)
+]
+
+SYNTHETIC_LOCALIDADES = ['Centro', 'Reforma', 'Jalatlaco', 'Xochimilco', 'Candiani',
+                         'Volcanes', 'Trinidad de las Huertas', 'San Felipe']
+
+# Cells per additional (unnamed) core on grids larger than the named cores cover
+CELLS_PER_CORE = 2000
+
+# Cells per locality
+CELLS_PER_LOCALIDAD = 150
+
+# Peak population of a cell at the center of a size-1 core
+PEAK_POPULATION = 4000
+
+# Side in degrees of the cells of the synthetic DENUE business layer (~550 m)
+DENUE_CELL_DEGREES = 0.005
+
+# Mean businesses per business-layer cell (at most 63)
+DENUE_BUSINESSES_PER_CELL = 15
+
+# Synthetic DENUE activities: (clase_actividad, name prefixes, relative frequency)
+DENUE_ACTIVIDADES = [
+    ('Comercio al por menor de artículos de joyería y relojes', ['Joyería', 'Relojería'], 0.05),
+    ('Farmacias sin minisúper', ['Farmacia'], 0.08),
+    ('Restaurantes con servicio de preparación de antojitos', ['Tacos', 'Antojitos', 'Tlayudas'], 0.2),
+    ('Comercio al por menor en tiendas de abarrotes, ultramarinos y misceláneas',
+     ['Abarrotes', 'Miscelánea', 'Tienda'], 0.3),
+    ('Salones y clínicas de belleza y peluquerías', ['Estética', 'Salón de belleza'], 0.12),
+    ('Comercio al por menor de artículos de papelería', ['Papelería'], 0.08),
+    ('Comercio al por menor de ropa, excepto de bebé y lencería', ['Boutique', 'Ropa'], 0.1),
+    ('Reparación mecánica en general de automóviles y camiones', ['Taller mecánico'], 0.07)
+]
+
+DENUE_NOMBRES = ['Guadalupe', 'El Sol', 'La Esperanza', 'San José', 'Don Pepe', 'La Perla', 'Diamante',
+                 'Juárez', 'Los Arcos', 'Del Centro', 'Monte Albán', 'La Soledad']
+
+DENUE_ESTRATO_WEIGHTS = [('0 a 5 personas', 0.75), ('6 a 10 personas', 0.12), ('11 a 30 personas', 0.08),
+                         ('31 a 50 personas', 0.03), ('51 a 100 personas', 0.02)]
+
+def _lattice_shape(n_cells):
+    n_cols = int(np.ceil(np.sqrt(n_cells)))
+    n_rows = int(np.ceil(n_cells / n_cols))
+    return n_rows, n_cols
+
+def _smooth_field(x, y, rng, extent, n_waves=6):
+    """Spatially autocorrelated field in [-1, 1] from random plane waves"""
+    field = np.zeros(len(x))
+    for _ in range(n_waves):
+        angle = rng.uniform(0, 2 * np.pi)
+        wavelength = rng.uniform(0.2, 1.0) * extent
+        phase = rng.uniform(0, 2 * np.pi)
+        field += np.cos((x * np.cos(angle) + y * np.sin(angle)) * 2 * np.pi / wavelength + phase)
+    return field / n_waves
+
+def _jittered_seeds(origin, extent, spacing, rng):
+    """One random seed per square bin of a grid covering the extent, as a (n_y, n_x, 2) array"""
+    n_x = int(np.ceil(extent[0] / spacing)) + 1
+    n_y = int(np.ceil(extent[1] / spacing)) + 1
+    by, bx = np.meshgrid(np.arange(n_y), np.arange(n_x), indexing='ij')
+    jitter = rng.uniform(0, 1, (n_y, n_x, 2))
+    return np.stack([origin[0] + (bx + jitter[..., 0]) * spacing,
+                     origin[1] + (by + jitter[..., 1]) * spacing], axis=-1)
+
+def _nearest_seed(points_xy, seeds, origin, spacing):
+    """
+    Nearest jittered seed of every point, searching the 3x3 neighbouring bins
+
+    Returns:
+    - tuple: (flat seed index, distance) arrays
+    """
+
+    n_y, n_x = seeds.shape[:2]
+    bx = np.clip(((points_xy[:, 0] - origin[0]) // spacing).astype(np.int64), 0, n_x - 1)
+    by = np.clip(((points_xy[:, 1] - origin[1]) // spacing).astype(np.int64), 0, n_y - 1)
+
+    nearest = np.zeros(len(points_xy), dtype=np.int64)
+    best = np.full(len(points_xy), np.inf)
+    for dy in (-1, 0, 1):
+        j = np.clip(by + dy, 0, n_y - 1)
+        for dx in (-1, 0, 1):
+            i = np.clip(bx + dx, 0, n_x - 1)
+            distance = np.hypot(points_xy[:, 0] - seeds[j, i, 0], points_xy[:, 1] - seeds[j, i, 1])
+            closer = distance < best
+            best[closer] = distance[closer]
+            nearest[closer] = j[closer] * n_x + i[closer]
+    return nearest, best
+
+def synthetic_grid(n_cells=2000, center=SYNTHETIC_CENTER, cell_size=500, seed=42):
+    """
+    Generate a synthetic prepared grid
+
+    Parameters:
+    - n_cells: Number of hexagons
+    - center: (lat, lng) of the lattice center (default=SYNTHETIC_CENTER)
+    - cell_size: Distance between opposite hexagon edges in meters (default=500)
+    - seed: Random seed (default=42)
+
+    Returns:
+    - GeoDataFrame: Grid in EPSG:4326 with the prepared grid columns
+      ('id_hex', 'poblacion_total', log1p profile counts, names, geometry)
+    """
+
+    rng = np.random.default_rng(seed)
+    to_projected = Transformer.from_crs('EPSG:4326', GRID_PROJECTED_CRS, always_xy=True)
+    to_geographic = Transformer.from_crs(GRID_PROJECTED_CRS, 'EPSG:4326', always_xy=True)
+
+    # Lattice centered on the center point, in meters
+    n_rows, n_cols = _lattice_shape(n_cells)
+    cx, cy = to_projected.transform(center[1], center[0])
+    width = n_cols * cell_size
+    height = n_rows * 1.5 * cell_size / np.sqrt(3)
+    centers = hex_centers((cx - width / 2, cy - height / 2), n_rows, n_cols, cell_size)[:n_cells]
+
+    # Urban cores: the named ones, plus one per bin of a jittered grid on large grids
+    origin = centers.min(axis=0)
+    span = centers.max(axis=0) - origin
+    core_x, core_y = to_projected.transform([c[2] for c in SYNTHETIC_CORES], [c[1] for c in SYNTHETIC_CORES])
+    core_sizes = np.array([c[3] for c in SYNTHETIC_CORES])
+    core_names = [c[0] for c in SYNTHETIC_CORES]
+
+    distance = np.hypot(centers[:, 0, None] - core_x, centers[:, 1, None] - core_y)
+    core_of_cell = distance.argmin(axis=1)
+    core_distance = distance[np.arange(len(centers)), core_of_cell]
+
+    if n_cells > CELLS_PER_CORE * len(SYNTHETIC_CORES):
+        spacing = np.sqrt(CELLS_PER_CORE) * cell_size
+        extra = _jittered_seeds(origin, span, spacing, rng)
+        extra_of_cell, extra_distance = _nearest_seed(centers, extra, origin, spacing)
+        closer = extra_distance < core_distance
+        core_of_cell[closer] = len(SYNTHETIC_CORES) + extra_of_cell[closer]
+        core_distance[closer] = extra_distance[closer]
+        n_extra = extra.shape[0] * extra.shape[1]
+        core_sizes = np.concatenate([core_sizes, rng.uniform(0.1, 0.5, n_extra)])
+        core_names += [f'Municipio Sintético {i + 1}' for i in range(n_extra)]
+
+    # Population: exponential decay around the nearest core plus a rural baseline
+    size = core_sizes[core_of_cell]
+    density = 5.0 + PEAK_POPULATION * size * np.exp(-core_distance / (1500 + 2500 * size))
+    density *= rng.lognormal(0, 0.5, len(centers))
+    poblacion = rng.poisson(density * (cell_size / 500) ** 2)
+
+    # Profile shares vary smoothly in space
+    extent = max(width, height, 10 * cell_size)
+    x, y = centers[:, 0] - cx, centers[:, 1] - cy
+    share_joven = np.clip(0.12 + 0.05 * _smooth_field(x, y, rng, extent), 0.02, 0.3)
+    share_mama = np.clip(0.10 + 0.04 * _smooth_field(x, y, rng, extent), 0.02, 0.3)
+    share_mayorista = np.clip(0.04 + 0.02 * _smooth_field(x, y, rng, extent), 0.005, 0.15)
+
+    joven = rng.binomial(poblacion, share_joven)
+    mama = rng.binomial(poblacion, share_mama)
+    mayorista = rng.binomial(poblacion, share_mayorista)
+    clientes = np.minimum(joven + mama + mayorista, np.round(poblacion * 0.30)).astype(np.int64)
+
+    # Localities: Voronoi regions of jittered seeds, the most central ones get the real names
+    spacing = np.sqrt(CELLS_PER_LOCALIDAD) * cell_size
+    localidades = _jittered_seeds(origin, span, spacing, rng)
+    localidad_of_cell, _ = _nearest_seed(centers, localidades, origin, spacing)
+    order = np.argsort(np.hypot(localidades[..., 0] - cx, localidades[..., 1] - cy).ravel())
+    localidad_names = np.array([f'Localidad {i + 1}' for i in range(len(order))], dtype=object)
+    n_named = min(len(SYNTHETIC_LOCALIDADES), len(order))
+    localidad_names[order[:n_named]] = SYNTHETIC_LOCALIDADES[:n_named]
+
+    # Geometry: project the whole vertex array at once
+    vertices = hexagon_vertices(centers, cell_size)
+    lng, lat = to_geographic.transform(vertices[..., 0].ravel(), vertices[..., 1].ravel())
+    polygons = shapely.polygons(np.column_stack([lng, lat]).reshape(vertices.shape))
+
+    return gpd.GeoDataFrame({
+        'id_hex': np.arange(1, len(centers) + 1),
+        'poblacion_total': poblacion,
+        'joven_digital': np.log1p(joven),
+        'mama_emprendedora': np.log1p(mama),
+        'mayorista_experimentado': np.log1p(mayorista),
+        'clientes_totales': np.log1p(clientes),
+        'nombre_municipio': np.array(core_names, dtype=object)[core_of_cell],
+        'nombre_localidad': localidad_names[localidad_of_cell],
+        'geometry': polygons
+    }, crs='EPSG:4326')
+
+def synthetic_businesses(agebs_hex, n_branches=3, n_competitors=30, seed=42):
+    """
+    Sample synthetic branches and competitors where the customers are
+
+    Hexagons are drawn with probability proportional to their estimated
+    customers, and each business is placed at a random point near the
+    hexagon's center.
+
+    Parameters:
+    - agebs_hex: Grid GeoDataFrame with 'clientes_totales' (log1p scale)
+    - n_branches: Number of branches (default=3)
+    - n_competitors: Number of competitors (default=30)
+    - seed: Random seed (default=42)
+
+    Returns:
+    - dict with 'sucursales' (id, nombre, lat, lng, atractivo) and
+      'competencia' (id, nombre, lat, lng), as APP_CONFIG's base data
+    """
+
+    rng = np.random.default_rng(seed)
+
+    weights = np.expm1(agebs_hex['clientes_totales'].to_numpy(dtype=np.float64))
+    weights = np.clip(np.nan_to_num(weights), 0, None)
+    weights = weights / weights.sum() if weights.sum() > 0 else None
+
+    bounds = shapely.bounds(np.asarray(agebs_hex.geometry.values))
+    centers = shapely.get_coordinates(shapely.centroid(np.asarray(agebs_hex.geometry.values)))
+
+    def sample(n):
+        cells = rng.choice(len(agebs_hex), n, p=weights)
+        half_w = (bounds[cells, 2] - bounds[cells, 0]) / 4
+        half_h = (bounds[cells, 3] - bounds[cells, 1]) / 4
+        lng = centers[cells, 0] + rng.uniform(-1, 1, n) * half_w
+        lat = centers[cells, 1] + rng.uniform(-1, 1, n) * half_h
+        return lat, lng
+
+    lat, lng = sample(n_branches)
+    sucursales = pd.DataFrame({
+        'id': [f'S{i + 1}' for i in range(n_branches)],
+        'nombre': [f'Sucursal Sintética {i + 1}' for i in range(n_branches)],
+        'lat': lat,
+        'lng': lng,
+        'atractivo': np.round(rng.uniform(3.5, 4.8, n_branches), 1)
+    })
+
+    lat, lng = sample(n_competitors)
+    competencia = pd.DataFrame({
+        'id': [f'C{i + 1}' for i in range(n_competitors)],
+        'nombre': [f'Joyería Sintética {i + 1}' for i in range(n_competitors)],
+        'lat': lat,
+        'lng': lng
+    })
+
+    return {'sucursales': sucursales, 'competencia': competencia}
+
+def _fold(text):
+    return unicodedata.normalize('NFKD', text.lower()).encode('ascii', 'ignore').decode('ascii')
+
+def _denue_cell(i, j, seed):
+    """Businesses of one business-layer cell, as DENUE API records (all values strings)"""
+    rng = np.random.default_rng([seed, i + 2 ** 20, j + 2 ** 20])
+    n = min(int(rng.poisson(DENUE_BUSINESSES_PER_CELL)), 63)
+
+    weights = np.array([a[2] for a in DENUE_ACTIVIDADES])
+    actividades = rng.choice(len(DENUE_ACTIVIDADES), n, p=weights / weights.sum())
+    estratos = rng.choice(len(DENUE_ESTRATO_WEIGHTS), n, p=[w for _, w in DENUE_ESTRATO_WEIGHTS])
+    lat = (i + rng.uniform(0, 1, n)) * DENUE_CELL_DEGREES
+    lng = (j + rng.uniform(0, 1, n)) * DENUE_CELL_DEGREES
+
+    records = []
+    for k in range(n):
+        clase, prefixes, _ = DENUE_ACTIVIDADES[actividades[k]]
+        nombre = f"{prefixes[rng.integers(len(prefixes))]} {DENUE_NOMBRES[rng.integers(len(DENUE_NOMBRES))]}"
+        localidad = SYNTHETIC_LOCALIDADES[rng.integers(len(SYNTHETIC_LOCALIDADES))]
+        records.append({
+            'Id': str(((i + 2 ** 20) * 2 ** 21 + (j + 2 ** 20)) * 64 + k),
+            'Nombre': nombre.upper(),
+            'Razon_social': '',
+            'Clase_actividad': clase,
+            'Estrato': DENUE_ESTRATO_WEIGHTS[estratos[k]][0],
+            'Ubicacion': f"{localidad.upper()}, SINTÉTICO",
+            'Latitud': f"{lat[k]:.7f}",
+            'Longitud': f"{lng[k]:.7f}"
+        })
+    return records
+
+def synthetic_denue(lat, lng, meters, keyword="todos", seed=42):
+    """
+    Deterministic DENUE search over a synthetic business layer
+
+    The layer is generated cell by cell from the seed, so the same search
+    always returns the same businesses and overlapping searches agree.
+
+    Parameters:
+    - lat, lng: Search center
+    - meters: Search radius in meters
+    - keyword: Words that must all appear in the name or activity, "todos"
+      for every business (case and accents ignored, default="todos")
+    - seed: Random seed of the layer (default=42)
+
+    Returns:
+    - list: Businesses as DENUE "Buscar" API records, sorted by id
+    """
+
+    lat, lng, meters = float(lat), float(lng), float(meters)
+    dlat = meters / 111_320
+    dlng = meters / (111_320 * np.cos(np.radians(lat)))
+    rows = range(int(np.floor((lat - dlat) / DENUE_CELL_DEGREES)), int(np.floor((lat + dlat) / DENUE_CELL_DEGREES)) + 1)
+    cols = range(int(np.floor((lng - dlng) / DENUE_CELL_DEGREES)), int(np.floor((lng + dlng) / DENUE_CELL_DEGREES)) + 1)
+
+    words = [] if _fold(str(keyword)).strip() == 'todos' else _fold(str(keyword)).split()
+    records = []
+    for i in rows:
+        for j in cols:
+            for record in _denue_cell(i, j, seed):
+                text = _fold(f"{record['Nombre']} {record['Clase_actividad']}")
+                if all(word in text for word in words):
+                    records.append(record)
+
+    if len(records) == 0:
+        return []
+
+    distance = calculate_distance_km(lat, lng, np.array([float(r['Latitud']) for r in records]),
+                                     np.array([float(r['Longitud']) for r in records])) * 1000
+
+    return sorted((r for r, d in zip(records, distance) if d <= meters), key=lambda r: int(r['Id']))
+
+def main(argv=None):
+    """Command line entry point"""
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic hexagonal grid")
+    parser.add_argument('--cells', type=int, default=2000, help="Number of hexagons")
+    parser.add_argument('--cell-size', type=float, default=500, help="Hexagon size in meters")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed")
+    parser.add_argument('--dst', default=None, help="Output GeoParquet grid (businesses are "
+                        "written next to it as <name>.sucursales.csv and <name>.competencia.csv)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    grid = synthetic_grid(args.cells, cell_size=args.cell_size, seed=args.seed)
+    businesses = synthetic_businesses(grid, seed=args.seed)
+    elapsed = time.perf_counter() - start
+
+    print(f"Generated {len(grid)} hexagons, {grid['poblacion_total'].sum():,} inhabitants, "
+          f"{grid['nombre_municipio'].nunique()} municipios in {elapsed:.2f} s")
+
+    if args.dst:
+        dst = write_grid_parquet(grid, args.dst)
+        for name, frame in businesses.items():
+            frame.to_csv(dst.with_name(f"{dst.stem}.{name}.csv"), index=False)
+        print(f"Wrote '{dst}'")
+
+if __name__ == "__main__":
+    main()